@@ -193,11 +193,15 @@ class PipeConfig(QtWidgets.QWidget):
         self.information_layout = QtWidgets.QVBoxLayout()
         self.information_layout.setAlignment(QtCore.Qt.AlignTop)
 
-        self.config_dictionary = data_manager.ConfigDataManager().get_all_config()
+        self.config_dictionary = data_manager.ConfigDataManager.shared().get_all_config()
 
         for option, default in self.config_dictionary.items():
             log.debug(f'option: {option}, default: {default}')
 
+            # Nested options like PATH_ROOTS are edited in the config file
+            if not isinstance(default, str):
+                continue
+
             if 'True' in default or 'False' in default:
                 path = Switch(label=option,
                               default=default,
@@ -272,7 +276,7 @@ class PipeConfig(QtWidgets.QWidget):
         Saves the config.
         """
         log.debug('Saving config...')
-        config_data_manager = data_manager.ConfigDataManager()
+        config_data_manager = data_manager.ConfigDataManager.shared()
         gui_options = []
         for i in range(self.information_layout.count()):
             gui_options.append(self.information_layout.itemAt(i).widget())
@@ -2,6 +2,7 @@
 Pipe Manager GUI for viewing outputs, comps, and renders.
 """
 
+import os
 import sys
 try:
     import hou
@@ -10,11 +11,12 @@ except Exception as e:
     print(f'hou not found, not running in houdini: {e}')
     from PySide6 import QtWidgets, QtCore, QtGui
 
-from hpipe.core import data_manager, project, shot
+from hpipe.core import data_manager, project, shot, watch_service
 from hpipe.apps.pipeDisplay import output_widgets, output_utils
-from hpipe.core.hutils import logger
+from hpipe.core.hutils import logger, system
 from typing import *
 from hpipe.assets import reviewable
+import queue
 import time
 
 log = logger.setup_logger()
@@ -23,31 +25,58 @@ log.debug("manager_gui.py loaded")
 
 class ThumbnailLoader(QtCore.QThread):
     """
-    Thread for loading thumbnails in the background based on the directories in the project.
+    Thread for loading thumbnails in the background based on the directories in the project. A single loader runs for
+    the life of the viewer and loads the thumbnails added to it one at a time, so scanning many shots doesn't start a
+    thread per shot on the file server.
     """
-    thumbnail_loaded = QtCore.Signal(QtGui.QPixmap, int)
+    # thumbnail, index of the reviewable in the layout and generation it was added in
+    thumbnail_loaded = QtCore.Signal(QtGui.QPixmap, int, int)
 
-    def __init__(self, reviewable_list: List[reviewable.Reviewable]):
+    def __init__(self):
         super().__init__()
-        self.reviewable_list = reviewable_list
+        self.reviewable_queue: 'queue.Queue[Tuple[int, int, reviewable.Reviewable]]' = queue.Queue()
+        # bumped by clear(), thumbnails of reviewables added before are dropped
+        self.generation = 0
 
         # need to keep track of the thread's running state so we can prevent the thread from emitting signals after
         # it's already been stopped
         self._running = True
 
+    def add(self, reviewable_list: List[reviewable.Reviewable], first_index: int = 0):
+        """
+        Queue the thumbnails of reviewables to be loaded.
+        :param reviewable_list: reviewables to load the thumbnails of
+        :param first_index: index of the first reviewable in the layout
+        """
+        generation = self.generation
+        for index, reviewable_instance in enumerate(reviewable_list, first_index):
+            self.reviewable_queue.put((generation, index, reviewable_instance))
+
+    def clear(self):
+        """
+        Drop the thumbnails that are queued or loading, when the layout is cleared.
+        """
+        self.generation += 1
+
     def run(self):
         """
-        Load thumbnails for each reviewable in the project. Emit a signal when each thumbnail is loaded with the
-        index of the reviewable in the list.
+        Load the thumbnails of the queued reviewables. Emit a signal when each thumbnail is loaded with the index of
+        the reviewable in the layout.
         """
-        for index, reviewable_instance in enumerate(self.reviewable_list):
+        while self._running:
+            try:
+                generation, index, reviewable_instance = self.reviewable_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if generation != self.generation:
+                continue
             image = reviewable_instance.get_thumbnail_image()
             if image:
                 thumbnail = QtGui.QPixmap(image.system_path())
             else:
                 thumbnail = QtGui.QPixmap(output_utils.Constants.TEMP_IMAGE.system_path())
-            if self._running:
-                self.thumbnail_loaded.emit(thumbnail, index)
+            if self._running and generation == self.generation:
+                self.thumbnail_loaded.emit(thumbnail, index, generation)
 
             # sleep for a bit so we don't overload the main thread sending signals back
             time.sleep(0.001)
@@ -58,11 +87,56 @@ class ThumbnailLoader(QtCore.QThread):
         self.wait()
 
 
+class ReviewableLoader(QtCore.QThread):
+    """
+    Thread scanning the shots for reviewables in the background. Emits the reviewables of each shot as soon as it and
+    the shots before it are scanned, with the percentage of the shots scanned so far.
+    """
+    reviewables_loaded = QtCore.Signal(object, int)
+
+    def __init__(self, shot_list: Optional[List[shot.Shot]], type: str, filter: str):
+        super().__init__()
+        self.shot_list = shot_list or []
+        self.type = type
+        self.filter = filter
+        # started here rather than in run(), so the scan can be cancelled as soon as the loader is stopped
+        self.scan = output_utils.start_scan(self.shot_list, self.type)
+        self._running = True
+
+    def run(self):
+        """
+        Scan the shots and emit a signal with the reviewables of each shot.
+        """
+        if not self.shot_list:
+            return
+        scan_count = len(self.scan.shots) * len(self.scan.kinds) if self.scan else 0
+        for reviewable_list in output_utils.iter_reviewables(self.shot_list, self.type, self.filter, scan=self.scan):
+            progress = int(100 * self.scan.done_count() / scan_count) if scan_count else 100
+            if not self._running:
+                return
+            self.reviewables_loaded.emit(reviewable_list, progress)
+
+    def stop(self, wait: bool = True):
+        """
+        Cancel the scan. The shots being scanned are finished in the background unless waiting for them.
+        :param wait: whether to wait for the thread to finish
+        """
+        self._running = False
+        if self.scan:
+            self.scan.cancel()
+        self.requestInterruption()
+        if wait:
+            self.wait()
+
+
 class OutputViewer(QtWidgets.QDialog):
     """
     Project Overview Panel where I can see and edit all projects and shots. This is a project management tool
     and not a viewer.
     """
+    # Watch events are emitted on the watcher thread and handled on the GUI thread
+    watch_events = QtCore.Signal(object)
+
     def __init__(self, parent=None,
                  font_scale: float = 1.0,
                  start_project: str = output_utils.Constants.START_PROJECT,
@@ -92,7 +166,9 @@ class OutputViewer(QtWidgets.QDialog):
 
         self.setWindowTitle('Output Viewer')
         self.database = data_manager.ProjectDataManager()
-        self.loader_thread: Optional[ThumbnailLoader] = ThumbnailLoader([])
+        self.reviewable_loader: Optional[ReviewableLoader] = None
+        # loaders of outputs shown before, kept until their scan stopped so the threads aren't destroyed running
+        self.stopped_reviewable_loaders: List[ReviewableLoader] = []
 
         # make title bar
         self.title_layout = QtWidgets.QHBoxLayout()
@@ -236,6 +312,17 @@ class OutputViewer(QtWidgets.QDialog):
         self.directory_type.addItems(output_utils.Constants.DIRECTORY_TYPES.keys())  # type: ignore
         self.show_selection.addItems(output_utils.Constants.SHOWS)  # type: ignore
 
+        # Reviewables, sequences and shots added while the viewer is open show up without refreshing
+        self.output_reviewables: List[reviewable.Reviewable] = []
+        self.watched_directories: List[str] = []
+        self.thumbnail_loader = ThumbnailLoader()
+        self.thumbnail_loader.thumbnail_loaded.connect(self.update_thumbnail_image)
+        self.thumbnail_loader.start()
+        self.watch_service = watch_service.WatchService.shared()
+        self.watch_events.connect(self.apply_watch_events)
+        self.watch_listener = self.watch_events.emit
+        self.watch_service.add_listener(self.watch_listener)
+
         # defaults
         self.show_selection.setCurrentText(start_project)
         log.debug("Setting show to: {}".format(start_project))
@@ -285,7 +372,7 @@ class OutputViewer(QtWidgets.QDialog):
         if combo_type == "show":
             self.shot_selection.clear()
             self.shot_selection.addItems(output_utils.shots_from_show(current_project, database=self.database))
-        elif combo_type == "shot" or combo_type is "type":
+        elif combo_type == "shot" or combo_type == "type":
             self.update_outputs()
             return True
         return True
@@ -295,30 +382,164 @@ class OutputViewer(QtWidgets.QDialog):
         Update the outputs based on the current combo box / filter values.
         :return: True if successful
         """
-        try:
-            self.loader_thread.stop()
-            self.loader_thread.wait()
-        except AttributeError:
-            pass
+        self.stop_reviewable_loader()
+        self.thumbnail_loader.clear()
 
         self.clear_flow_layout()
         self.clear_list_layout()
+        self.output_reviewables = []
+
+        # Shots are scanned in the background and their reviewables added as they are found
+        current_shots = self.current_shots()
+        self.update_watches(output_utils.get_output_directories(current_shots, self.directory_type.currentText()))
+        self.loading_bar.setValue(0)
+        self.reviewable_loader = ReviewableLoader(current_shots, self.directory_type.currentText(), self.filter.text())
+        self.reviewable_loader.reviewables_loaded.connect(self.add_reviewables)
+        self.reviewable_loader.finished.connect(self.finish_reviewable_loader)
+        self.reviewable_loader.start()
+        return True
 
-        output_reviewables = output_utils.get_reviewables(self.current_shots(),
-                                                          self.directory_type.currentText(),
-                                                          self.filter.text())
-        log.debug("Updating outputs: {}".format(output_reviewables))
-        self.update_flow_layout(output_reviewables)
-        self.update_list_layout(output_reviewables)
+    def add_reviewables(self, reviewable_list: List[reviewable.Reviewable], progress: int) -> bool:
+        """
+        Add the reviewables of a scanned shot to the layouts and load their thumbnails.
+        :param reviewable_list: reviewables of the shot
+        :param progress: percentage of the shots scanned so far
+        :return: True if reviewables were added
+        """
+        # Reviewables of a scan stopped after emitting them are dropped
+        if self.sender() is not self.reviewable_loader:
+            return False
+        self.loading_bar.setValue(progress)
+        if not reviewable_list:
+            return False
+        log.debug("Adding outputs: {}".format(reviewable_list))
+        first_index = len(self.output_reviewables)
+        self.output_reviewables += reviewable_list
+        self.update_flow_layout(reviewable_list)
+        self.update_list_layout(reviewable_list, first_index)
+        self.thumbnail_loader.add(reviewable_list, first_index)
+        return True
 
-        if not output_reviewables:
+    def finish_reviewable_loader(self) -> bool:
+        """
+        Fill the loading bar once the shots are scanned and drop the loaders of stopped scans that finished.
+        :return: True if successful
+        """
+        if self.sender() is self.reviewable_loader:
+            self.loading_bar.setValue(100)
+        self.stopped_reviewable_loaders = [loader for loader in self.stopped_reviewable_loaders
+                                           if not loader.isFinished()]
+        return True
+
+    def stop_reviewable_loader(self, wait: bool = False) -> bool:
+        """
+        Cancel the scan of the outputs shown before, e.g. when the show or type changed.
+        :param wait: whether to wait for the shots being scanned to finish
+        :return: True if a scan was stopped
+        """
+        if self.reviewable_loader is None:
             return False
+        self.reviewable_loader.stop(wait=wait)
+        if not self.reviewable_loader.isFinished():
+            self.stopped_reviewable_loaders.append(self.reviewable_loader)
+        self.reviewable_loader = None
+        return True
 
-        self.loader_thread = ThumbnailLoader(output_reviewables)
-        self.loader_thread.thumbnail_loaded.connect(self.update_thumbnail_image)
-        self.loader_thread.start()
+    def update_watches(self, directories: List[system.Directory]) -> bool:
+        """
+        Watch the output folders of the shown reviewables, and stop watching the ones shown before.
+        :param directories: output folders to watch
+        :return: True if successful
+        """
+        directory_paths = [directory.directory_path for directory in directories]
+        for directory_path in self.watched_directories:
+            if directory_path not in directory_paths:
+                self.watch_service.unwatch_outputs(directory_path)
+        for directory_path in directory_paths:
+            if directory_path not in self.watched_directories:
+                self.watch_service.watch_outputs(directory_path)
+        self.watched_directories = directory_paths
         return True
 
+    def apply_watch_events(self, events: List['watch_service.WatchEvent']) -> bool:
+        """
+        Update the outputs from the events of the watch service. Added reviewables are added to the layouts, the
+        thumbnails of reviewables whose sequences changed are loaded again and added shots are added to the shot
+        selection. Removed reviewables update all the outputs.
+        :param events: watch events
+        :return: True if the outputs changed
+        """
+        changed = False
+        added_reviewables = []
+        changed_indices = set()
+        for event in events:
+            if event.event_type in (watch_service.WatchEventType.SHOT_ADDED,
+                                    watch_service.WatchEventType.SHOT_REMOVED):
+                self.database.reload_if_changed()
+                if event.project_name == self.show_selection.currentText():
+                    # Keep the selected shot, without updating the outputs for it again
+                    current_shot = self.shot_selection.currentText()
+                    self.shot_selection.blockSignals(True)
+                    self.update_shots()
+                    self.shot_selection.setCurrentText(current_shot)
+                    self.shot_selection.blockSignals(False)
+                    changed = True
+                continue
+
+            event_directory_path = system.Directory(event.path).directory_path if event.path else ''
+            if event.event_type == watch_service.WatchEventType.REVIEWABLE_REMOVED:
+                if self.get_reviewable_index(event_directory_path) is not None:
+                    return self.update_outputs()
+            elif event.event_type == watch_service.WatchEventType.REVIEWABLE_ADDED:
+                if os.path.dirname(event_directory_path) not in self.watched_directories:
+                    continue
+                if self.get_reviewable_index(event_directory_path) is not None:
+                    continue
+                reviewable_instance = output_utils.reviewable_from_event(event, self.directory_type.currentText(),
+                                                                         self.filter.text())
+                if reviewable_instance is not None:
+                    added_reviewables.append(reviewable_instance)
+            elif event_directory_path:
+                index = self.get_reviewable_index(event_directory_path)
+                if index is not None:
+                    changed_indices.add(index)
+
+        if added_reviewables:
+            first_index = len(self.output_reviewables)
+            self.output_reviewables += added_reviewables
+            self.update_flow_layout(added_reviewables)
+            self.update_list_layout(added_reviewables, first_index)
+            self.thumbnail_loader.add(added_reviewables, first_index)
+            changed = True
+        for index in sorted(changed_indices):
+            self.thumbnail_loader.add([self.output_reviewables[index]], index)
+            changed = True
+        return changed
+
+    def get_reviewable_index(self, directory_path: str) -> Optional[int]:
+        """
+        Get the index of the shown reviewable a path is in.
+        :param directory_path: path of the reviewable directory or of a directory inside it
+        :return: index of the reviewable, or None if the path is not in a shown reviewable
+        """
+        for index, reviewable_instance in enumerate(self.output_reviewables):
+            reviewable_path = reviewable_instance.reviewable_directory.directory_path
+            if directory_path == reviewable_path or directory_path.startswith(f"{reviewable_path}/"):
+                return index
+        return None
+
+    def done(self, result: int) -> None:
+        """
+        Stop watching the output folders and scanning the shots when the viewer is closed.
+        """
+        self.watch_service.remove_listener(self.watch_listener)
+        self.update_watches([])
+        self.stop_reviewable_loader(wait=True)
+        for loader in self.stopped_reviewable_loaders:
+            loader.wait()
+        self.thumbnail_loader.stop()
+        super().done(result)
+
     def current_show(self) -> project.Project:
         """
         Get the current show from the combo box and return the project object.
@@ -358,6 +579,7 @@ class OutputViewer(QtWidgets.QDialog):
         :return: True if successful
         """
         self.list_layout.clear()
+        self.list_layout.setRowCount(0)
         return True
 
     def update_flow_layout(self, output_reviewables: Optional[List[reviewable.Reviewable]]) -> bool:
@@ -392,27 +614,32 @@ class OutputViewer(QtWidgets.QDialog):
             self.flow_layout.addWidget(button)
         return True
 
-    def update_list_layout(self, output_reviewables: Optional[List[reviewable.Reviewable]]) -> bool:
+    def update_list_layout(self, output_reviewables: Optional[List[reviewable.Reviewable]], first_row: int = 0) -> bool:
         """
         Update the list layout with the reviewables.
         :param output_reviewables: List of output reviewables
+        :param first_row: row of the first reviewable, to add reviewables after the ones already listed
         :return: True if successful
         """
         if not output_reviewables:
             return False
-        self.list_layout.setRowCount(len(output_reviewables))
-        for count, reviewable in enumerate(output_reviewables):
+        self.list_layout.setRowCount(first_row + len(output_reviewables))
+        for count, reviewable in enumerate(output_reviewables, first_row):
             file_name = reviewable.asset_name
             self.list_layout.setItem(count, 0, QtWidgets.QTableWidgetItem(file_name))
         return True
 
-    def update_thumbnail_image(self, thumbnail: 'QtGui.QPixmap', iter_num: int) -> bool:
+    def update_thumbnail_image(self, thumbnail: 'QtGui.QPixmap', iter_num: int, generation: int) -> bool:
         """
         Update the button thumbnail
         :param thumbnail: QPixmap thumbnail image to set
         :param iter_num: int iteration number / index of the button to update
+        :param generation: generation of the thumbnail loader the thumbnail was queued in
         :return: True if successful
         """
+        # Thumbnails of outputs shown before the layout was cleared
+        if generation != self.thumbnail_loader.generation:
+            return False
         try:
             log.debug("Updating button thumbnail: {0}".format(iter_num))
             button = self.flow_layout.itemAt(iter_num).widget()
@@ -432,7 +659,6 @@ class OutputViewer(QtWidgets.QDialog):
         Close the window and stop the thread. Return the current item filepath.
         """
         selected_item = self.sender()
-        self.loader_thread.stop()
         log.debug(f"Selected item: {selected_item.text}")
         if selected_item:
             log.debug(selected_item.text())
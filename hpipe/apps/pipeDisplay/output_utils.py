@@ -8,10 +8,10 @@ except Exception as e:
     print(f'hou not found, not running in houdini: {e}')
     from PySide6 import QtWidgets, QtGui
 
-from hpipe.core.hutils import logger
+from hpipe.core.hutils import logger, shot_scan
 from enum import Enum
 from hpipe.core.hutils import system
-from hpipe.core import data_manager
+from hpipe.core import data_manager, watch_service
 from typing import *
 from hpipe.assets import reviewable
 from hpipe.core import assetEntry
@@ -46,7 +46,7 @@ def shots_from_show(show: str, database: Optional[data_manager.ProjectDataManage
     if not database:
         database = data_manager.ProjectDataManager()
     project = database.get_project(show)
-    shots = [shot.name for shot in project.get_shots()]
+    shots = project.get_shot_names()
     return shots
 
 
@@ -61,31 +61,97 @@ def get_reviewables(shot_list: Optional[List[shot.Shot]], type: str, filter: str
     if not shot_list:
         return None
 
-    asset_db = data_manager.AssetDataManager()
-
     reviewables = []
-    for shot in shot_list:
-        if type == 'Comp':
-            reviewables += shot.get_comps()
-        elif type == 'Plate':
-            plates = shot.get_plates()
-            for plate in plates:
-                name = plate.asset_name
-                log.debug(f"Plate name: {name}")
-                if 'ref' in name.lower():
-                    reviewables.append(plate)
-    if type == 'Assets':
-        asset_reviewables = assetEntry.reviewable_factory(asset_db.get_assets())
-        reviewables += asset_reviewables
-
-    filtered_reviewables = []
-    if filter and filter != '':
-        for reviewable in reviewables:
-            if filter in reviewable.asset_name.lower():
-                filtered_reviewables.append(reviewable)
-        log.debug(f"Filtered reviewables: {filtered_reviewables}")
-        return filtered_reviewables
+    for shot_reviewables in iter_reviewables(shot_list, type, filter):
+        reviewables += shot_reviewables
     log.debug(f"Reviewables: {reviewables}")
     return reviewables
 
 
+def iter_reviewables(shot_list: List[shot.Shot], type: str, filter: str,
+                     scan: Optional[shot_scan.ShotScan] = None) -> Iterator[List[reviewable.Reviewable]]:
+    """
+    Scans the shots for reviewables on a thread pool and yields the reviewables of each shot as soon as it and the
+    shots before it are scanned, so the grid can be filled in while the rest of the shots are scanned.
+    :param shot_list: shots to scan
+    :param type: string output type
+    :param filter: only yield reviewables with this in their name
+    :param scan: scan to read the results from, e.g. one the caller can cancel. Started here if not given.
+    :return: iterator over the filtered reviewables of each shot, in shot order
+    """
+    if type == 'Assets':
+        asset_db = data_manager.AssetDataManager()
+        yield _filter_reviewables(assetEntry.reviewable_factory(asset_db.get_assets()), filter)
+        return
+
+    if scan is None:
+        scan = start_scan(shot_list, type)
+        if scan is None:
+            return
+
+    with scan:
+        for result in scan:
+            reviewables = result.items
+            if result.kind == shot_scan.ScanKind.PLATES:
+                for plate in result.items:
+                    log.debug(f"Plate name: {plate.asset_name}")
+                reviewables = [plate for plate in result.items if 'ref' in plate.asset_name.lower()]
+            yield _filter_reviewables(reviewables, filter)
+
+
+def start_scan(shot_list: List[shot.Shot], type: str) -> Optional[shot_scan.ShotScan]:
+    """
+    Start scanning the shots for the reviewables of a type, for iter_reviewables().
+    :param shot_list: shots to scan
+    :param type: string output type
+    :return: running scan, or None for types that aren't scanned from the shots
+    """
+    kinds = {'Comp': [shot_scan.ScanKind.COMPS], 'Plate': [shot_scan.ScanKind.PLATES]}.get(type)
+    if not shot_list or not kinds:
+        return None
+    return shot_scan.scan_shots(shot_list, kinds)
+
+
+def get_output_directories(shot_list: Optional[List[shot.Shot]], type: str) -> List[system.Directory]:
+    """
+    Get the output folders the reviewables of a type are scanned from, for watching them.
+    :param shot_list: List[shot.Shot]
+    :param type: string output type
+    :return: List of output folders, empty for types that aren't scanned from the shots
+    """
+    if not shot_list:
+        return []
+    if type == 'Comp':
+        return [shot_instance.get_comps_path() for shot_instance in shot_list]
+    if type == 'Plate':
+        return [shot_instance.get_plate_path() for shot_instance in shot_list]
+    return []
+
+
+def reviewable_from_event(event: watch_service.WatchEvent, type: str, filter: str) -> Optional[reviewable.Reviewable]:
+    """
+    Get the reviewable added by a REVIEWABLE_ADDED watch event, if it would be shown for the type and filter.
+    :param event: watch event
+    :param type: string output type
+    :param filter: only return the reviewable if this is in its name
+    :return: reviewable or None
+    """
+    reviewable_instance = reviewable.SequenceReviewable(event.name, system.Directory(event.path))
+    if type == 'Plate' and 'ref' not in reviewable_instance.asset_name.lower():
+        return None
+    reviewables = _filter_reviewables([reviewable_instance], filter)
+    return reviewables[0] if reviewables else None
+
+
+def _filter_reviewables(reviewables: List[reviewable.Reviewable], filter: str) -> List[reviewable.Reviewable]:
+    """
+    Filters reviewables by name.
+    :param reviewables: reviewables to filter
+    :param filter: string the name must contain, nothing is filtered if empty
+    :return: filtered reviewables
+    """
+    if not filter:
+        return reviewables
+    filtered_reviewables = [reviewable for reviewable in reviewables if filter in reviewable.asset_name.lower()]
+    log.debug(f"Filtered reviewables: {filtered_reviewables}")
+    return filtered_reviewables
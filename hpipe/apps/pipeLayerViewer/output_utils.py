@@ -46,7 +46,7 @@ def shots_from_show(show: str, database: Optional[data_manager.ProjectDataManage
     if not database:
         database = data_manager.ProjectDataManager()
     project = database.get_project(show)
-    shots = [shot.name for shot in project.get_shots()]
+    shots = project.get_shot_names()
     return shots
 
 
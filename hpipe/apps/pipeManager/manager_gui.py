@@ -10,7 +10,7 @@ else:
     from PySide6 import QtWidgets, QtCore, QtGui
 
 import hpipe.core.project
-from hpipe.core import data_manager, project, shot
+from hpipe.core import data_accessor, data_manager, project, shot, watch_service
 from hpipe.apps.pipeManager import pipe_widgets
 from hpipe.apps.pipeManager import manager_utils
 from hpipe.core.hutils import logger
@@ -101,6 +101,9 @@ class ProjectOverview(QtWidgets.QWidget):
     Project Overview Panel where I can see and edit all projects and shots. This is a project management tool
     and not a viewer.
     """
+    # Watch events are emitted on the watcher thread and handled on the GUI thread
+    watch_events = QtCore.Signal(object)
+
     def __init__(self,
                  parent=None,
                  font_scale: float = 1.0,
@@ -203,7 +206,7 @@ class ProjectOverview(QtWidgets.QWidget):
         self.resize(int(1920/1.5), int(1080/1.5))
         self.setWindowOpacity(0.99)
         self.setStyleSheet(self.window_stylesheet)
-        self.database = data_manager.ProjectDataManager()
+        self.database = data_manager.ProjectDataManager.shared()
 
         # Create tree widget
         self.tree = QtWidgets.QTreeWidget()
@@ -350,6 +353,12 @@ class ProjectOverview(QtWidgets.QWidget):
         self.sorted_data: Dict[Any, Any] = {}
         self.refresh_tree()
 
+        # Shots and projects added or removed by someone else show up without refreshing
+        self.watch_service = watch_service.WatchService.shared()
+        self.watch_events.connect(self.apply_watch_events)
+        self.watch_listener = self.watch_events.emit
+        self.watch_service.add_listener(self.watch_listener)
+
     def refresh_tree(self, refresh_data=False) -> None:
         """
         Refresh the tree widget. This is called when the window is first opened and when the user clicks the
@@ -359,7 +368,7 @@ class ProjectOverview(QtWidgets.QWidget):
         expansion_state = self.get_expansion_state()
         self.tree.clear()
         if refresh_data:
-            self.database = data_manager.ProjectDataManager()
+            self.database = data_manager.ProjectDataManager.shared()
         tree_data = manager_utils.parse_data(self.database)
         sort_type = self.sort_by_dropdown.currentText()
         self.sorted_data = manager_utils.sort_data(tree_data, sort_type)
@@ -367,6 +376,80 @@ class ProjectOverview(QtWidgets.QWidget):
         self.format_tree()
         self.restore_expansion_state(expansion_state)
 
+    def apply_watch_events(self, events: List['watch_service.WatchEvent']) -> bool:
+        """
+        Update the tree from the events of the watch service. Added and removed shots are added to or removed from
+        their project in place, added or removed projects refresh the whole tree.
+        :param events: watch events
+        :return: True if the tree changed.
+        """
+        project_events = (watch_service.WatchEventType.PROJECT_ADDED, watch_service.WatchEventType.PROJECT_REMOVED)
+        if any(event.event_type in project_events for event in events):
+            self.refresh_tree(refresh_data=True)
+            return True
+
+        shot_events = [event for event in events if event.event_type in (watch_service.WatchEventType.SHOT_ADDED,
+                                                                          watch_service.WatchEventType.SHOT_REMOVED)]
+        if not shot_events:
+            return False
+
+        self.database = data_manager.ProjectDataManager.shared()
+        for event in shot_events:
+            project_display_name = event.project_name.replace("_", " ").lower()
+            shots_item = self.get_shots_item(project_display_name)
+            if shots_item is None:
+                continue
+            shots_data = self.sorted_data.get(project_display_name, {}).get('Shots:', {})
+
+            if event.event_type == watch_service.WatchEventType.SHOT_REMOVED:
+                for i in reversed(range(shots_item.childCount())):
+                    if shots_item.child(i).text(0) == event.name:
+                        shots_item.removeChild(shots_item.child(i))
+                shots_data.pop(event.name, None)
+                continue
+
+            shot_dictionary = self.database.get_project(event.project_name).export_shots().get(event.name)
+            if shot_dictionary is None:
+                continue
+            shot_data = manager_utils.parse_shot_data(shot_dictionary)
+            shots_data[event.name] = shot_data
+            self.populate_tree({event.name: shot_data}, shots_item)
+            self.format_shot_item(shots_item.child(shots_item.childCount() - 1))
+        return True
+
+    def get_shots_item(self, project_display_name: str) -> Optional[QtWidgets.QTreeWidgetItem]:
+        """
+        Get the item holding the shots of a project.
+        :param project_display_name: The name of the project as shown in the tree.
+        :return: The shots item, or None if the project is not in the tree.
+        """
+        for i in range(self.tree.topLevelItemCount()):
+            project_item = self.tree.topLevelItem(i)
+            if project_item.text(0) != project_display_name:
+                continue
+            for j in range(project_item.childCount()):
+                if project_item.child(j).text(0) == 'Shots:':
+                    return project_item.child(j)
+        return None
+
+    def format_shot_item(self, shot_item: QtWidgets.QTreeWidgetItem) -> None:
+        """
+        Format a shot item and its properties the same way format_tree() does.
+        :param shot_item: The shot item to format.
+        """
+        shot_item.setForeground(0, self.shot_color)
+        shot_item.setForeground(1, self.shot_color)
+        for i in range(shot_item.childCount()):
+            shot_item.child(i).setForeground(0, self.primary_tree)
+            shot_item.child(i).setForeground(1, self.secondary_tree)
+
+    def closeEvent(self, event) -> None:
+        """
+        Stop listening to the watch service when the window is closed.
+        """
+        self.watch_service.remove_listener(self.watch_listener)
+        super().closeEvent(event)
+
     def populate_tree(self, data, parent) -> None:
         """
         Populate the tree widget with the data from the database.
@@ -429,7 +512,7 @@ class ProjectOverview(QtWidgets.QWidget):
         Add a shot to the project/database and tree widget.
         :return: True if successful.
         """
-        database = data_manager.ProjectDataManager()
+        database = data_manager.ProjectDataManager.shared()
         selected_project = self.get_top_parent(self.tree.selectedItems()[0])
         if not self.tree.selectedItems():
             return False
@@ -450,9 +533,13 @@ class ProjectOverview(QtWidgets.QWidget):
                              frame_start=int(answers.get('Start Frame')),
                              frame_end=int(answers.get('End Frame')))
 
-        database.add_shot(project, new_shot)
-        log.debug(answers)
-        database.update_project(project)
+        try:
+            with database.batch():
+                database.add_shot(project, new_shot)
+                log.debug(answers)
+                database.update_project(project)
+        except data_accessor.SaveConflictError as e:
+            return self.report_save_conflict(e)
         self.refresh_tree(refresh_data=True)
         data_manager.ProjectDirectoryGenerator(shot_instance=new_shot, push_directories=True)
         return True
@@ -462,7 +549,7 @@ class ProjectOverview(QtWidgets.QWidget):
         Remove a shot from the project/database and tree widget.
         :return: True if successful.
         """
-        database = data_manager.ProjectDataManager()
+        database = data_manager.ProjectDataManager.shared()
         selected_project = self.get_top_parent(self.tree.selectedItems()[0])
         selected_shot = self.tree.selectedItems()[0].text(0)
 
@@ -478,7 +565,10 @@ class ProjectOverview(QtWidgets.QWidget):
             return False
 
         project.remove_shot(shot.name)
-        database.update_project(project)
+        try:
+            database.update_project(project)
+        except data_accessor.SaveConflictError as e:
+            return self.report_save_conflict(e)
         self.refresh_tree(refresh_data=True)
         return True
 
@@ -498,8 +588,11 @@ class ProjectOverview(QtWidgets.QWidget):
         project_description = answers.get("Project Description")
 
         if project_name and project_description:
-            data_manager.ProjectDataManager().add_project(
-                hpipe.core.project.Project(project_name, description=project_description))
+            try:
+                data_manager.ProjectDataManager.shared().add_project(
+                    hpipe.core.project.Project(project_name, description=project_description))
+            except data_accessor.SaveConflictError as e:
+                return self.report_save_conflict(e)
 
         self.refresh_tree(refresh_data=True)
 
@@ -561,13 +654,15 @@ class ProjectOverview(QtWidgets.QWidget):
         Remove a project from the database and tree widget.
         :return: True if successful.
         """
-        database = data_manager.ProjectDataManager()
+        database = data_manager.ProjectDataManager.shared()
         if not self.tree.selectedItems():
             return False
         selected_project = self.get_top_parent(self.tree.selectedItems()[0])
         try:
             project_name = selected_project.text(0).replace(" ", "_").lower()
             database.remove_project(database.get_project(project_name))
+        except data_accessor.SaveConflictError as e:
+            return self.report_save_conflict(e)
         except Exception as e:
             log.error(e)
             return False
@@ -657,10 +752,31 @@ class ProjectOverview(QtWidgets.QWidget):
         :return:
         """
         user_data = self.get_tree_contents(self.tree)
-        database = data_manager.ProjectDataManager()
+        database = data_manager.ProjectDataManager.shared()
         updated_db_data = manager_utils.encode_data(user_data, database)
         database.data = updated_db_data
-        database.save()
+        try:
+            database.save()
+        except data_accessor.SaveConflictError as e:
+            self.report_save_conflict(e)
+
+    def report_save_conflict(self, error: 'data_accessor.SaveConflictError') -> bool:
+        """
+        Tells the user their changes weren't saved because someone else changed the same projects. The changes stay
+        unsaved until they are saved again or discarded, discarding reloads the database from disk.
+        :param error: the rejected save
+        :return: False, the change wasn't saved
+        """
+        log.error(error)
+        answer = QtWidgets.QMessageBox.warning(
+            self, 'Save Conflict',
+            f"Your changes were not saved, someone else changed the same records: {', '.join(error.conflicts)}\n\n"
+            f"Discard your changes and reload the database?",
+            QtWidgets.QMessageBox.Discard | QtWidgets.QMessageBox.Cancel)  # type: ignore
+        if answer == QtWidgets.QMessageBox.Discard:  # type: ignore
+            data_manager.ProjectDataManager.clear_shared()
+            self.refresh_tree(refresh_data=True)
+        return False
 
     def add_shot_tags(self):
         """
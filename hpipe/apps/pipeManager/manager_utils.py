@@ -92,17 +92,25 @@ def parse_data(manager: data_manager.ProjectDataManager) -> dict:
             'Description:': project_instance.description,
             'Date:': project_instance.date
         }
-        for shot_instance in project_instance.get_shots():
-            shot_display_data = {'Start Frame:': shot_instance.frame_start,
-                                 'End Frame:': shot_instance.frame_end,
-                                 'Tags:': shot_instance.get_tags(),
-                                 'User Data:': shot_instance.user_data}
-            shot_name = shot_instance.name
-            project_display_data['Shots:'][shot_name] = shot_display_data
+        # Read the shot dictionaries instead of the shots so that shots that were never accessed aren't built
+        for shot_name, shot_dictionary in project_instance.export_shots().items():
+            project_display_data['Shots:'][shot_name] = parse_shot_data(shot_dictionary)
         display_data[project_name] = project_display_data
     return display_data
 
 
+def parse_shot_data(shot_dictionary: dict) -> dict:
+    """
+    Parse the dictionary of a shot into the reader friendly format of parse_data().
+    :param shot_dictionary: dictionary of the shot as stored in the database
+    :return: display data of the shot
+    """
+    return {'Start Frame:': shot_dictionary['frame_start'],
+            'End Frame:': shot_dictionary['frame_end'],
+            'Tags:': shot_dictionary.get('tags') or [],
+            'User Data:': shot_dictionary.get('user_data') or {}}
+
+
 def encode_data(tree_dictionary: dict, database: data_manager.ProjectDataManager) -> dict:
     """
     Encodes the tree data into database format. Compares against the current DB data.
@@ -0,0 +1,362 @@
+"""
+Integrity checks for the frames of image sequences. Farm tasks that crash while writing leave zero byte or truncated
+files behind, which only show up once someone loads the comp. verify_sequence() finds them without decoding any
+image: it reads the header at the start of each file and a few bytes at the end, on a thread pool since checking a
+frame is mostly waiting on the file server.
+
+    report = image_sequence.verify()
+    if not report.is_valid():
+        log.warning(report.summary())
+"""
+import os
+import statistics
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import *
+
+from hpipe.core import constants
+from hpipe.core.hutils import logger
+
+if TYPE_CHECKING:
+    from hpipe.assets import imageSequence
+
+log = logger.setup_logger()
+log.debug("frame_check.py loaded")
+
+# Bytes read from the start of each file, enough for the header of most renders. Exr headers with lots of metadata are
+# read further, up to MAX_HEADER_SIZE, and only partly checked past that.
+HEADER_READ_SIZE = 4 * 1024
+MAX_HEADER_SIZE = 256 * 1024
+# Frames checked by each task on the pool, so the pool doesn't schedule a task per frame
+FRAMES_PER_TASK = 64
+# A frame is a size outlier if it is under this fraction of the median size and further below the median than
+# OUTLIER_DEVIATIONS median absolute deviations. Sizes vary a lot between frames with motion, so both have to hold.
+OUTLIER_RATIO = 0.5
+OUTLIER_DEVIATIONS = 8.0
+
+EXR_MAGIC = b'\x76\x2f\x31\x01'
+EXR_TILED_FLAG = 0x200
+EXR_NON_IMAGE_FLAG = 0x800
+EXR_MULTIPART_FLAG = 0x1000
+EXR_REQUIRED_ATTRIBUTES = (b'channels', b'compression', b'dataWindow', b'displayWindow', b'lineOrder',
+                           b'pixelAspectRatio', b'screenWindowCenter', b'screenWindowWidth')
+# Scanlines stored in each chunk of a scanline exr, by compression
+EXR_LINES_PER_CHUNK = {0: 1, 1: 1, 2: 1, 3: 16, 4: 32, 5: 16, 6: 32, 7: 32, 8: 32, 9: 256}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JPG_SIGNATURE = b'\xff\xd8\xff'
+JPG_END_MARKER = b'\xff\xd9'
+
+
+class FrameIssue(Enum):
+    """
+    What is wrong with a frame. SIZE_OUTLIER is only a warning, the frame may well be fine, e.g. a black frame.
+    """
+    UNREADABLE = 'unreadable'
+    EMPTY = 'empty'
+    BAD_HEADER = 'bad_header'
+    TRUNCATED = 'truncated'
+    SIZE_OUTLIER = 'size_outlier'
+
+
+class FrameProblem(NamedTuple):
+    """
+    A frame that failed a check.
+    """
+    frame: int
+    issue: FrameIssue
+    message: str
+    path: str
+
+
+class FrameCheck(NamedTuple):
+    """
+    Result of checking a single file. issue is None if the file passed.
+    """
+    size: int
+    issue: Optional[FrameIssue] = None
+    message: str = ''
+
+
+class VerifyReport(NamedTuple):
+    """
+    Result of verifying an image sequence.
+    """
+    sequence_name: str
+    start_frame: int
+    end_frame: int
+    frame_count: int
+    missing_frames: 'imageSequence.FrameSet'
+    problems: List[FrameProblem]
+    total_size: int
+    median_size: float
+    duration: float
+
+    def is_valid(self) -> bool:
+        """
+        Checks whether every frame of the range is on disk and passed the checks. Size outliers don't count.
+        """
+        return not self.missing_frames and not self.get_bad_frames()
+
+    def get_bad_frames(self) -> List[int]:
+        """
+        Returns the frames whose files are broken, sorted by frame.
+        """
+        return sorted({problem.frame for problem in self.problems if problem.issue != FrameIssue.SIZE_OUTLIER})
+
+    def get_problems(self, issue: FrameIssue) -> List[FrameProblem]:
+        """
+        Returns the problems of a kind.
+        :param issue: kind of problem
+        :return: problems sorted by frame
+        """
+        return [problem for problem in self.problems if problem.issue == issue]
+
+    def summary(self) -> str:
+        """
+        Returns a one line summary of the report for logs and tooltips.
+        """
+        parts = [f"{self.sequence_name} {self.start_frame}-{self.end_frame}: {self.frame_count} frames checked"]
+        if self.missing_frames:
+            parts.append(f"{len(self.missing_frames)} missing ({self.missing_frames})")
+        for issue in FrameIssue:
+            frames = [problem.frame for problem in self.get_problems(issue)]
+            if frames:
+                parts.append(f"{len(frames)} {issue.value.replace('_', ' ')} ({', '.join(map(str, frames[:10]))}"
+                             f"{', ...' if len(frames) > 10 else ''})")
+        return ', '.join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Converts the report to a json serializable dictionary.
+        """
+        return {
+            'sequence_name': self.sequence_name,
+            'start_frame': self.start_frame,
+            'end_frame': self.end_frame,
+            'frame_count': self.frame_count,
+            'missing_frames': str(self.missing_frames),
+            'problems': [{'frame': problem.frame, 'issue': problem.issue.value, 'message': problem.message,
+                          'path': problem.path} for problem in self.problems],
+            'total_size': self.total_size,
+            'median_size': self.median_size,
+            'duration': self.duration,
+        }
+
+
+def verify_sequence(image_sequence: 'imageSequence.GenericImageSequence', start_frame: Optional[int] = None,
+                    end_frame: Optional[int] = None,
+                    max_workers: int = constants.SCAN_MAX_WORKERS) -> VerifyReport:
+    """
+    Checks every frame of an image sequence between the start and end frame: that its file isn't empty, that its
+    header is valid and that it isn't truncated, and compares the file sizes to find frames much smaller than the rest.
+    :param image_sequence: image sequence to verify
+    :param start_frame: first frame the sequence should have, defaults to its start frame
+    :param end_frame: last frame the sequence should have, defaults to its end frame
+    :param int max_workers: number of files checked at once
+    :return: report of the missing frames and the problems found
+    """
+    start_time = time.perf_counter()
+    start_frame = image_sequence.start_frame if start_frame is None else start_frame
+    end_frame = image_sequence.end_frame if end_frame is None else end_frame
+    extension = image_sequence.get_extension().lower()
+
+    frame_paths = [(frame, image_sequence.get_frame_path(frame))
+                   for frame in image_sequence.frames.select(start_frame, end_frame)]
+    tasks = [frame_paths[index:index + FRAMES_PER_TASK] for index in range(0, len(frame_paths), FRAMES_PER_TASK)]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='hpipe_verify') as executor:
+        task_checks = executor.map(lambda task: [check_frame(path, extension) for _, path in task], tasks)
+        checks = [check for task_check in task_checks for check in task_check]
+
+    problems = []
+    sizes = []
+    for (frame, path), check in zip(frame_paths, checks):
+        if check.issue is not None:
+            problems.append(FrameProblem(frame, check.issue, check.message, path))
+        elif check.size:
+            sizes.append((frame, path, check.size))
+
+    median_size = float(statistics.median(size for _, _, size in sizes)) if sizes else 0.0
+    problems += find_size_outliers(sizes, median_size)
+    problems.sort(key=lambda problem: problem.frame)
+
+    report = VerifyReport(image_sequence.asset_name or image_sequence.basename, start_frame, end_frame,
+                          len(frame_paths), image_sequence.missing_frames(start_frame, end_frame), problems,
+                          sum(check.size for check in checks), median_size, time.perf_counter() - start_time)
+    if report.is_valid():
+        log.debug(report.summary())
+    else:
+        log.warning(report.summary())
+    return report
+
+
+def find_size_outliers(sizes: List[Tuple[int, str, int]], median_size: float) -> List[FrameProblem]:
+    """
+    Finds the frames much smaller than the median size, using the median absolute deviation so the outliers themselves
+    don't skew the statistics.
+    :param sizes: frame, path and size of each frame that passed the other checks
+    :param median_size: median of the sizes
+    :return: problems of the outliers
+    """
+    if len(sizes) < 3:
+        return []
+    deviation = statistics.median(abs(size - median_size) for _, _, size in sizes)
+    threshold = min(median_size * OUTLIER_RATIO, median_size - OUTLIER_DEVIATIONS * deviation)
+    return [FrameProblem(frame, FrameIssue.SIZE_OUTLIER, f"{size} bytes, median is {median_size:.0f} bytes", path)
+            for frame, path, size in sizes if size < threshold]
+
+
+def check_frame(frame_path: str, extension: str) -> FrameCheck:
+    """
+    Checks a single file without decoding the image, only its header and a few bytes at its end are read.
+    :param frame_path: path of the file
+    :param extension: lower case extension of the file, picks the checks to run
+    :return: size of the file and the issue found if any
+    """
+    try:
+        with open(frame_path, 'rb') as frame_file:
+            size = os.fstat(frame_file.fileno()).st_size
+            if size == 0:
+                return FrameCheck(0, FrameIssue.EMPTY, "File is empty")
+            header_check = HEADER_CHECKS.get(extension)
+            if header_check is None:
+                return FrameCheck(size)
+            issue = header_check(frame_file, frame_file.read(HEADER_READ_SIZE), size)
+    except OSError as e:
+        return FrameCheck(0, FrameIssue.UNREADABLE, str(e))
+    except struct.error as e:
+        # A header field the checks rely on doesn't hold what it should, e.g. the file changed while being read
+        return FrameCheck(size, FrameIssue.BAD_HEADER, f"Could not read the header: {e}")
+    if issue is None:
+        return FrameCheck(size)
+    return FrameCheck(size, *issue)
+
+
+def _check_exr(frame_file: BinaryIO, header: bytes, size: int) -> Optional[Tuple[FrameIssue, str]]:
+    """
+    Checks the magic number and header of an exr. For single part scanline files, also checks that the offset table
+    after the header is filled in and that the last chunk ends before the end of the file.
+    """
+    if header[:4] != EXR_MAGIC:
+        return FrameIssue.BAD_HEADER, "Not an OpenEXR file"
+    if len(header) < 8:
+        return FrameIssue.TRUNCATED, "File ends in the header"
+    version = int.from_bytes(header[4:8], 'little')
+    if version & 0xff != 2:
+        return FrameIssue.BAD_HEADER, f"Unsupported OpenEXR version {version & 0xff}"
+
+    try:
+        attributes, header_end = _parse_exr_header(header, 8)
+        while header_end is None and len(header) < min(size, MAX_HEADER_SIZE):
+            header += frame_file.read(len(header))
+            attributes, header_end = _parse_exr_header(header, 8)
+    except ValueError as e:
+        return FrameIssue.BAD_HEADER, str(e)
+    if header_end is None:
+        if size <= len(header):
+            return FrameIssue.TRUNCATED, "File ends in the header"
+        # The header is larger than what was read, the rest can't be checked
+        return None
+    missing_attributes = [name.decode() for name in EXR_REQUIRED_ATTRIBUTES if name not in attributes]
+    if missing_attributes:
+        return FrameIssue.BAD_HEADER, f"Header is missing {', '.join(missing_attributes)}"
+
+    # Tiled, deep and multipart files have a more involved chunk layout, their header check is enough
+    if version & (EXR_TILED_FLAG | EXR_NON_IMAGE_FLAG | EXR_MULTIPART_FLAG):
+        return None
+    compression = attributes[b'compression']
+    lines_per_chunk = EXR_LINES_PER_CHUNK.get(compression[0]) if compression else None
+    if lines_per_chunk is None or len(attributes[b'dataWindow']) != 16:
+        return None
+    _, y_min, _, y_max = struct.unpack('<4i', attributes[b'dataWindow'])
+    chunk_count = -(-(y_max - y_min + 1) // lines_per_chunk)
+    if chunk_count <= 0:
+        return FrameIssue.BAD_HEADER, f"Data window has no lines, y goes from {y_min} to {y_max}"
+    table_end = header_end + chunk_count * 8
+    if table_end > size:
+        return FrameIssue.TRUNCATED, "File ends in the offset table"
+    if table_end <= len(header):
+        offset_table = header[header_end:table_end]
+    else:
+        frame_file.seek(header_end)
+        offset_table = frame_file.read(chunk_count * 8)
+    offsets = struct.unpack(f'<{chunk_count}Q', offset_table)
+
+    # Offsets are written once every chunk is, a file left behind by a crash has zeros or garbage there
+    if min(offsets) < table_end:
+        return FrameIssue.TRUNCATED, "Offset table was never filled in, the file wasn't finished writing"
+    last_offset = max(offsets)
+    if last_offset + 8 > size:
+        return FrameIssue.TRUNCATED, f"File is cut off, the last chunk starts {last_offset - size} bytes past its end"
+    frame_file.seek(last_offset)
+    _, data_size = struct.unpack('<2i', frame_file.read(8))
+    chunk_end = last_offset + 8 + data_size
+    if data_size < 0 or chunk_end > size:
+        return FrameIssue.TRUNCATED, f"Last chunk ends {chunk_end - size} bytes past the end of the file"
+    return None
+
+
+def _parse_exr_header(header: bytes, position: int) -> Tuple[Dict[bytes, bytes], Optional[int]]:
+    """
+    Reads the attributes of the first header of an exr.
+    :param header: bytes read from the start of the file
+    :param position: position of the first attribute
+    :return: attribute values by name, and the position after the header or None if it doesn't end in the bytes read
+    """
+    attributes = {}
+    header_size = len(header)
+    while position < header_size:
+        name_end = header.find(b'\0', position)
+        if name_end == position:
+            return attributes, position + 1
+        type_end = header.find(b'\0', name_end + 1) if name_end != -1 else -1
+        if type_end == -1 or type_end + 5 > header_size:
+            break
+        value_size = struct.unpack_from('<i', header, type_end + 1)[0]
+        if value_size < 0:
+            raise ValueError(f"Attribute {header[position:name_end].decode(errors='replace')} has a negative size")
+        value_start = type_end + 5
+        value_end = value_start + value_size
+        if value_end > header_size:
+            break
+        attributes[header[position:name_end]] = header[value_start:value_end]
+        position = value_end
+    return attributes, None
+
+
+def _check_png(frame_file: BinaryIO, header: bytes, size: int) -> Optional[Tuple[FrameIssue, str]]:
+    """
+    Checks the signature and IHDR chunk of a png, and that it ends with an IEND chunk.
+    """
+    if header[:8] != PNG_SIGNATURE:
+        return FrameIssue.BAD_HEADER, "Not a PNG file"
+    if header[12:16] != b'IHDR':
+        return FrameIssue.BAD_HEADER, "PNG doesn't start with an IHDR chunk"
+    if size < 8 + 25 + 12:
+        return FrameIssue.TRUNCATED, "File is too small to hold an image"
+    frame_file.seek(size - 12)
+    if frame_file.read(12)[4:8] != b'IEND':
+        return FrameIssue.TRUNCATED, "PNG doesn't end with an IEND chunk"
+    return None
+
+
+def _check_jpg(frame_file: BinaryIO, header: bytes, size: int) -> Optional[Tuple[FrameIssue, str]]:
+    """
+    Checks the start of image marker of a jpg, and that it ends with an end of image marker.
+    """
+    if header[:3] != JPG_SIGNATURE:
+        return FrameIssue.BAD_HEADER, "Not a JPEG file"
+    # Some writers pad the file after the end of image marker
+    frame_file.seek(max(size - 32, 0))
+    if not frame_file.read(32).rstrip(b'\0').endswith(JPG_END_MARKER):
+        return FrameIssue.TRUNCATED, "JPEG doesn't end with an end of image marker"
+    return None
+
+
+HEADER_CHECKS: Dict[str, Callable[[BinaryIO, bytes, int], Optional[Tuple[FrameIssue, str]]]] = {
+    'exr': _check_exr,
+    'png': _check_png,
+    'jpg': _check_jpg,
+    'jpeg': _check_jpg,
+}
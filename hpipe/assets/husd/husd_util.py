@@ -13,6 +13,7 @@ shot.usd
         ]
 """
 import os
+from typing import *
 from hpipe.core.hutils import system, logger
 from hpipe.core import data_manager
 from hpipe.core import constants
@@ -26,8 +27,11 @@ class ShotUsd:
     """
     Shot USD class for managing the shot USD file.
     """
-    def __init__(self, project_name: str, shot_name: str):
-        self.database = data_manager.ProjectDataManager()
+    def __init__(self, project_name: str, shot_name: str,
+                 database: Optional['data_manager.ProjectDataManager'] = None):
+        if not database:
+            database = data_manager.ProjectDataManager()
+        self.database = database
         self.project = self.database.get_project(project_name)
         self.shot = self.project.get_shot(shot_name)
         self.usd_filepath = self.get_usd_file()
@@ -1,4 +1,8 @@
+import bisect
+import hashlib
 import os
+import tempfile
+from array import array
 from typing import *
 
 OIIO = False
@@ -16,8 +20,8 @@ except ImportError:
     pass
 
 
-from hpipe.assets import asset
-from hpipe.core.hutils import logger, system
+from hpipe.assets import asset, frame_check, review_encode
+from hpipe.core.hutils import logger, scan_cache, system, walker
 from hpipe.core import constants
 
 if TYPE_CHECKING:
@@ -26,17 +30,303 @@ if TYPE_CHECKING:
 log = logger.setup_logger()
 log.debug("ImageSequence.py loaded")
 
+IMAGE_EXTENSIONS = ('exr', 'jpg', 'png')
+
+
+class FrameSet:
+    """
+    Compact set of frame numbers, stored as sorted runs of consecutive frames like 1001-1050,1052-1100. A complete
+    render is a single run, so a 20k frame sequence takes a few hundred bytes instead of a list of 20k frames. Gaps,
+    lookups and indexing work on the runs and never on the frames one by one.
+    """
+    __slots__ = ('_starts', '_ends', '_offsets')
+
+    def __init__(self, runs: Iterable[Tuple[int, int]] = ()):
+        """
+        :param runs: Inclusive (start, end) runs of frames, in any order. Overlapping and adjacent runs are merged.
+        """
+        self._starts = array('q')
+        self._ends = array('q')
+        # Index of the first frame of each run, for indexing the set like a sorted list
+        self._offsets = array('q')
+        frame_count = 0
+        for start, end in sorted(runs):
+            if start > end:
+                raise ValueError(f"Frame run {start}-{end} ends before it starts.")
+            if self._ends and start <= self._ends[-1] + 1:
+                if end > self._ends[-1]:
+                    frame_count += end - self._ends[-1]
+                    self._ends[-1] = end
+                continue
+            self._starts.append(start)
+            self._ends.append(end)
+            self._offsets.append(frame_count)
+            frame_count += end - start + 1
+
+    @classmethod
+    def from_frames(cls, frames: Iterable[int]) -> 'FrameSet':
+        """
+        Builds a frame set from frame numbers. Sorted frames are read in a single pass, duplicates are ignored.
+        :param frames: Frame numbers
+        :return: Frame set
+        """
+        frames = frames if isinstance(frames, (list, tuple, array, range)) else list(frames)
+        runs = []
+        run_start = run_end = None
+        for frame in frames:
+            if run_end is None:
+                run_start = run_end = frame
+            elif frame == run_end + 1:
+                run_end = frame
+            elif frame > run_end:
+                runs.append((run_start, run_end))
+                run_start = run_end = frame
+            elif frame < run_start:
+                # Not sorted after all, the constructor sorts and merges the runs
+                return cls((frame, frame) for frame in frames)
+        if run_end is not None:
+            runs.append((run_start, run_end))
+        return cls(runs)
+
+    @classmethod
+    def parse(cls, frames_text: str) -> 'FrameSet':
+        """
+        Parses a frame set from its string form, e.g. 1001-1050,1052-1100
+        :param frames_text: Comma separated frames and inclusive frame ranges
+        :return: Frame set
+        """
+        runs = []
+        for run_text in frames_text.split(','):
+            run_text = run_text.strip()
+            if not run_text:
+                continue
+            # The separator is the first dash after the start, so negative frames like -10--5 parse too
+            separator_index = run_text.find('-', 1)
+            try:
+                if separator_index == -1:
+                    runs.append((int(run_text), int(run_text)))
+                else:
+                    runs.append((int(run_text[:separator_index]), int(run_text[separator_index + 1:])))
+            except ValueError:
+                raise ValueError(f"Could not parse frame range {run_text} in {frames_text}.")
+        return cls(runs)
+
+    def __repr__(self) -> str:
+        return f"FrameSet({self})"
+
+    def __str__(self) -> str:
+        return ','.join(str(start) if start == end else f"{start}-{end}" for start, end in self.runs())
+
+    def __len__(self) -> int:
+        if not self._starts:
+            return 0
+        return self._offsets[-1] + self._ends[-1] - self._starts[-1] + 1
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end + 1)
+
+    def __contains__(self, frame: int) -> bool:
+        run_index = bisect.bisect_right(self._starts, frame) - 1
+        return run_index >= 0 and frame <= self._ends[run_index]
+
+    def __getitem__(self, index: int) -> int:
+        frame_count = len(self)
+        if index < 0:
+            index += frame_count
+        if not 0 <= index < frame_count:
+            raise IndexError(f"Frame index {index} out of range for {frame_count} frames.")
+        run_index = bisect.bisect_right(self._offsets, index) - 1
+        return self._starts[run_index] + index - self._offsets[run_index]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FrameSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    @property
+    def start(self) -> int:
+        """
+        First frame of the set
+        """
+        if not self._starts:
+            raise ValueError("Frame set is empty.")
+        return self._starts[0]
+
+    @property
+    def end(self) -> int:
+        """
+        Last frame of the set
+        """
+        if not self._ends:
+            raise ValueError("Frame set is empty.")
+        return self._ends[-1]
+
+    def runs(self) -> List[Tuple[int, int]]:
+        """
+        Returns the runs of consecutive frames in the set.
+        :return: List of inclusive (start, end) runs, sorted by frame
+        """
+        return list(zip(self._starts, self._ends))
+
+    def index(self, frame: int) -> int:
+        """
+        Returns the position of a frame in the set.
+        :param frame: Frame number
+        :return: Index of the frame, counting from the first frame of the set
+        """
+        run_index = bisect.bisect_right(self._starts, frame) - 1
+        if run_index < 0 or frame > self._ends[run_index]:
+            raise ValueError(f"Frame {frame} is not in {self}.")
+        return self._offsets[run_index] + frame - self._starts[run_index]
+
+    def missing(self, start: int, end: int) -> 'FrameSet':
+        """
+        Returns the frames between start and end that aren't in the set.
+        :param start: First frame of the range to check
+        :param end: Last frame of the range to check
+        :return: Frame set of the missing frames
+        """
+        missing_runs = []
+        next_frame = start
+        first_run_index = max(bisect.bisect_right(self._starts, start) - 1, 0)
+        for run_index in range(first_run_index, len(self._starts)):
+            run_start, run_end = self._starts[run_index], self._ends[run_index]
+            if run_start > end:
+                break
+            if run_start > next_frame:
+                missing_runs.append((next_frame, run_start - 1))
+            next_frame = max(next_frame, run_end + 1)
+        if next_frame <= end:
+            missing_runs.append((next_frame, end))
+        return FrameSet(missing_runs)
+
+    def is_complete(self, start: int, end: int) -> bool:
+        """
+        Checks if every frame between start and end is in the set.
+        :param start: First frame of the range to check
+        :param end: Last frame of the range to check
+        :return: True if no frame is missing, False if not
+        """
+        run_index = bisect.bisect_right(self._starts, start) - 1
+        return run_index >= 0 and self._ends[run_index] >= end
+
+    def select(self, start: int, end: int, step: int = 1) -> 'FrameSet':
+        """
+        Returns the frames of the set between start and end. Only the runs overlapping the range are read.
+        :param start: First frame of the range
+        :param end: Last frame of the range
+        :param step: Keeps every step-th frame counting from start, e.g. 2 keeps start, start + 2, ...
+        :return: Frame set of the selected frames
+        """
+        if step < 1:
+            raise ValueError(f"Frame step {step} has to be 1 or more.")
+        selected_runs = []
+        first_run_index = max(bisect.bisect_right(self._starts, start) - 1, 0)
+        for run_index in range(first_run_index, len(self._starts)):
+            run_start, run_end = max(self._starts[run_index], start), min(self._ends[run_index], end)
+            if run_start > end:
+                break
+            if run_start > run_end:
+                continue
+            if step == 1:
+                selected_runs.append((run_start, run_end))
+            else:
+                # First frame of the run that is a whole number of steps from start
+                first_frame = run_start + (start - run_start) % step
+                selected_runs.extend((frame, frame) for frame in range(first_frame, run_end + 1, step))
+        return FrameSet(selected_runs)
+
+
+class FrameName(NamedTuple):
+    """
+    Parts of the file name of a frame of an image sequence, name_####.ext
+    """
+    basename: str
+    frame: int
+    padding: int
+    extension: str
+
+
+class SequenceGroup(NamedTuple):
+    """
+    Frames of one image sequence found by a scan: the files in a directory with the same basename and extension. The
+    file of a frame is named after the path template of the group, file_names is only set for the few sequences whose
+    names don't follow a single padding, and then holds a name per frame in frame order.
+    """
+    directory_path: str
+    basename: str
+    extension: str
+    padding: int
+    frames: FrameSet
+    file_names: Optional[List[str]] = None
+
+    def to_list(self) -> list:
+        """
+        Converts the group to a json serializable list, the frames are stored as their ranges.
+        """
+        return [self.directory_path, self.basename, self.extension, self.padding, str(self.frames), self.file_names]
+
+    @classmethod
+    def from_list(cls, group_list: list) -> 'SequenceGroup':
+        """
+        Converts a list made by to_list back to a group.
+        """
+        directory_path, basename, extension, padding, frames_text, file_names = group_list
+        return cls(directory_path, basename, extension, padding, FrameSet.parse(frames_text), file_names)
+
+
+class SequenceFilepaths(Sequence):
+    """
+    Read only list of the filepaths of the frames of an image sequence. The Filepath of a frame is only built when it is
+    accessed, so a sequence doesn't hold on to an object per frame.
+    """
+    __slots__ = ('image_sequence',)
+
+    def __init__(self, image_sequence: 'GenericImageSequence'):
+        self.image_sequence = image_sequence
+
+    def __repr__(self) -> str:
+        return f"SequenceFilepaths({self.image_sequence.path_template} {self.image_sequence.frames})"
+
+    def __len__(self) -> int:
+        return len(self.image_sequence.frames)
+
+    def __iter__(self) -> Iterator['system.Filepath']:
+        for frame in self.image_sequence.frames:
+            yield system.Filepath(self.image_sequence.get_frame_path(frame))
+
+    def __getitem__(self, index: Union[int, slice]) -> Union['system.Filepath', List['system.Filepath']]:
+        if isinstance(index, slice):
+            return [self[frame_index] for frame_index in range(*index.indices(len(self)))]
+        return system.Filepath(self.image_sequence.get_frame_path(self.image_sequence.frames[index]))
+
 
 class GenericImageSequence(asset.Asset):
     """
-    Class for an image sequence. Stores related images as a list of filepaths.
+    Class for an image sequence. Stores the frame numbers as a FrameSet and the path template shared by the frames,
+    the filepaths are built when they are accessed.
     """
-    def __init__(self, filepaths: List['system.Filepath'], asset_name: str = '',
-                 start_frame: int = 0, end_frame: int = 0):
+    def __init__(self, filepaths: Sequence['system.Filepath'] = (), asset_name: str = '',
+                 start_frame: int = 0, end_frame: int = 0, group: Optional[SequenceGroup] = None):
+        """
+        :param filepaths: Filepaths of the frames, in any order. Ignored if a group is given.
+        :param asset_name: Name of the image sequence
+        :param start_frame: Start frame, taken from the frames if 0
+        :param end_frame: End frame, taken from the frames if 0
+        :param group: Frames of the sequence found by a scan, so no Filepath has to be built or parsed
+        """
         super().__init__(asset_name)
 
-        self.filepaths = filepaths
-        self.sort_filepaths()
+        if group is None:
+            group = group_from_filepaths(filepaths)
+        self.directory_path = group.directory_path
+        self.basename = group.basename
+        self.extension = group.extension
+        self.padding = group.padding
+        self.frames = group.frames
+        self.file_names = group.file_names
+        self.path_template = f"{self.directory_path}/{self.basename}_%0{self.padding}d.{self.extension}"
 
         if start_frame == 0:
             start_frame = self.get_start_frame()
@@ -47,11 +337,43 @@ class GenericImageSequence(asset.Asset):
         self.start_frame = start_frame
         self.end_frame = end_frame
         self.asset_type = asset.AssetType.IMAGE_SEQUENCE
+        # Whether this is a frame range of a sequence made by slicing it, its video is named after the frames
+        self.is_view = False
 
     def __repr__(self) -> str:
         return f"ImageSequence {self.get_start_frame()}-{self.get_end_frame()} @ <{self.asset_name}> " \
                f"from <{self.filepaths[0].filepath_path}>"
 
+    @property
+    def filepaths(self) -> SequenceFilepaths:
+        """
+        Filepaths of the frames, sorted by frame number. Each Filepath is built when it is accessed.
+        """
+        return SequenceFilepaths(self)
+
+    def __getitem__(self, frames: slice) -> 'GenericImageSequence':
+        """
+        Returns a sequence of a frame range of this one, e.g. plate[1001:1025] for frames 1001 to 1024 or
+        plate[::10] for every tenth frame. The bounds are frame numbers and the end is left out, like range(). The
+        new sequence shares the path template, only the frame set of the range is built.
+        :param frames: Slice of frame numbers, the start and end default to the start and end frame
+        :return: Image sequence of the same type with the frames in the range
+        """
+        if not isinstance(frames, slice):
+            raise TypeError(f"Image sequences are sliced by frame range, not indexed by {type(frames).__name__}.")
+        if not self.frames:
+            return self
+        start = self.frames.start if frames.start is None else frames.start
+        end = self.frames.end if frames.stop is None else frames.stop - 1
+        frame_set = self.frames.select(start, end, 1 if frames.step is None else frames.step)
+        file_names = None
+        if self.file_names is not None:
+            file_names = [self.file_names[self.frames.index(frame)] for frame in frame_set]
+        group = SequenceGroup(self.directory_path, self.basename, self.extension, self.padding, frame_set, file_names)
+        view = type(self)(asset_name=self.asset_name, group=group)
+        view.is_view = self.is_view or frame_set != self.frames
+        return view
+
     def to_dict(self) -> Dict[str, Any]:
         """
         Converts the asset to a dictionary.
@@ -62,18 +384,23 @@ class GenericImageSequence(asset.Asset):
             'asset_type': self.asset_type.value,
             'start_frame': self.start_frame,
             'end_frame': self.end_frame,
-            'filepaths': [filepath.filepath_path for filepath in self.filepaths]
+            'group': self.get_group().to_list()
         }
 
     @classmethod
-    def from_dict(asset_dict: Dict[Any, Any]) -> 'GenericImageSequence':
+    def from_dict(cls, asset_dict: Dict[Any, Any]) -> 'GenericImageSequence':
         """
-        Converts a dictionary to an asset.
+        Converts a dictionary to an asset. Dictionaries saved before the frames were stored as a group list the path
+        of every frame instead.
         :param asset_dict: Dictionary to convert.
-        :return: None
+        :return: Image sequence
         """
-        return GenericImageSequence(asset_dict['filepaths'], asset_dict['asset_name'],
-                                    asset_dict['start_frame'], asset_dict['end_frame'])
+        if 'group' in asset_dict:
+            group = SequenceGroup.from_list(asset_dict['group'])
+        else:
+            group = group_from_filepaths([system.Filepath(path) for path in asset_dict.get('filepaths', [])])
+        return cls(asset_name=asset_dict['asset_name'], start_frame=asset_dict['start_frame'],
+                   end_frame=asset_dict['end_frame'], group=group)
 
     def get_filepath(self) -> 'system.Filepath':
         """
@@ -82,29 +409,46 @@ class GenericImageSequence(asset.Asset):
         """
         return self.get_parent_directory()
 
+    def get_group(self) -> SequenceGroup:
+        """
+        Returns the frames of the image sequence as a group, to serialize it or build another sequence from it.
+        """
+        return SequenceGroup(self.directory_path, self.basename, self.extension, self.padding, self.frames,
+                             self.file_names)
+
+    def get_frame_path(self, frame: int) -> str:
+        """
+        Returns the path of the file of a frame, without building a Filepath.
+        :param frame: Frame number
+        :return: Path of the frame
+        """
+        if self.file_names is not None:
+            return f"{self.directory_path}/{self.file_names[self.frames.index(frame)]}"
+        return self.path_template % frame
+
     def get_start_frame(self) -> int:
         """
         Returns the start frame of the image sequence.
         :return: int start frame
         """
-        if len(self.filepaths) == 0:
+        if not self.frames:
             return -1
-        return self.filepaths[0].get_frame_number()
+        return self.frames.start
 
     def get_end_frame(self) -> int:
         """
         Returns the end frame of the image sequence.
         :return: int end frame
         """
-        if len(self.filepaths) == 0:
+        if not self.frames:
             return -1
-        return self.filepaths[-1].get_frame_number()
+        return self.frames.end
 
     def get_extension(self) -> str:
         """
         Returns the extension of the image sequence.
         """
-        return self.filepaths[0].get_extension()
+        return self.extension
 
     def get_total_frames(self) -> int:
         """
@@ -112,28 +456,67 @@ class GenericImageSequence(asset.Asset):
         """
         return self.end_frame - self.start_frame + 1
 
+    def get_frame_count(self) -> int:
+        """
+        Returns the number of frames on disk, which is less than the total frames if frames are missing.
+        """
+        return len(self.frames)
+
+    def missing_frames(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None) -> FrameSet:
+        """
+        Returns the frames of a frame range that aren't on disk.
+        :param start_frame: First frame of the range, defaults to the start frame of the sequence
+        :param end_frame: Last frame of the range, defaults to the end frame of the sequence
+        :return: Frame set of the missing frames
+        """
+        start_frame = self.start_frame if start_frame is None else start_frame
+        end_frame = self.end_frame if end_frame is None else end_frame
+        return self.frames.missing(start_frame, end_frame)
+
+    def is_complete(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None) -> bool:
+        """
+        Checks if every frame of a frame range is on disk, e.g. is_complete(shot.frame_start, shot.frame_end)
+        :param start_frame: First frame of the range, defaults to the start frame of the sequence
+        :param end_frame: Last frame of the range, defaults to the end frame of the sequence
+        :return: True if no frame is missing, False if not
+        """
+        start_frame = self.start_frame if start_frame is None else start_frame
+        end_frame = self.end_frame if end_frame is None else end_frame
+        return self.frames.is_complete(start_frame, end_frame)
+
+    def verify(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None,
+               max_workers: int = constants.SCAN_MAX_WORKERS) -> 'frame_check.VerifyReport':
+        """
+        Checks the files of the frames for empty, truncated or corrupt frames, without decoding any image.
+        :param start_frame: First frame the sequence should have, defaults to the start frame of the sequence
+        :param end_frame: Last frame the sequence should have, defaults to the end frame of the sequence
+        :param max_workers: Number of files checked at once
+        :return: Report of the missing frames and the problems found
+        """
+        return frame_check.verify_sequence(self, start_frame, end_frame, max_workers)
+
     def get_parent_directory(self) -> 'system.Directory':
         """
         Returns the parent directory of the image sequence.
         """
-        if len(self.filepaths) == 0:
+        if not self.frames:
             raise ValueError("Image sequence has no parent directory.")
-        return self.filepaths[0].get_parent_directory()
+        return system.Directory(self.directory_path)
 
     def get_basename(self) -> str:
         """
         Returns the basename of the image sequence.
         """
-        if len(self.filepaths) == 0:
+        if not self.frames:
             raise ValueError("Image sequence has no basename.")
-        return self.filepaths[0].get_filename()
+        return self.basename
 
     def sort_filepaths(self) -> bool:
         """
-        Sorts the filepaths in the image sequence by frame number.
+        Sorts the filepaths in the image sequence by frame number. The frames are always kept sorted, so there is
+        nothing left to do.
         :return: True if successful, False if not
         """
-        self.filepaths.sort(key=lambda x: x.get_frame_number())
         return True
 
     def get_metadata(self) -> dict:
@@ -182,50 +565,75 @@ class GenericImageSequence(asset.Asset):
         new_sequence = sequences_from_directory(target_directory)[0]
         return new_sequence
 
-    def to_mp4(self, target_directory: 'system.Directory' = system.Directory(r'.')) -> 'system.Filepath':
+    def get_mp4_path(self, target_directory: 'system.Directory' = system.Directory(r'.')) -> 'system.Filepath':
         """
-        Converts the image sequence to a mp4 video.
+        Returns the path of the mp4 video of the image sequence. The video of a frame range made by slicing the
+        sequence has the frames in its name, e.g. plate.1001-1024.mp4, so it never takes the place of the full video.
+        :param target_directory: Directory of the video, defaults to the parent of the sequence's directory
         :returns: the target filepath
         """
-
         if target_directory.directory_path == '.' or target_directory.directory_path == './':
             target_directory = self.get_parent_directory().get_parent_directory()
+        name = self.get_basename()
+        if self.is_view and self.frames:
+            name = f"{name}.{self._get_frames_name()}"
+        return system.Filepath(f"{target_directory.directory_path}/{name}.mp4")
 
-        log.info(f'Target Directory: {target_directory.directory_path}')
-        target_file = system.Filepath(f"{target_directory.directory_path}/{self.get_basename()}.mp4")
+    def _get_frames_name(self) -> str:
+        """
+        Returns a name for the frames of the sequence, e.g. 1001-1024, or 1001-1091x10 for every tenth frame. Frames
+        without a single step are named after their range and a hash of the frames.
+        """
+        frames_name = f"{self.frames.start}-{self.frames.end}"
+        runs = self.frames.runs()
+        if len(runs) == 1:
+            return frames_name
+        steps = {next_start - start for (start, _), (next_start, _) in zip(runs, runs[1:])}
+        if len(steps) == 1 and all(start == end for start, end in runs):
+            return f"{frames_name}x{steps.pop()}"
+        return f"{frames_name}_{hashlib.blake2b(str(self.frames).encode(), digest_size=4).hexdigest()}"
+
+    def to_mp4(self, target_directory: 'system.Directory' = system.Directory(r'.'),
+               frame_rate: float = constants.FRAME_RATE) -> 'system.Filepath':
+        """
+        Converts the image sequence to a mp4 video.
+        :param target_directory: Directory to write the video to, defaults to the parent of the sequence's directory
+        :param frame_rate: Frame rate of the video, see Project.get_frame_rate
+        :returns: the target filepath
+        """
+
+        target_file = self.get_mp4_path(target_directory)
+        log.info(f'Target Directory: {target_file.get_parent_directory().directory_path}')
 
         if os.path.exists(target_file.filepath_path):
             log.warning(f"File already exists: {target_file}")
             return target_file
 
-        sequence_to_video(self, target_file)
+        sequence_to_video(self, target_file, frame_rate)
 
         return target_file
 
 
 class ExrImageSequence(GenericImageSequence):
     """
-    Class for an exr image sequence. Stores related images as a list of filepaths.
+    Class for an exr image sequence.
     """
-    def __init__(self, filepaths: List['system.Filepath'], asset_name: str = '',
-                 start_frame: int = 0, end_frame: int = 0):
-        super().__init__(filepaths, asset_name, start_frame, end_frame)
+    def __init__(self, filepaths: Sequence['system.Filepath'] = (), asset_name: str = '',
+                 start_frame: int = 0, end_frame: int = 0, group: Optional[SequenceGroup] = None):
+        super().__init__(filepaths, asset_name, start_frame, end_frame, group)
 
     def __repr__(self) -> str:
         return f"EXR ImageSequence {self.get_start_frame()}-{self.get_end_frame()} @ <{self.asset_name}> " \
                f"from <{self.get_parent_directory().directory_path}>"
 
-    def to_mp4(self, target_directory: 'system.Directory' = system.Directory(r'.//')) -> 'system.Filepath':
-        raise NotImplementedError("EXR to MP4 conversion not implemented yet.")
-
 
 class JpgImageSequence(GenericImageSequence):
     """
-    Class for a jpg image sequence. Stores related images as a list of filepaths.
+    Class for a jpg image sequence.
     """
-    def __init__(self, filepaths: List['system.Filepath'], asset_name: str = '',
-                 start_frame: int = 0, end_frame: int = 0):
-        super().__init__(filepaths, asset_name, start_frame, end_frame)
+    def __init__(self, filepaths: Sequence['system.Filepath'] = (), asset_name: str = '',
+                 start_frame: int = 0, end_frame: int = 0, group: Optional[SequenceGroup] = None):
+        super().__init__(filepaths, asset_name, start_frame, end_frame, group)
 
     def __repr__(self) -> str:
         return f"JPG ImageSequence {self.get_start_frame()}-{self.get_end_frame()} @ <{self.asset_name}> " \
@@ -234,105 +642,244 @@ class JpgImageSequence(GenericImageSequence):
 
 class PngImageSequence(GenericImageSequence):
     """
-    Class for a png image sequence. Stores related images as a list of filepaths.
+    Class for a png image sequence.
     """
-    def __init__(self, filepaths: List['system.Filepath'], asset_name: str = '',
-                 start_frame: int = 0, end_frame: int = 0):
-        super().__init__(filepaths, asset_name, start_frame, end_frame)
+    def __init__(self, filepaths: Sequence['system.Filepath'] = (), asset_name: str = '',
+                 start_frame: int = 0, end_frame: int = 0, group: Optional[SequenceGroup] = None):
+        super().__init__(filepaths, asset_name, start_frame, end_frame, group)
 
     def __repr__(self) -> str:
         return f"PNG ImageSequence {self.get_start_frame()}-{self.get_end_frame()} @ <{self.asset_name}> " \
                f"from <{self.filepaths[0].filepath_path}>"
 
 
-def sequence_factory(file_paths: List['system.Filepath'], file_name: str = '') -> GenericImageSequence:
+def sequence_factory(file_paths: Sequence['system.Filepath'], file_name: str = '') -> GenericImageSequence:
     """
     Factory function for creating image sequences from a list of filepaths.
     :param file_paths: List of filepaths
     :param file_name: Name of the image sequence
     :return: Image sequence
     """
-    file_path_extension = file_paths[0].get_extension()
-    if file_path_extension == 'exr':
-        return ExrImageSequence(file_paths, file_name)
-    elif file_path_extension == 'jpg':
-        return JpgImageSequence(file_paths, file_name)
-    elif file_path_extension == 'png':
-        return PngImageSequence(file_paths, file_name)
+    if not file_paths:
+        raise ValueError("Could not create image sequence without any filepaths.")
+    return sequence_from_group(group_from_filepaths(file_paths), file_name)
+
+
+def sequence_from_group(group: SequenceGroup, file_name: str = '') -> GenericImageSequence:
+    """
+    Factory function for creating image sequences from the frames found by a scan.
+    :param group: Frames of the image sequence
+    :param file_name: Name of the image sequence
+    :return: Image sequence
+    """
+    extension = group.extension.lower()
+    if extension == 'exr':
+        return ExrImageSequence(asset_name=file_name, group=group)
+    elif extension == 'jpg':
+        return JpgImageSequence(asset_name=file_name, group=group)
+    elif extension == 'png':
+        return PngImageSequence(asset_name=file_name, group=group)
     else:
-        raise ValueError(f"Could not create image sequence from {file_paths}.")
+        raise ValueError(f"Could not create image sequence from {group.directory_path}/{group.basename}.")
+
+
+def group_from_filepaths(filepaths: Sequence['system.Filepath']) -> SequenceGroup:
+    """
+    Groups filepaths into the frames of a single image sequence.
+    :param filepaths: Filepaths of the frames, in any order
+    :return: Frames of the image sequence
+    """
+    if not filepaths:
+        return SequenceGroup('', '', '', 0, FrameSet())
+
+    sequence_key = None
+    frames = []
+    for filepath in filepaths:
+        frame_name = parse_frame_name(filepath.basename)
+        if frame_name is None:
+            raise ValueError(f"Could not find a frame number in {filepath.filepath_path}.")
+        key = (os.path.dirname(filepath.filepath_path), frame_name.basename, frame_name.extension)
+        if sequence_key is None:
+            sequence_key = key
+        elif key != sequence_key:
+            raise ValueError(f"{filepath.filepath_path} is not a frame of the same image sequence as "
+                             f"{filepaths[0].filepath_path}.")
+        frames.append((frame_name.frame, filepath.basename))
+    return build_sequence_group(*sequence_key, frames)
+
+
+def build_sequence_group(directory_path: str, basename: str, extension: str,
+                         frames: List[Tuple[int, str]]) -> SequenceGroup:
+    """
+    Builds the group of an image sequence from the frame numbers and names of its files. Detects the padding of the
+    frame numbers, the names are only kept if they don't all follow it.
+    :param directory_path: Directory of the frames
+    :param basename: Basename of the sequence
+    :param extension: Extension of the frames, as it is in the file names
+    :param frames: Frame numbers and file names, in any order
+    :return: Frames of the image sequence
+    """
+    frames.sort()
+    frame_set = FrameSet.from_frames([frame for frame, _ in frames])
+    file_names = [file_name for _, file_name in frames]
+    if len(frame_set) != len(file_names):
+        # The same frame twice with different paddings, only the first name is kept
+        unique_names: Dict[int, str] = {}
+        for frame, file_name in frames:
+            unique_names.setdefault(frame, file_name)
+        file_names = list(unique_names.values())
+
+    padding = detect_padding(len(basename) + len(extension) + 2, frame_set, file_names)
+    return SequenceGroup(directory_path, basename, extension, padding or 1, frame_set,
+                         None if padding else file_names)
+
+
+def detect_padding(name_length: int, frames: FrameSet, file_names: List[str]) -> int:
+    """
+    Detects the padding of the frame numbers of a sequence from the lengths of its file names. The names of a sequence
+    only differ by their frame number, so the lengths are all that is needed and no name is parsed.
+    :param name_length: Length of the names without the frame number, basename, extension and separators
+    :param frames: Frame numbers of the files
+    :param file_names: Names of the files, in frame order
+    :return: Padding, or 0 if the names don't all follow a single padding
+    """
+    if not file_names:
+        return 0
+    name_lengths = set(map(len, file_names))
+    padding = min(name_lengths) - name_length
+    if len(name_lengths) == 1:
+        return padding
+
+    # Longer names have to be frames that outgrew the padding, like 10000 in a sequence padded to 4
+    for frame, file_name in zip(frames, file_names):
+        frame_width = len(file_name) - name_length
+        if frame_width != padding and frame_width != len(str(frame)):
+            return 0
+    return padding
+
+
+def parse_frame_name(file_name: str) -> Optional[FrameName]:
+    """
+    Splits the file name of an image into its sequence basename, frame number, padding and extension. The format is
+    assumed to be name_####.ext, the same as Filepath.get_frame_number(). The name is only split once.
+    :param file_name: File name of the image, without its directory
+    :return: Parts of the name, or None if the file is not a frame of an image sequence
+    """
+    basename, _, frame_part = file_name.rpartition('_')
+    frame_text, _, extension = frame_part.partition('.')
+    if not basename or not frame_text.isdecimal() or not frame_text.isascii() \
+            or extension.lower() not in IMAGE_EXTENSIONS:
+        return None
+    return FrameName(basename, int(frame_text), len(frame_text), extension)
 
 
-def sequences_from_directory(directory: system.Directory, temp: bool = True) -> List[GenericImageSequence]:
+def sequences_from_directory(directory: system.Directory, temp: bool = True,
+                             use_cache: Union[bool, 'scan_cache.ScanCache'] = True) -> List[GenericImageSequence]:
     """
     Returns a list of image sequences from a directory. We assume that within the directory, there are subdirectories
     that contain image sequences. So each subdirectory is a version where multiple image sequences are stored.
     :param directory: Directory to search for image sequences
     :param temp: Whether to include temp files in the search
+    :param use_cache: Whether to use the scan cache, which only lists the directories that changed since the last
+        scan. Can also be the ScanCache to use.
     :return: List of image sequences
     """
     log.debug(directory.directory_path)
     directory_sequences = []
 
-    sequences_dictionary: dict[str, List[system.Filepath]] = {}
-    for root, dirs, files in os.walk(directory.directory_path):
-        for file in files:
-            basename = '_'.join(file.split('_')[:-1])
-            full_path = os.path.join(root, file)
-
-            if full_path == '' or full_path is None:
-                log.warning(f"Could not find full path for {file}. Skipping..")
-                continue
+    for group in sequence_groups_from_directory(directory.directory_path, temp, use_cache):
+        directory_sequences.append(sequence_from_group(group, group.basename))
 
-            if not temp and 'temp' in full_path or 'tmp' in full_path:
-                log.warning(f"Skipping temp file {file}.")
-                continue
-
-            if system.Filepath(full_path).get_extension() not in ['exr', 'jpg', 'png']:
-                log.warning(f"{file} is not a valid image file. Skipping..")
-                continue
+    log.info(f"Found {len(directory_sequences)} sequences in {directory.directory_path}")
 
-            if basename not in sequences_dictionary:
-                sequences_dictionary[basename] = []
-                sequences_dictionary[basename].append(system.Filepath(full_path))
-            else:
-                sequences_dictionary[basename].append(system.Filepath(full_path))
+    return directory_sequences
 
-    for sequence_key, sequence_value in sequences_dictionary.items():
-        if sequence_key == '':
-            log.warning(f"Could not find sequence key for {sequence_value}. Skipping..")
-            continue
 
-        if sequence_factory(sequence_value, sequence_key) in directory_sequences:
+def sequence_groups_from_directory(directory_path: str, temp: bool = True,
+                                   use_cache: Union[bool, 'scan_cache.ScanCache'] = True) -> List[SequenceGroup]:
+    """
+    Finds the image sequences in a directory tree without building any sequence or Filepath. Each file name is parsed
+    once, and the files are grouped by directory, basename and extension in the same pass.
+    :param directory_path: Directory to search
+    :param temp: Whether to include temp files
+    :param use_cache: Whether to use the scan cache, or the ScanCache to use
+    :return: Groups of frames, in the order their first frame was found
+    """
+    # tmp files and directories are always skipped, temp ones only if asked to. Proxies aren't sequences of their own.
+    prune = walker.prune_names(('tmp',) if temp else ('temp', 'tmp'), directories=(constants.PROXY_DIRECTORY,))
+
+    cache = scan_cache.get_cache(use_cache)
+    cache_key = f"frame_set_groups:{int(temp)}:{directory_path}"
+    if cache is not None:
+        cached_groups = cache.get_result(cache_key)
+        if cached_groups is not None:
+            return [SequenceGroup.from_list(group) for group in cached_groups]
+
+    mtimes: Dict[str, int] = {}
+    if cache is not None:
+        entries = cache.walk(directory_path, mtimes, extensions=IMAGE_EXTENSIONS, prune=prune)
+    else:
+        entries = walker.walk(directory_path, extensions=IMAGE_EXTENSIONS, prune=prune)
+
+    grouped_frames: Dict[Tuple[str, str, str], List[Tuple[int, str]]] = {}
+    skipped_count = 0
+    for entry in entries:
+        # Same parsing as parse_frame_name(), inlined since this runs for every file
+        file_name = entry.name
+        basename, _, frame_part = file_name.rpartition('_')
+        frame_text, _, extension = frame_part.partition('.')
+        if not basename or not frame_text.isdecimal() or not frame_text.isascii() \
+                or extension.lower() not in IMAGE_EXTENSIONS:
+            skipped_count += 1
             continue
+        # The parent directory is the start of the entry path, slicing it off is cheaper than os.path.dirname
+        key = (entry.path[:-len(file_name) - 1], basename, extension)
+        frames = grouped_frames.get(key)
+        if frames is None:
+            frames = grouped_frames[key] = []
+        frames.append((int(frame_text), file_name))
+    if skipped_count:
+        log.debug(f"Skipped {skipped_count} images without a frame number in {directory_path}")
 
-        directory_sequences.append(sequence_factory(sequence_value, sequence_key))
-
-    log.info(f"Found {len(directory_sequences)} sequences in {directory.directory_path}")
+    sequence_groups = [build_sequence_group(group_directory_path, basename, extension, frames)
+                       for (group_directory_path, basename, extension), frames in grouped_frames.items()]
 
-    return directory_sequences
+    if cache is not None and mtimes:
+        cache.set_result(cache_key, mtimes, [group.to_list() for group in sequence_groups])
+    return sequence_groups
 
 
-def sequence_to_video(image_sequence: 'GenericImageSequence', output_path: 'system.Filepath') -> bool:
+def sequence_to_video(image_sequence: 'GenericImageSequence', output_path: 'system.Filepath',
+                      frame_rate: float = constants.FRAME_RATE) -> bool:
     """
-    Converts the image sequence to a video.
+    Converts the image sequence to a video. Exr sequences are streamed through a view transform, see review_encode.
     :param image_sequence: Image sequence to convert
     :param output_path: Output path for the video
+    :param frame_rate: Frame rate of the video
     :return: True if successful, False if not
     """
+    if image_sequence.get_extension().lower() == 'exr':
+        return review_encode.encode_exr_sequence(image_sequence, output_path.filepath_path, frame_rate)
 
     import ffmpeg  # type: ignore
 
-    first_image = image_sequence.filepaths[0]
-    root = first_image.get_parent_directory().directory_path
-    filename = '_'.join(first_image.basename.split('_')[:-1])
-
-    start_frame = image_sequence.get_start_frame()
-
-    ffmpeg_path = '{root}/{filename}_%04d.{extension}'.format(root=root, filename=filename,
-                                                              extension=image_sequence.get_extension())
+    if not image_sequence.frames:
+        log.warning(f"{image_sequence} has no frames to encode.")
+        return False
 
-    stream = ffmpeg.input(ffmpeg_path, framerate=24, start_number=start_frame)
+    concat_path = ''
+    if len(image_sequence.frames.runs()) == 1 and image_sequence.file_names is None:
+        # The path template is printf style with the padding of the file names, the same pattern ffmpeg reads. The
+        # frame count keeps it from reading past the end of a frame range, see GenericImageSequence.__getitem__.
+        stream = ffmpeg.input(image_sequence.path_template, framerate=frame_rate,
+                              start_number=image_sequence.get_start_frame())
+        output_options = {'vframes': len(image_sequence.frames)}
+    else:
+        # ffmpeg reads a sequence until a frame is missing, so gaps, stepped frame ranges and mixed paddings are read
+        # from a list of the frames instead, each shown for one frame
+        concat_path = _write_concat_list(image_sequence, frame_rate)
+        stream = ffmpeg.input(concat_path, format='concat', safe=0)
+        output_options = {'r': frame_rate, 'vframes': len(image_sequence.frames)}
 
     if image_sequence.get_extension() == 'png' or image_sequence.get_extension() == 'jpg':
         pad = {
@@ -342,12 +889,34 @@ def sequence_to_video(image_sequence: 'GenericImageSequence', output_path: 'syst
         stream = ffmpeg.filter_(stream, 'pad', **pad)
         stream = ffmpeg.filter_(stream, 'format', 'yuv420p')
 
-    stream = ffmpeg.output(stream, output_path.filepath_path, loglevel="error", video_bitrate="15M")
+    stream = ffmpeg.output(stream, output_path.filepath_path, loglevel="error", video_bitrate="15M",
+                           **output_options)
 
     try:
         ffmpeg.run(stream)
     except ffmpeg.Error as e:
         log.error(e.stderr)
         return False
+    finally:
+        if concat_path:
+            os.remove(concat_path)
 
     return True
+
+
+def _write_concat_list(image_sequence: 'GenericImageSequence', frame_rate: float) -> str:
+    """
+    Writes the frames of an image sequence to a list for ffmpeg's concat demuxer.
+    :param image_sequence: Image sequence to list
+    :param frame_rate: Frame rate of the video, each frame lasts one frame of it
+    :return: Path of the list, to remove once ffmpeg is done
+    """
+    file_descriptor, concat_path = tempfile.mkstemp(prefix='hpipe_frames.', suffix='.ffconcat')
+    duration = f"{1 / frame_rate:.6f}"
+    with os.fdopen(file_descriptor, 'w') as concat_file:
+        concat_file.write("ffconcat version 1.0\n")
+        for frame in image_sequence.frames:
+            # Quotes in paths are closed, escaped and opened again
+            escaped_path = image_sequence.get_frame_path(frame).replace("'", "'\\''")
+            concat_file.write(f"file '{escaped_path}'\nduration {duration}\n")
+    return concat_path
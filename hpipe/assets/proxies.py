@@ -0,0 +1,163 @@
+"""
+Half and quarter resolution jpg proxies of image sequences, so viewers can scrub large plates without reading the full
+resolution frames. Each frame is decoded once and written at every scale, frames are handled on a thread pool.
+Proxies are cached in the PROXY_DIRECTORY folder next to the frames and only written again when their frame changed.
+
+    half, quarter = proxies.generate_proxies(plate[1001:1025]).values()
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import *
+
+try:
+    import OpenImageIO as oiio
+    OIIO_LOADED = True
+except ImportError:
+    try:
+        import oiio  # type: ignore
+        OIIO_LOADED = True
+    except ImportError:
+        OIIO_LOADED = False
+
+from hpipe.assets import imageSequence
+from hpipe.core import constants
+from hpipe.core.hutils import logger
+
+log = logger.setup_logger()
+log.debug("proxies.py loaded")
+
+JPG_QUALITY = 90
+
+
+class ProxyScale(Enum):
+    """
+    Resolutions of the proxies, the value divides the width and height of the frames.
+    """
+    HALF = 2
+    QUARTER = 4
+
+
+def get_proxy_directory(image_sequence: 'imageSequence.GenericImageSequence', scale: ProxyScale) -> str:
+    """
+    Returns the folder of the proxies of an image sequence at a scale, e.g. render/_proxy/half
+    :param image_sequence: image sequence
+    :param scale: scale of the proxies
+    :return: path of the folder
+    """
+    return f"{image_sequence.directory_path}/{constants.PROXY_DIRECTORY}/{scale.name.lower()}"
+
+
+def get_proxy_sequence(image_sequence: 'imageSequence.GenericImageSequence',
+                       scale: ProxyScale) -> 'imageSequence.JpgImageSequence':
+    """
+    Returns the proxy sequence of an image sequence at a scale, with the same frames. The proxies don't have to exist,
+    see generate_proxies().
+    :param image_sequence: image sequence
+    :param scale: scale of the proxies
+    :return: jpg image sequence of the proxies
+    """
+    group = imageSequence.SequenceGroup(get_proxy_directory(image_sequence, scale), image_sequence.basename, 'jpg',
+                                        image_sequence.padding, image_sequence.frames)
+    return imageSequence.JpgImageSequence(asset_name=image_sequence.asset_name, group=group)
+
+
+def generate_proxies(image_sequence: 'imageSequence.GenericImageSequence',
+                     scales: Iterable[ProxyScale] = (ProxyScale.HALF, ProxyScale.QUARTER),
+                     max_workers: int = constants.PROXY_MAX_WORKERS,
+                     force: bool = False) -> Dict[ProxyScale, 'imageSequence.JpgImageSequence']:
+    """
+    Writes the proxies of the frames of an image sequence. Proxies newer than their frame are kept as they are.
+    :param image_sequence: image sequence, slice it to only write the proxies of a frame range
+    :param scales: scales of the proxies to write
+    :param int max_workers: number of frames handled at once
+    :param bool force: whether to write the proxies even if they are up to date
+    :return: proxy sequence per scale, without the frames that failed. Empty if OpenImageIO isn't available.
+    """
+    if not OIIO_LOADED:
+        log.warning("OpenImageIO is needed to generate proxies.")
+        return {}
+    proxy_sequences = {scale: get_proxy_sequence(image_sequence, scale) for scale in scales}
+    if not image_sequence.frames or not proxy_sequences:
+        return proxy_sequences
+    for proxy_sequence in proxy_sequences.values():
+        os.makedirs(proxy_sequence.directory_path, exist_ok=True)
+
+    # Scene linear frames are converted to sRGB, jpg and png frames already are
+    linear = image_sequence.get_extension().lower() == 'exr'
+
+    def write_frame(frame: int) -> Optional[int]:
+        proxy_paths = [(scale.value, proxy_sequence.get_frame_path(frame))
+                       for scale, proxy_sequence in proxy_sequences.items()]
+        try:
+            write_proxy_frame(image_sequence.get_frame_path(frame), proxy_paths, linear, force)
+        except (ValueError, OSError) as e:
+            log.error(e)
+            return frame
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='hpipe_proxy') as executor:
+        failed_frames = {frame for frame in executor.map(write_frame, image_sequence.frames) if frame is not None}
+
+    if failed_frames:
+        log.warning(f"Could not write the proxies of {len(failed_frames)} frames of {image_sequence}.")
+        frames = imageSequence.FrameSet.from_frames(frame for frame in image_sequence.frames
+                                                    if frame not in failed_frames)
+        proxy_sequences = {scale: imageSequence.JpgImageSequence(
+                               asset_name=proxy_sequence.asset_name,
+                               group=proxy_sequence.get_group()._replace(frames=frames))
+                           for scale, proxy_sequence in proxy_sequences.items()}
+    return proxy_sequences
+
+
+def write_proxy_frame(frame_path: str, proxy_paths: List[Tuple[int, str]], linear: bool, force: bool = False) -> bool:
+    """
+    Writes the proxies of a frame that are missing or older than it, runs on the thread pool. The frame is only read
+    if a proxy has to be written. Proxies are written to a temporary file and renamed, so a viewer never reads half a
+    proxy.
+    :param frame_path: path of the frame
+    :param proxy_paths: scale and path of each proxy of the frame
+    :param linear: whether the frame is scene linear and has to be converted to sRGB
+    :param force: whether to write the proxies even if they are up to date
+    :return: True if a proxy was written, False if they were all up to date
+    """
+    frame_mtime_ns = os.stat(frame_path).st_mtime_ns
+    if not force:
+        proxy_paths = [(scale, proxy_path) for scale, proxy_path in proxy_paths
+                       if not is_proxy_up_to_date(proxy_path, frame_mtime_ns)]
+    if not proxy_paths:
+        return False
+
+    image = oiio.ImageBuf(frame_path)
+    if image.has_error:
+        raise ValueError(f"Could not read {frame_path}: {image.geterror()}")
+    spec = image.spec()
+    # Jpgs have no alpha, grey frames are shown as grey rgb
+    image = oiio.ImageBufAlgo.channels(image, (0, 1, 2) if spec.nchannels >= 3 else (0, 0, 0))
+    if linear:
+        image = oiio.ImageBufAlgo.colorconvert(image, 'linear', 'sRGB')
+
+    for scale, proxy_path in proxy_paths:
+        # The display window is scaled, so frames with a cropped data window keep their place in the frame
+        roi = oiio.ROI(0, max(1, spec.full_width // scale), 0, max(1, spec.full_height // scale), 0, 1, 0, 3)
+        proxy = oiio.ImageBufAlgo.resize(image, roi=roi)
+        proxy.specmod().attribute('Compression', f'jpeg:{JPG_QUALITY}')
+        proxy.set_write_format(oiio.UINT8)
+        partial_path = f"{os.path.splitext(proxy_path)[0]}.partial.jpg"
+        if not proxy.write(partial_path):
+            raise OSError(f"Could not write {proxy_path}: {proxy.geterror()}")
+        os.replace(partial_path, proxy_path)
+    return True
+
+
+def is_proxy_up_to_date(proxy_path: str, frame_mtime_ns: int) -> bool:
+    """
+    Checks whether a proxy exists and is newer than its frame.
+    :param proxy_path: path of the proxy
+    :param frame_mtime_ns: mtime of the frame in nanoseconds
+    :return: True if the proxy doesn't need to be written again
+    """
+    try:
+        return os.stat(proxy_path).st_mtime_ns >= frame_mtime_ns
+    except OSError:
+        return False
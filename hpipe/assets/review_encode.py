@@ -0,0 +1,245 @@
+"""
+Encoding image sequences to review movies. ffmpeg can't apply a view transform to scene linear exrs, so for those the
+frames are decoded with OpenImageIO on a thread pool, put through the view transform with NumPy and piped to ffmpeg's
+stdin as raw rgb frames. Only MAX_QUEUED_FRAMES decoded frames are held at once, so memory stays flat however long the
+sequence is.
+
+    review_encode.encode_exr_sequence(image_sequence, '/path/to/review.mp4', shot.project.get_frame_rate())
+"""
+import os
+import subprocess
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from typing import *
+
+try:
+    import numpy as np
+    NUMPY_LOADED = True
+except ImportError:
+    NUMPY_LOADED = False
+
+try:
+    import OpenImageIO as oiio
+    OIIO_LOADED = True
+except ImportError:
+    try:
+        import oiio  # type: ignore
+        OIIO_LOADED = True
+    except ImportError:
+        OIIO_LOADED = False
+
+from hpipe.core import constants
+from hpipe.core.hutils import logger
+
+if TYPE_CHECKING:
+    from hpipe.assets import imageSequence
+
+log = logger.setup_logger()
+log.debug("review_encode.py loaded")
+
+# Threads decoding frames. Decoding and the view transform release the GIL, so this scales with the cores.
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+# Decoded frames waiting to be written to ffmpeg, the memory used is this many frames
+MAX_QUEUED_FRAMES = 2 * DECODE_WORKERS
+VIDEO_BITRATE = '15M'
+
+
+class ViewTransform(Enum):
+    """
+    View transforms from scene linear to display referred sRGB. ACES is a fitted approximation of the ACES filmic
+    tone curve, which rolls off highlights instead of clipping them.
+    """
+    SRGB = 'srgb'
+    ACES = 'aces'
+
+
+def encode_exr_sequence(image_sequence: 'imageSequence.GenericImageSequence', output_path: str,
+                        frame_rate: float = constants.FRAME_RATE, view_transform: ViewTransform = ViewTransform.SRGB,
+                        exposure: float = 0.0, max_workers: int = DECODE_WORKERS,
+                        video_bitrate: str = VIDEO_BITRATE, progress: Optional[Callable[[int], None]] = None) -> bool:
+    """
+    Encodes a scene linear image sequence to an h264 movie, streaming the frames to ffmpeg. Missing frames hold the
+    frame before them so the movie keeps the timing of the frame range.
+    :param image_sequence: image sequence to encode
+    :param output_path: path of the movie to write
+    :param frame_rate: frame rate of the movie, see Project.get_frame_rate
+    :param view_transform: view transform applied to the frames
+    :param exposure: exposure adjustment in stops, applied before the view transform
+    :param int max_workers: number of frames decoded at once
+    :param video_bitrate: bitrate of the movie
+    :param progress: function called with the number of frames written so far after each frame
+    :return: True if successful, False if not
+    """
+    if not NUMPY_LOADED or not OIIO_LOADED:
+        log.warning("NumPy and OpenImageIO are needed to encode exr sequences.")
+        return False
+    if not image_sequence.frames:
+        log.warning(f"{image_sequence} has no frames to encode.")
+        return False
+
+    start_time = time.perf_counter()
+    first_frame = image_sequence.frames.start
+    try:
+        width, height, x_origin, y_origin = read_display_window(image_sequence.get_frame_path(first_frame))
+    except ValueError as e:
+        log.error(e)
+        return False
+
+    command = [constants.FFMPEG_PATH, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-framerate', str(frame_rate),
+               '-i', 'pipe:0',
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+               '-b:v', video_bitrate, '-movflags', '+faststart', output_path]
+    # stderr goes to a file, a pipe nobody reads while frames are written could fill up and block ffmpeg
+    with tempfile.TemporaryFile() as error_file:
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=error_file)
+        except OSError as e:
+            log.error(f"Could not start ffmpeg: {e}")
+            return False
+
+        written_count = 0
+        error = None
+        pending: Deque[Tuple[Future, int]] = deque()
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='hpipe_encode') as executor:
+            try:
+                for frame, hold_count in get_held_frames(image_sequence.frames):
+                    pending.append((executor.submit(decode_frame, image_sequence.get_frame_path(frame),
+                                                    (width, height, x_origin, y_origin), view_transform, exposure),
+                                    hold_count))
+                    if len(pending) >= MAX_QUEUED_FRAMES:
+                        written_count += _write_frame(process, *pending.popleft())
+                        if progress is not None:
+                            progress(written_count)
+                while pending:
+                    written_count += _write_frame(process, *pending.popleft())
+                    if progress is not None:
+                        progress(written_count)
+            except (ValueError, OSError, RuntimeError) as e:
+                # Frames that haven't started decoding are dropped rather than waited for
+                for future, _ in pending:
+                    future.cancel()
+                error = e
+        if error is not None:
+            process.kill()
+            process.wait()
+            error_file.seek(0)
+            log.error(f"Could not encode {image_sequence}: {error} {error_file.read().decode(errors='replace')}")
+            return False
+
+        process.stdin.close()
+        return_code = process.wait()
+        if return_code != 0:
+            error_file.seek(0)
+            log.error(f"ffmpeg failed encoding {output_path}: {error_file.read().decode(errors='replace')}")
+            return False
+
+    log.info(f"Encoded {written_count} frames of {image_sequence} to {output_path} in "
+             f"{time.perf_counter() - start_time:.1f}s")
+    return True
+
+
+def get_held_frames(frames: 'imageSequence.FrameSet') -> Iterator[Tuple[int, int]]:
+    """
+    Pairs each frame on disk with the number of times it is shown, itself and the missing frames after it.
+    :param frames: frames on disk
+    :return: iterator over the frames and their hold counts, in frame order
+    """
+    runs = frames.runs()
+    for run_index, (run_start, run_end) in enumerate(runs):
+        yield from ((frame, 1) for frame in range(run_start, run_end))
+        next_start = runs[run_index + 1][0] if run_index + 1 < len(runs) else run_end + 1
+        yield run_end, next_start - run_end
+
+
+def read_display_window(frame_path: str) -> Tuple[int, int, int, int]:
+    """
+    Reads the display window of an image, the frame the movie shows.
+    :param frame_path: path of the image
+    :return: width, height and the x and y of its origin
+    """
+    image_input = oiio.ImageInput.open(frame_path)
+    if image_input is None:
+        raise ValueError(f"Could not open {frame_path}: {oiio.geterror()}")
+    try:
+        spec = image_input.spec()
+        return spec.full_width, spec.full_height, spec.full_x, spec.full_y
+    finally:
+        image_input.close()
+
+
+def decode_frame(frame_path: str, display_window: Tuple[int, int, int, int], view_transform: ViewTransform,
+                 exposure: float) -> 'np.ndarray':
+    """
+    Reads the rgb channels of an image and applies the view transform, runs on the thread pool. The data window is
+    placed in the display window of the first frame, so frames with a cropped data window line up.
+    :param frame_path: path of the image
+    :param display_window: width, height and origin of the frame of the movie
+    :param view_transform: view transform to apply
+    :param exposure: exposure adjustment in stops
+    :return: height by width by 3 array of 8 bit sRGB values
+    """
+    image_input = oiio.ImageInput.open(frame_path)
+    if image_input is None:
+        raise ValueError(f"Could not open {frame_path}: {oiio.geterror()}")
+    try:
+        spec = image_input.spec()
+        pixels = image_input.read_image(0, 0, 0, min(spec.nchannels, 3), 'float')
+    finally:
+        image_input.close()
+    if pixels is None:
+        raise ValueError(f"Could not read {frame_path}: {oiio.geterror()}")
+    pixels = pixels.reshape(spec.height, spec.width, -1)
+    if pixels.shape[2] < 3:
+        pixels = np.repeat(pixels[:, :, :1], 3, axis=2)
+
+    width, height, x_origin, y_origin = display_window
+    if (spec.width, spec.height, spec.x, spec.y) != (width, height, x_origin, y_origin):
+        frame = np.zeros((height, width, 3), dtype=np.float32)
+        left, top = spec.x - x_origin, spec.y - y_origin
+        right, bottom = min(left + spec.width, width), min(top + spec.height, height)
+        frame_left, frame_top = max(left, 0), max(top, 0)
+        if right > frame_left and bottom > frame_top:
+            frame[frame_top:bottom, frame_left:right] = pixels[frame_top - top:bottom - top,
+                                                               frame_left - left:right - left]
+        pixels = frame
+    return apply_view_transform(pixels, view_transform, exposure)
+
+
+def apply_view_transform(pixels: 'np.ndarray', view_transform: ViewTransform = ViewTransform.SRGB,
+                         exposure: float = 0.0) -> 'np.ndarray':
+    """
+    Converts scene linear rgb to 8 bit sRGB for display.
+    :param pixels: height by width by 3 array of scene linear values
+    :param view_transform: view transform to apply
+    :param exposure: exposure adjustment in stops
+    :return: array of 8 bit sRGB values with the same shape
+    """
+    rgb = np.nan_to_num(pixels.astype(np.float32, copy=True), nan=0.0, posinf=0.0, neginf=0.0)
+    if exposure:
+        rgb *= np.float32(2.0 ** exposure)
+    np.maximum(rgb, 0.0, out=rgb)
+    if view_transform == ViewTransform.ACES:
+        # Narkowicz's fit of the ACES reference rendering and output transforms
+        rgb *= np.float32(0.6)
+        rgb = rgb * (2.51 * rgb + 0.03) / (rgb * (2.43 * rgb + 0.59) + 0.14)
+    np.clip(rgb, 0.0, 1.0, out=rgb)
+    srgb = np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * np.power(rgb, 1.0 / 2.4) - 0.055)
+    return (srgb * 255.0 + 0.5).astype(np.uint8)
+
+
+def _write_frame(process: subprocess.Popen, future: Future, hold_count: int) -> int:
+    """
+    Waits for a decoded frame and writes it to ffmpeg, once per frame it is held for.
+    :return: number of frames written
+    """
+    pixels = future.result()
+    for _ in range(hold_count):
+        try:
+            process.stdin.write(pixels.data)
+        except BrokenPipeError:
+            raise OSError("ffmpeg stopped reading frames")
+    return hold_count
@@ -42,7 +42,7 @@ except ImportError:
     pass
 
 from hpipe.assets import asset, imageSequence
-from hpipe.core.hutils import logger, system
+from hpipe.core.hutils import logger, scan_cache, system, walker
 import os
 
 if TYPE_CHECKING:
@@ -175,18 +175,15 @@ class SequenceReviewable(Reviewable):
             return system.Filepath(reviewable_thumbnail_path)
         log.debug(f"Couldn't find pre-made thumbnail.. Generating thumbnail for {self.reviewable_directory}")
         image_extensions = (".png", ".jpg")
-        for root, dirs, files in os.walk(self.reviewable_directory.system_path()):
-            for file in files:
-                if file.lower().endswith(image_extensions):
-                    image_file = os.path.join(root, file)
-                    try:
-                        im = Image.open(system.Filepath(image_file).system_path())
-                    except PIL.UnidentifiedImageError:
-                        log.debug(f"Could not open {image_file}")
-                        continue
-
-                    self.generate_thumbnail(system.Filepath(image_file))
-                    return system.Filepath(image_file)
+        for image_file in walker.walk_paths(self.reviewable_directory.system_path(), extensions=image_extensions):
+            try:
+                im = Image.open(system.Filepath(image_file).system_path())
+            except PIL.UnidentifiedImageError:
+                log.debug(f"Could not open {image_file}")
+                continue
+
+            self.generate_thumbnail(system.Filepath(image_file))
+            return system.Filepath(image_file)
         return None
 
     def get_subdirectories(self) -> List['system.Directory']:
@@ -212,14 +209,23 @@ class SequenceReviewable(Reviewable):
         return system.Filepath(reviewable_thumbnail_path)
 
 
-def reviewables_from_directory(directory: 'system.Directory') -> List['Reviewable']:
+def reviewables_from_directory(directory: 'system.Directory',
+                               use_cache: Union[bool, 'scan_cache.ScanCache'] = True) -> List['Reviewable']:
     """
     Factory function that returns all reviewables in a directory.
     :param directory: Directory to search for reviewables.
+    :param use_cache: Whether to list the directory through the scan cache, or the ScanCache to use.
     :return: List of reviewables in the directory.
     """
+    cache = scan_cache.get_cache(use_cache)
+    if cache is None:
+        subdirectories = directory.get_children_directories()
+    else:
+        subdirectories = [system.Directory(entry.path)
+                          for entry in cache.walk(directory.directory_path, max_depth=0, files=False, directories=True)]
+
     reviewables = []
-    for subdirectory in directory.get_children_directories():
+    for subdirectory in subdirectories:
         basename = os.path.basename(subdirectory.directory_path)
         reviewable = SequenceReviewable(basename, subdirectory)
         reviewables.append(reviewable)
@@ -268,12 +274,9 @@ class UsdReviewable(Reviewable):
         """
         directory = self.reviewable_directory
         image_extensions = (".png", ".jpg")
-        for root, dirs, files in os.walk(directory.system_path()):
-            for file in files:
-                if 'thumbnail' in file.lower():
-                    if file.lower().endswith(image_extensions):
-                        image_file = os.path.join(root, file)
-                        return system.Filepath(image_file)
+        for entry in walker.walk(directory.system_path(), extensions=image_extensions):
+            if 'thumbnail' in entry.name.lower():
+                return system.Filepath(entry.path)
         return None
 
     def generate_thumbnail(self, thumbnail_path: 'system.Filepath') -> system.Filepath:
@@ -76,7 +76,7 @@ class UsdAssetManager:
     Class for managing USD assets and registering into the asset database.
     """
     def __init__(self, usd_filepath: str = '', asset_name: str = ''):
-        self.config = data_manager.ConfigDataManager()
+        self.config = data_manager.ConfigDataManager.shared()
         self.asset_manager = data_manager.AssetDataManager()
         self.usd_filepath = usd_filepath
         self.asset_name = asset_name
@@ -1,4 +1,6 @@
 import os
+import threading
+import types
 from typing import *
 
 from hpipe.core import constants
@@ -13,7 +15,16 @@ class ConfigDataManager:
     """
     Config data manager. This is used as the primary interface for the configuration of the pipeline. Replaces the
     constants module by storing everything to a json file in the home directory.
+
+    The config is read all over the pipeline (every Project, every data manager), so prefer ConfigDataManager.shared()
+    over building a new one, which reads the file again. Listeners added with add_listener() are called with a
+    read-only snapshot of the config whenever it is changed with set_config() or reloaded because the file changed.
     """
+
+    _shared: Optional['ConfigDataManager'] = None
+    _shared_lock = threading.Lock()
+    _listeners: List[Callable[[Mapping[str, str]], None]] = []
+
     def __init__(self):
         self.default_dict = {
             "PROJECTS_ROOT": 'Y:/projects/',
@@ -24,6 +35,7 @@ class ConfigDataManager:
             "ARCHIVE_DB_PATH": '/Documents/project_db/projects_archive.json',
             "DB_BACKUP": 'Y:/vault/db_backup/',
             "DB_TYPE": 'json',
+            "DB_FORMAT": 'json',
             "GLOBAL_ASSETS": 'Y:/_global_assets/',
             "ASSET_DB_PATH": 'Y:/project_db/assets.json',
         }
@@ -31,6 +43,83 @@ class ConfigDataManager:
                                          create_if_missing=True,
                                          default_data=self.default_dict)
         self.data = self.accessor.data
+        self._snapshot: Optional[Mapping[str, str]] = None
+
+    @classmethod
+    def shared(cls) -> 'ConfigDataManager':
+        """
+        Returns the process-wide shared ConfigDataManager. The config file is only read the first time, after that each
+        call just stats the file and reloads it if it changed on disk.
+        :return: shared ConfigDataManager
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+                _apply_path_roots(cls._shared.get_snapshot())
+            else:
+                cls._shared.reload_if_changed()
+            return cls._shared
+
+    @classmethod
+    def clear_shared(cls) -> None:
+        """
+        Drops the shared ConfigDataManager so the next call to shared() reads the config file again.
+        """
+        with cls._shared_lock:
+            cls._shared = None
+
+    @classmethod
+    def add_listener(cls, listener: Callable[[Mapping[str, str]], None]) -> None:
+        """
+        Registers a function to be called with a read-only snapshot of the config whenever the config changes.
+        :param listener: function taking the config snapshot
+        """
+        if listener not in cls._listeners:
+            cls._listeners.append(listener)
+
+    @classmethod
+    def remove_listener(cls, listener: Callable[[Mapping[str, str]], None]) -> None:
+        """
+        Unregisters a function added with add_listener().
+        :param listener: function to remove
+        """
+        if listener in cls._listeners:
+            cls._listeners.remove(listener)
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reloads the config if the file changed on disk since it was last loaded or saved, and notifies the listeners.
+        :return: True if the config was reloaded
+        """
+        if not self.accessor.is_stale():
+            return False
+        log.debug(f"Config file {self.accessor.db_path} changed on disk, reloading.")
+        self.data = self.accessor.get_data()
+        self._snapshot = None
+        self._publish()
+        return True
+
+    def get_snapshot(self) -> Mapping[str, str]:
+        """
+        Returns a read-only snapshot of the config. The snapshot does not change when the config does, so it is safe to
+        hold on to and share between threads.
+        :return: read-only mapping of config names to values
+        """
+        if self._snapshot is None:
+            self._snapshot = types.MappingProxyType(dict(self.data))
+        return self._snapshot
+
+    def _publish(self) -> None:
+        """
+        Calls the listeners with a snapshot of the current config. A failing listener is logged and does not stop the
+        others from being called.
+        """
+        snapshot = self.get_snapshot()
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot)
+            except Exception as e:
+                log.error(f"Config listener {listener} failed: {e}")
 
     def __repr__(self) -> str:
         return f" Config Manager @ {self.accessor.db_path}"
@@ -47,7 +136,9 @@ class ConfigDataManager:
         Saves the current state of our data to the database via the specific implementation of the DataAccessor.
         :return: True if successful
         """
-        return self.accessor.save_data(self.data)
+        saved = self.accessor.save_data(self.data)
+        self._snapshot = None
+        return saved
 
     def get_config(self, config_name) -> str:
         """
@@ -90,11 +181,32 @@ class ConfigDataManager:
         :return: True if successful
         """
         self.data[config_name] = data
-        return self.save()
+        saved = self.save()
+        self._publish()
+        return saved
 
-    def get_all_config(self) -> dict:
+    def get_all_config(self) -> Mapping[str, str]:
         """
-        Gets the database data and returns it as a dictionary.
-        :return: dictionary of database data
+        Gets the config as a read-only snapshot. Use set_config() to change it.
+        :return: read-only mapping of config names to values
         """
-        return self.data
\ No newline at end of file
+        return self.get_snapshot()
+
+
+def _apply_path_roots(config: Mapping[str, Any]) -> None:
+    """
+    Config listener that rebuilds the path root mapping from the PATH_ROOTS, SITE and SITE_PATH_ROOTS config. An
+    invalid mapping is logged and the current one is kept.
+    :param config: snapshot of the new config
+    """
+    try:
+        root_mapping = system.RootMapping.from_config(config)
+    except (ValueError, TypeError, AttributeError) as e:
+        log.error(f"Invalid path roots in the config, keeping {system.get_root_mapping()}: {e}")
+        return
+    if root_mapping != system.get_root_mapping():
+        log.info(f"Path roots changed to {root_mapping}")
+        system.set_root_mapping(root_mapping)
+
+
+ConfigDataManager.add_listener(_apply_path_roots)
@@ -2,6 +2,7 @@
 Constants for database
 """
 import logging
+import os
 
 from hpipe.core.hutils import system
 
@@ -79,6 +80,32 @@ USD_FILE_NAME = 'shot.usda'
 # Default values for a new project. These are used when creating a new project to populate the project's database
 FRAME_START = 1000
 FRAME_END = 1100
+# Frame rate of projects that don't set their own in their user data, see Project.get_frame_rate
+FRAME_RATE = 24
+
+# Folder next to a sequence's frames that holds its jpg proxies, one subfolder per scale. Sequence scans skip it.
+PROXY_DIRECTORY = '_proxy'
+# Threads writing proxies. Decoding and resizing release the GIL, so this scales with the cores.
+PROXY_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+# ffmpeg executable used to encode review videos
+FFMPEG_PATH = 'ffmpeg'
+# Review videos transcoded at once by the transcode queue, each ffmpeg uses several cores
+TRANSCODE_MAX_JOBS = max(1, (os.cpu_count() or 1) // 4)
+
+# Database backups. A backup is taken on save at most once per interval (seconds), and the newest backup per hour is
+# kept for DB_BACKUP_HOURLY hours and the newest per day for DB_BACKUP_DAILY days.
+DB_BACKUP_INTERVAL = 15 * 60
+DB_BACKUP_HOURLY = 24
+DB_BACKUP_DAILY = 30
+
+# Number of threads scanning shot directories at once. Scans mostly wait on the file server, so this can be well above
+# the number of cores.
+SCAN_MAX_WORKERS = 16
+
+# Seconds between two polls of the watched directories that can't use inotify, e.g. the ones on the file server. Every
+# poll stats each watched directory once.
+WATCH_POLL_INTERVAL = 2.0
 
 # get home directory:
 CONFIG_PATH = system.Filepath(r'~/hpipe_config.json').system_path()
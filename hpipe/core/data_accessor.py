@@ -1,27 +1,75 @@
+"""
+Data accessors that directly interface with the databases on disk. JsonDataAccessor stores everything in a single file,
+json by default or any of the formats in hutils.serialization, and SqliteDataAccessor stores records as rows in a SQLite
+database. Both share the get_data/save_data surface so the data managers don't need to know which one they are using.
+"""
+import contextlib
+import hashlib
 import json
 import os
+import re
+import sqlite3
+import tempfile
+from collections.abc import MutableMapping
+from enum import Enum
 from typing import *
 
-from hpipe.core.hutils import logger, system
+from hpipe.core import constants
+from hpipe.core.hutils import logger, system, serialization
+from hpipe.core.hutils.backup import DatabaseBackup, Snapshot
+from hpipe.core.hutils.filelock import FileLock
 
 log = logger.setup_logger()
 log.debug("data_accessor.py loaded")
 
+
+class SaveConflictError(Exception):
+    """
+    Raised when a save is rejected because someone else changed the same records on disk since they were loaded.
+    """
+    def __init__(self, db_path: str, conflicts: List[str]):
+        self.db_path = db_path
+        self.conflicts = conflicts
+        super().__init__(f"Save to {db_path} rejected, these records were changed by someone else: {conflicts}")
+
+
 class JsonDataAccessor:
     """
     Json data accessor subclass of AbstractDataAccessor. This is used as the primary interface for the
     Project's database via json.
     """
 
-    def __init__(self, db_path, create_if_missing: bool = True, default_data: Any = None):
+    def __init__(self, db_path, create_if_missing: bool = True, default_data: Any = None, lazy: bool = False,
+                 file_format: serialization.SerializationFormat = serialization.SerializationFormat.JSON):
+        """
+        :param db_path: path to the json file
+        :param bool create_if_missing: if True, creates the file with default_data if it doesn't exist
+        :param default_data: data to create the file with
+        :param bool lazy: if True, records are only parsed when they are first accessed, see LazyJsonRecords
+        :param SerializationFormat file_format: format the file is written in. The format is always detected when
+            reading, so this only affects saves.
+        """
+        if not file_format.is_available():
+            raise ImportError(f"Database format {file_format.value} is not available, is the module installed?")
         self.db_path = system.Filepath(db_path).system_path()
         self.default_data = default_data
         self.create_if_missing = create_if_missing
+        self.lazy = lazy
+        self.file_format = file_format
+        self.lock_path = f"{self.db_path}.lock"
+        self.last_save_merged = False
+        self._backup: Optional[DatabaseBackup] = None
+
+        # Snapshot of the file as it was last loaded or saved. Used to detect writes from other processes.
+        self._snapshot: bytes = b''
+        self._snapshot_stat: Optional[Tuple[int, int]] = None
+
         self.data = self.get_data()
 
-    def get_data(self) -> dict:
+    def get_data(self) -> MutableMapping:
         """
-        Gets the database data and returns it as a dictionary.
+        Gets the database data and returns it as a dictionary. In lazy mode this is a LazyJsonRecords that only parses
+        records when they are accessed.
         :return: dictionary of database data
         """
         if not os.path.exists(self.db_path):
@@ -30,31 +78,811 @@ class JsonDataAccessor:
                 json_filepath = system.Filepath(self.db_path).system_path()
                 if not os.path.exists(os.path.dirname(json_filepath)):
                     os.makedirs(os.path.dirname(json_filepath), exist_ok=True)
-                with open(json_filepath, 'w') as fileName:
-                    if not self.default_data:
-                        self.default_data = {}
-                    json.dump(self.default_data, fileName, indent=4)
-                    log.warning(f"Created database file: {self.db_path}")
+                if not self.default_data:
+                    self.default_data = {}
+                with FileLock(self.lock_path):
+                    self._write(_dump_records(self.default_data, self.file_format))
+                log.warning(f"Created database file: {self.db_path}")
             return {}
-        with open(self.db_path, 'r') as fileName:
-            self.data = json.load(fileName)
+        with open(self.db_path, 'rb') as fileName:
+            snapshot_stat = _stat_signature(os.fstat(fileName.fileno()))
+            snapshot = fileName.read()
+        self.data = _load_records(snapshot, self.lazy)
+        self._snapshot = snapshot
+        self._snapshot_stat = snapshot_stat
+        return self.data
+
+    def is_stale(self) -> bool:
+        """
+        Checks whether the file on disk changed since it was last loaded or saved. Only stats the file.
+        :return: True if the file changed
+        """
+        try:
+            return _stat_signature(os.stat(self.db_path)) != self._snapshot_stat
+        except FileNotFoundError:
+            return self._snapshot_stat is not None
+
+    def save_data(self, data: dict, changed_keys: Optional[Iterable[str]] = None) -> bool:
+        """
+        Saves the database data to disk. Writers are queued with an advisory lock and the file is replaced atomically,
+        so a crash mid-save never leaves a truncated database. If someone else saved since our data was loaded, their
+        changes are merged with ours and data is updated in place with the result. The whole file is rewritten so
+        changed_keys is accepted for compatibility with the other accessors and ignored.
+        :param dict data: dictionary of database data
+        :param changed_keys: keys of the records that changed since the last save, or None if unknown
+        :raises SaveConflictError: if the same records were changed both here and on disk
+        :return: True if successful
+        """
+        self.last_save_merged = False
+        with FileLock(self.lock_path):
+            disk_snapshot = self._read_if_changed()
+            if disk_snapshot is not None:
+                self._merge_into(data, disk_snapshot)
+                self.last_save_merged = True
+            self._write(_dump_records(data, self.file_format))
+
+        self.data = data
+        return True
+
+    def _read_if_changed(self) -> Optional[bytes]:
+        """
+        Checks whether the file on disk changed since our snapshot. The stat check is enough for the common case and
+        the content hash is only compared if the stat differs.
+        :return: current file contents if they differ from our snapshot, otherwise None
+        """
+        try:
+            with open(self.db_path, 'rb') as fileName:
+                disk_stat = _stat_signature(os.fstat(fileName.fileno()))
+                if disk_stat == self._snapshot_stat:
+                    return None
+                disk_snapshot = fileName.read()
+        except FileNotFoundError:
+            return None
+
+        if hashlib.sha1(disk_snapshot).digest() == hashlib.sha1(self._snapshot).digest():
+            self._snapshot_stat = disk_stat
+            return None
+
+        return disk_snapshot
+
+    def _merge_into(self, data: dict, disk_snapshot: bytes) -> None:
+        """
+        Three-way merges our data with the data on disk, using our snapshot as the common base. Records are merged
+        recursively so that, for example, two artists adding different shots to the same project both keep their shot.
+        :param dict data: our data, updated in place with the merged result
+        :param bytes disk_snapshot: current contents of the file on disk
+        :raises SaveConflictError: if the same value was changed differently on both sides
+        """
+        base = serialization.loads(self._snapshot) if self._snapshot else {}
+        theirs = serialization.loads(disk_snapshot)
+        conflicts: List[str] = []
+        ours = data.copy() if isinstance(data, LazyJsonRecords) else data
+        merged = _merge_three_way(base, ours, theirs, '', conflicts)
+
+        if conflicts:
+            log.error(f"Database {self.db_path} was changed by someone else, rejecting save. Conflicts: {conflicts}")
+            raise SaveConflictError(self.db_path, conflicts)
+
+        log.warning(f"Database {self.db_path} was changed by someone else, merged their changes before saving.")
+        if merged is not data:
+            data.clear()
+            data.update(merged)
+
+    def _write(self, contents: bytes) -> None:
+        """
+        Atomically replaces the database file. Writes to a temp file in the same directory, fsyncs it and renames it
+        over the database. Must be called while holding the lock.
+        :param bytes contents: new contents of the database file
+        """
+        directory = os.path.dirname(self.db_path) or '.'
+        file_descriptor, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(self.db_path)}.", suffix='.tmp',
+                                                      dir=directory)
+        try:
+            with os.fdopen(file_descriptor, 'wb') as temp_file:
+                temp_file.write(contents)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            # mkstemp creates files only readable by us, keep the permissions of the file we are replacing
+            if os.path.exists(self.db_path):
+                os.chmod(temp_path, os.stat(self.db_path).st_mode)
+            else:
+                os.chmod(temp_path, 0o666 & ~_get_umask())
+            os.replace(temp_path, self.db_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._snapshot = contents
+        self._snapshot_stat = _stat_signature(os.stat(self.db_path))
+
+    def backup(self, backup_directory: str = '', increment: bool = True, min_interval: float = 0.0) -> bool:
+        """
+        Backs up the database to a compressed snapshot in the backup directory. Nothing is written if the database did
+        not change since the newest snapshot, and old snapshots are rotated out.
+        param backup_directory: directory to store the snapshots in, defaults to a _backup folder next to the database
+        param increment: bool whether to increment the backup file name
+        param min_interval: seconds that must have passed since the newest snapshot
+        :return: True if successful
+        """
+        return self._get_backup(backup_directory).snapshot(min_interval=min_interval, increment=increment) is not None
+
+    def restore(self, snapshot: Optional[Snapshot] = None, backup_directory: str = '') -> bool:
+        """
+        Restores a snapshot over the database and loads it. The current database is backed up first so the restore
+        can be undone.
+        :param snapshot: snapshot to restore, defaults to the newest one
+        :param backup_directory: directory the snapshots are stored in, defaults to a _backup folder next to the
+            database
+        :return: True if successful
+        """
+        self._get_backup(backup_directory).restore(snapshot)
+        self.get_data()
+        return True
+
+    def _get_backup(self, backup_directory: str = '') -> DatabaseBackup:
+        """
+        Returns the backup manager for this database, reusing it between calls so it can cache the newest snapshot.
+        """
+        if not backup_directory:
+            backup_directory = os.path.join(os.path.dirname(self.db_path), '_backup')
+        if self._backup is None or self._backup.backup_directory != backup_directory:
+            self._backup = DatabaseBackup(self.db_path, backup_directory, hourly=constants.DB_BACKUP_HOURLY,
+                                          daily=constants.DB_BACKUP_DAILY)
+        return self._backup
+
+
+class LazyJsonRecords(MutableMapping):
+    """
+    Mapping over the top-level records of a JSON database that only parses a record the first time it is accessed.
+    It is built from an offset index of the file contents, so listing keys or checking whether a record exists never
+    parses any records. Records that were never accessed are written back out as their original bytes.
+    """
+    def __init__(self, contents: bytes, spans: Dict[str, Tuple[int, int]]):
+        """
+        :param bytes contents: contents of the JSON file
+        :param spans: ordered dictionary of record keys to the (start, end) offsets of their values in contents
+        """
+        self._contents = contents
+        self._spans = spans
+        self._records: Dict[str, Any] = dict.fromkeys(spans, _UNPARSED)
+
+    def __repr__(self) -> str:
+        return f"LazyJsonRecords({len(self._records)} records, {len(self._spans)} unparsed)"
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._records[key]
+        if value is _UNPARSED:
+            start, end = self._spans.pop(key)
+            value = json.loads(self._contents[start:end])
+            self._records[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._records[key] = value
+        self._spans.pop(key, None)
+
+    def __delitem__(self, key: str) -> None:
+        del self._records[key]
+        self._spans.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._records
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def clear(self) -> None:
+        self._records.clear()
+        self._spans.clear()
+
+    def copy(self) -> dict:
+        """
+        Returns a shallow copy as a plain dictionary. Parses every record.
+        """
+        return {key: self[key] for key in self._records}
+
+    def is_parsed(self, key: str) -> bool:
+        """
+        Checks whether a record has been parsed yet.
+        :param str key: key of the record
+        :return: True if the record was parsed or set
+        """
+        return self._records[key] is not _UNPARSED
+
+    def dump(self) -> bytes:
+        """
+        Serializes the records the same way json.dumps(data, indent=4) does. Unparsed records are copied over as their
+        original bytes and afterwards point into the returned bytes, so the old contents can be freed.
+        :return: JSON encoded contents
+        """
+        if not self._records:
+            return b'{}'
+
+        parts = [b'{']
+        spans = {}
+        offset = 1
+        for index, (key, value) in enumerate(self._records.items()):
+            if value is _UNPARSED:
+                start, end = self._spans[key]
+                text = self._contents[start:end]
+            else:
+                text = json.dumps(value, indent=4).replace('\n', '\n    ').encode()
+            prefix = f"{',' if index else ''}\n    {json.dumps(key)}: ".encode()
+            parts.append(prefix)
+            parts.append(text)
+            offset += len(prefix)
+            if value is _UNPARSED:
+                spans[key] = (offset, offset + len(text))
+            offset += len(text)
+        parts.append(b'\n}')
+
+        contents = b''.join(parts)
+        self._contents = contents
+        self._spans = spans
+        return contents
+
+
+class RecordType(Enum):
+    """
+    Enum for the kinds of records a database can hold. Used by the SQLite accessor to pick its tables.
+    """
+    PROJECT = 'project'
+    ASSET = 'asset'
+
+
+class SqliteDataAccessor:
+    """
+    SQLite data accessor. Drop-in alternative to JsonDataAccessor with the same get_data/save_data surface. Projects,
+    shots and assets are stored as rows in indexed tables so that saves only touch the rows that changed, and the
+    database runs in WAL mode so many readers can use it while one artist writes.
+    """
+
+    def __init__(self, db_path, record_type: RecordType = RecordType.PROJECT, create_if_missing: bool = True):
+        self.db_path = system.Filepath(db_path).system_path()
+        self.record_type = record_type
+        self.create_if_missing = create_if_missing
+        self.last_save_merged = False
+        self._backup: Optional[DatabaseBackup] = None
+        self._snapshot_stat: Optional[Tuple[Tuple[int, int], ...]] = None
+        # Revision of the database and json of each record as they were last loaded or saved. A save from someone else
+        # bumps the revision, the records are then the common base to merge their changes with ours.
+        self._revision: Optional[int] = None
+        self._base_records: Dict[str, str] = {}
+        if not os.path.exists(self.db_path) and create_if_missing:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            log.warning(f"Created database file: {self.db_path}")
+        self._create_tables()
+        self.data = self.get_data()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a new connection to the database. Connections are short-lived so the accessor can be used from any
+        thread.
+        :return: sqlite3 connection
+        """
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        return connection
+
+    def _create_tables(self) -> None:
+        """
+        Creates the tables and indexes if they don't exist yet. Frame columns are left untyped so that values round
+        trip exactly as they were saved.
+        """
+        with contextlib.closing(self._connect()) as connection, connection:
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS projects (
+                    project_key TEXT PRIMARY KEY,
+                    project_name TEXT NOT NULL,
+                    date_created TEXT,
+                    description TEXT,
+                    user_data TEXT,
+                    extra TEXT
+                );
+                CREATE INDEX IF NOT EXISTS projects_name_idx ON projects (project_name COLLATE NOCASE);
+
+                CREATE TABLE IF NOT EXISTS shots (
+                    project_key TEXT NOT NULL REFERENCES projects (project_key) ON DELETE CASCADE,
+                    shot_key TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    shot_name TEXT,
+                    frame_start,
+                    frame_end,
+                    project_name TEXT,
+                    tags TEXT,
+                    user_data TEXT,
+                    extra TEXT,
+                    PRIMARY KEY (project_key, shot_key)
+                );
+                CREATE INDEX IF NOT EXISTS shots_project_idx ON shots (project_key, position);
+                CREATE INDEX IF NOT EXISTS shots_name_idx ON shots (shot_name);
+
+                CREATE TABLE IF NOT EXISTS assets (
+                    asset_key TEXT PRIMARY KEY,
+                    asset_type TEXT,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS assets_type_idx ON assets (asset_type);
+
+                CREATE TABLE IF NOT EXISTS revision (
+                    revision INTEGER NOT NULL
+                );
+                INSERT INTO revision (revision) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM revision);
+            ''')
+
+    def get_data(self) -> dict:
+        """
+        Gets the database data and returns it as a dictionary in the same shape as the JSON database.
+        :return: dictionary of database data
+        """
+        self._snapshot_stat = self._get_stat_signature()
+        with contextlib.closing(self._connect()) as connection, connection:
+            # A single read transaction, so the revision is the one of the records read
+            connection.execute('BEGIN')
+            self._revision = self._get_revision(connection)
+            self.data = self._read_records(connection)
+        self._base_records = {key: json.dumps(record) for key, record in self.data.items()}
         return self.data
 
-    def save_data(self, data: dict) -> bool:
+    def _read_records(self, connection: sqlite3.Connection) -> dict:
+        """
+        Reads all the records of the database.
+        :param connection: open sqlite3 connection
+        :return: dictionary of database data
         """
-        Saves the database data to disk.
+        if self.record_type == RecordType.ASSET:
+            rows = connection.execute('SELECT asset_key, data FROM assets ORDER BY rowid')
+            return {asset_key: json.loads(data) for asset_key, data in rows}
+
+        data = {}
+        project_rows = connection.execute('SELECT project_key, project_name, date_created, description, '
+                                          'user_data, extra FROM projects ORDER BY rowid')
+        for project_key, project_name, date_created, description, user_data, extra in project_rows:
+            project_dict = {
+                'project_name': project_name,
+                'member_shots': {},
+                'date_created': date_created,
+                'description': description,
+                'user_data': _loads(user_data),
+            }
+            project_dict.update(_loads(extra) or {})
+            data[project_key] = project_dict
+
+        shot_rows = connection.execute('SELECT project_key, shot_key, shot_name, frame_start, frame_end, '
+                                       'project_name, tags, user_data, extra FROM shots '
+                                       'ORDER BY project_key, position')
+        for project_key, shot_key, shot_name, frame_start, frame_end, project_name, tags, user_data, extra \
+                in shot_rows:
+            shot_dict = {
+                'shot_name': shot_name,
+                'frame_start': frame_start,
+                'frame_end': frame_end,
+                'project_name': project_name,
+                'tags': _loads(tags),
+                'user_data': _loads(user_data),
+            }
+            shot_dict.update(_loads(extra) or {})
+            data[project_key]['member_shots'][shot_key] = shot_dict
+
+        return data
+
+    @staticmethod
+    def _get_revision(connection: sqlite3.Connection) -> int:
+        """
+        Returns the revision of the database, bumped by every save.
+        :param connection: open sqlite3 connection
+        """
+        row = connection.execute('SELECT revision FROM revision').fetchone()
+        return row[0] if row else 0
+
+    def save_data(self, data: dict, changed_keys: Optional[Iterable[str]] = None) -> bool:
+        """
+        Saves the database data to disk. Only the rows for changed_keys are rewritten if given, otherwise every record
+        is rewritten. Records that were loaded and are no longer in data are deleted. Saves take the write lock before
+        checking the revision, so if someone else saved since our data was loaded, their changes are merged with ours
+        and data is updated in place with the result, the same as JsonDataAccessor.
         :param dict data: dictionary of database data
+        :param changed_keys: keys of the records that changed since the last save, or None if unknown
+        :raises SaveConflictError: if the same records were changed both here and in the database
         :return: True if successful
         """
-        with open(self.db_path, 'w') as fileName:
-            json.dump(data, fileName, indent=4)
+        table, key_column = ('assets', 'asset_key') if self.record_type == RecordType.ASSET \
+            else ('projects', 'project_key')
+
+        self.last_save_merged = False
+        with contextlib.closing(self._connect()) as connection, connection:
+            connection.execute('BEGIN IMMEDIATE')
+            revision = self._get_revision(connection)
+            if revision != self._revision:
+                stored_data = self._read_records(connection)
+                self._merge_into(data, stored_data)
+                stored_records = {key: json.dumps(record) for key, record in stored_data.items()}
+                self.last_save_merged = True
+                keys_to_write = [key for key in data.keys() if json.dumps(data[key]) != stored_records.get(key)]
+            else:
+                stored_records = self._base_records
+                # Records that were added without being reported as changed still need to be written. Keep the order
+                # of data so new records are appended in the same order as in the JSON database.
+                changed_keys = set(data.keys() if changed_keys is None else changed_keys)
+                keys_to_write = [key for key in data.keys() if key in changed_keys or key not in stored_records]
+            removed_keys = [key for key in stored_records if key not in data]
+            connection.executemany(f'DELETE FROM {table} WHERE {key_column} = ?', [(key,) for key in removed_keys])
+
+            for key in keys_to_write:
+                if self.record_type == RecordType.ASSET:
+                    self._write_asset(connection, key, data[key])
+                else:
+                    self._write_project(connection, key, data[key])
+            connection.execute('UPDATE revision SET revision = ?', (revision + 1,))
 
+        log.debug(f"Saved {len(keys_to_write)} records and removed {len(removed_keys)} from {self.db_path}")
+        self._revision = revision + 1
+        if self.last_save_merged:
+            self._base_records = {key: json.dumps(record) for key, record in data.items()}
+        else:
+            for key in removed_keys:
+                del self._base_records[key]
+            for key in keys_to_write:
+                self._base_records[key] = json.dumps(data[key])
+        self._snapshot_stat = self._get_stat_signature()
+        self.data = data
         return True
 
-    def backup(self, increment: bool = True) -> bool:
+    def _merge_into(self, data: dict, stored_data: dict) -> None:
+        """
+        Three-way merges our data with the records in the database, using the records as they were last loaded or
+        saved as the common base.
+        :param dict data: our data, updated in place with the merged result
+        :param dict stored_data: records currently in the database
+        :raises SaveConflictError: if the same value was changed differently on both sides
+        """
+        base = {key: json.loads(record) for key, record in self._base_records.items()}
+        conflicts: List[str] = []
+        merged = _merge_three_way(base, data, stored_data, '', conflicts)
+
+        if conflicts:
+            log.error(f"Database {self.db_path} was changed by someone else, rejecting save. Conflicts: {conflicts}")
+            raise SaveConflictError(self.db_path, conflicts)
+
+        log.warning(f"Database {self.db_path} was changed by someone else, merged their changes before saving.")
+        if merged is not data:
+            data.clear()
+            data.update(merged)
+
+    def is_stale(self) -> bool:
+        """
+        Checks whether the database changed since it was last loaded or saved. Only stats the database file and its
+        write-ahead log, which is where other writers' changes land first in WAL mode.
+        :return: True if the database changed
+        """
+        return self._get_stat_signature() != self._snapshot_stat
+
+    def _get_stat_signature(self) -> Tuple[Tuple[int, int], ...]:
+        """
+        Returns the stat signatures of the database file and its write-ahead log.
+        """
+        signatures = []
+        for path in (self.db_path, f"{self.db_path}-wal"):
+            try:
+                signatures.append(_stat_signature(os.stat(path)))
+            except FileNotFoundError:
+                signatures.append((0, 0))
+        return tuple(signatures)
+
+    @staticmethod
+    def _write_project(connection: sqlite3.Connection, project_key: str, project_dict: dict) -> None:
+        """
+        Writes a single project and its shots, updating any existing rows.
+        :param connection: open sqlite3 connection
+        :param str project_key: key of the project in the database
+        :param dict project_dict: project dictionary as produced by project.Project.to_dict
         """
-        Backs up the database to a json file in the backup directory.
+        project_extra = {key: val for key, val in project_dict.items() if key not in _PROJECT_COLUMNS}
+        # Upsert rather than replace so the row keeps its rowid, which is what preserves the project order.
+        connection.execute('INSERT INTO projects (project_key, project_name, date_created, description, user_data, '
+                           'extra) VALUES (?, ?, ?, ?, ?, ?) '
+                           'ON CONFLICT (project_key) DO UPDATE SET project_name = excluded.project_name, '
+                           'date_created = excluded.date_created, description = excluded.description, '
+                           'user_data = excluded.user_data, extra = excluded.extra',
+                           (project_key, project_dict.get('project_name', project_key),
+                            project_dict.get('date_created'), project_dict.get('description'),
+                            _dumps(project_dict.get('user_data')), _dumps(project_extra or None)))
+
+        connection.execute('DELETE FROM shots WHERE project_key = ?', (project_key,))
+        shot_rows = []
+        for position, (shot_key, shot_dict) in enumerate((project_dict.get('member_shots') or {}).items()):
+            shot_extra = {key: val for key, val in shot_dict.items() if key not in _SHOT_COLUMNS}
+            shot_rows.append((project_key, shot_key, position, shot_dict.get('shot_name', shot_key),
+                              shot_dict.get('frame_start'), shot_dict.get('frame_end'),
+                              shot_dict.get('project_name'), _dumps(shot_dict.get('tags')),
+                              _dumps(shot_dict.get('user_data')), _dumps(shot_extra or None)))
+        connection.executemany('INSERT INTO shots (project_key, shot_key, position, shot_name, frame_start, '
+                               'frame_end, project_name, tags, user_data, extra) '
+                               'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', shot_rows)
+
+    @staticmethod
+    def _write_asset(connection: sqlite3.Connection, asset_key: str, asset_dict: dict) -> None:
+        """
+        Writes a single asset, updating any existing row.
+        :param connection: open sqlite3 connection
+        :param str asset_key: key of the asset in the database
+        :param dict asset_dict: asset dictionary as produced by assetEntry.AssetEntry.to_dict
+        """
+        connection.execute('INSERT INTO assets (asset_key, asset_type, data) VALUES (?, ?, ?) '
+                           'ON CONFLICT (asset_key) DO UPDATE SET asset_type = excluded.asset_type, '
+                           'data = excluded.data',
+                           (asset_key, asset_dict.get('asset_type'), json.dumps(asset_dict)))
+
+    def backup(self, backup_directory: str = '', increment: bool = True, min_interval: float = 0.0) -> bool:
+        """
+        Backs up the database to a compressed snapshot in the backup directory. A consistent copy is taken with the
+        SQLite backup API first since the database file can't be copied while it is in WAL mode.
+        param backup_directory: directory to store the snapshots in, defaults to a _backup folder next to the database
         param increment: bool whether to increment the backup file name
+        param min_interval: seconds that must have passed since the newest snapshot
         :return: True if successful
         """
-        raise NotImplementedError("Backup not implemented yet")
\ No newline at end of file
+        backups = self._get_backup(backup_directory)
+        if not backups.is_due(min_interval):
+            return True
+
+        with tempfile.TemporaryDirectory() as temp_directory:
+            database_copy = os.path.join(temp_directory, os.path.basename(self.db_path))
+            with contextlib.closing(self._connect()) as connection, \
+                    contextlib.closing(sqlite3.connect(database_copy)) as copy_connection:
+                connection.backup(copy_connection)
+            return backups.snapshot(increment=increment, source_path=database_copy) is not None
+
+    def restore(self, snapshot: Optional[Snapshot] = None, backup_directory: str = '') -> bool:
+        """
+        Restores a snapshot over the database and loads it. The current database is backed up first so the restore
+        can be undone. Like backups, the database file can't be replaced while it is in WAL mode, the snapshot is
+        written into it with the SQLite backup API instead, which takes the database locks and goes through its
+        write-ahead log.
+        :param snapshot: snapshot to restore, defaults to the newest one
+        :param backup_directory: directory the snapshots are stored in, defaults to a _backup folder next to the
+            database
+        :return: True if successful
+        """
+        backups = self._get_backup(backup_directory)
+        if snapshot is None:
+            snapshot = backups.get_latest()
+        if snapshot is None:
+            raise ValueError(f"No backups of {self.db_path} found in {backups.backup_directory}")
+        self.backup(backup_directory)
+
+        with tempfile.TemporaryDirectory() as temp_directory:
+            database_copy = backups.extract(snapshot, os.path.join(temp_directory, os.path.basename(self.db_path)))
+            with contextlib.closing(self._connect()) as connection, \
+                    contextlib.closing(sqlite3.connect(database_copy)) as copy_connection:
+                revision = self._get_revision(connection)
+                copy_connection.backup(connection)
+        # Snapshots from before the revision was added don't have it. Moving it past the replaced one makes every
+        # other accessor merge with the restored records on its next save.
+        self._create_tables()
+        with contextlib.closing(self._connect()) as connection, connection:
+            connection.execute('UPDATE revision SET revision = ?', (revision + 1,))
+
+        log.warning(f"Restored {snapshot.path} to {self.db_path}")
+        self.get_data()
+        return True
+
+    def _get_backup(self, backup_directory: str = '') -> DatabaseBackup:
+        """
+        Returns the backup manager for this database, reusing it between calls so it can cache the newest snapshot.
+        """
+        if not backup_directory:
+            backup_directory = os.path.join(os.path.dirname(self.db_path), '_backup')
+        if self._backup is None or self._backup.backup_directory != backup_directory:
+            self._backup = DatabaseBackup(self.db_path, backup_directory, hourly=constants.DB_BACKUP_HOURLY,
+                                          daily=constants.DB_BACKUP_DAILY)
+        return self._backup
+
+
+_MISSING = object()
+_UNPARSED = object()
+
+# Top-level keys of a file written with json.dumps(data, indent=4). Strings can't contain raw newlines and nested keys
+# are indented further, so this only ever matches the keys of the top-level records.
+_TOP_LEVEL_KEY = re.compile(rb'\n    ("(?:[^"\\\n]|\\.)*"): ')
+_JSON_VALUE_BOUNDS = {ord('{'): ord('}'), ord('['): ord(']'), ord('"'): ord('"')}
+
+
+def _merge_three_way(base: Any, ours: Any, theirs: Any, path: str, conflicts: List[str]) -> Any:
+    """
+    Three-way merges two versions of a value against their common base. Dictionaries are merged key by key, any other
+    value that was changed differently on both sides is recorded as a conflict and our version is kept. Missing values
+    are represented by _MISSING.
+    :param base: common base value
+    :param ours: our value
+    :param theirs: their value
+    :param str path: path of the value, used to report conflicts
+    :param list conflicts: list that conflicting paths are appended to
+    :return: merged value, or _MISSING if it was removed
+    """
+    if ours == theirs:
+        return ours
+    if ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        if not isinstance(base, dict):
+            base = {}
+        merged = {}
+        keys = list(ours.keys()) + [key for key in theirs.keys() if key not in ours]
+        for key in keys:
+            value = _merge_three_way(base.get(key, _MISSING), ours.get(key, _MISSING), theirs.get(key, _MISSING),
+                                     f"{path}/{key}", conflicts)
+            if value is not _MISSING:
+                merged[key] = value
+        return merged
+
+    conflicts.append(path or '/')
+    return ours
+
+
+def _index_records(contents: bytes) -> Optional[Dict[str, Tuple[int, int]]]:
+    """
+    Builds an offset index of the top-level records of a JSON file without parsing them. Only files laid out the way
+    json.dumps(data, indent=4) writes them can be indexed.
+    :param bytes contents: contents of the JSON file
+    :return: ordered dictionary of record keys to the (start, end) offsets of their values, or None if the file can't
+        be indexed
+    """
+    end = len(contents)
+    while end and contents[end - 1:end].isspace():
+        end -= 1
+    if not contents.startswith(b'{\n    "') or contents[end - 1:end] != b'}':
+        return None
+
+    matches = list(_TOP_LEVEL_KEY.finditer(contents, 0, end))
+    spans = {}
+    for index, match in enumerate(matches):
+        value_start = match.end()
+        if index + 1 < len(matches):
+            value_end = matches[index + 1].start()
+            if contents[value_end - 1:value_end] != b',':
+                return None
+            value_end -= 1
+        else:
+            value_end = end - 1
+            while contents[value_end - 1:value_end].isspace():
+                value_end -= 1
+
+        first, last = contents[value_start], contents[value_end - 1]
+        if first in _JSON_VALUE_BOUNDS and _JSON_VALUE_BOUNDS[first] != last:
+            return None
+        spans[json.loads(match.group(1))] = (value_start, value_end)
+    return spans
+
+
+def _load_records(contents: bytes, lazy: bool = False) -> MutableMapping:
+    """
+    Deserializes the contents of a database file in any of the serialization formats.
+    :param bytes contents: contents of the file
+    :param bool lazy: if True, returns a LazyJsonRecords if the file can be indexed
+    :return: dictionary of records
+    """
+    if lazy:
+        spans = _index_records(contents)
+        if spans is not None:
+            return LazyJsonRecords(contents, spans)
+        log.debug("Database file is not laid out for lazy loading, parsing all of it.")
+    return serialization.loads(contents)
+
+
+def _dump_records(data: Mapping, file_format: serialization.SerializationFormat) -> bytes:
+    """
+    Serializes the records of a database file.
+    :param data: dictionary or LazyJsonRecords of records
+    :param SerializationFormat file_format: format to write
+    :return: serialized contents
+    """
+    if isinstance(data, LazyJsonRecords):
+        if file_format is serialization.SerializationFormat.JSON:
+            return data.dump()
+        data = data.copy()
+    return serialization.dumps(data, file_format)
+
+
+def _stat_signature(stat_result: os.stat_result) -> Tuple[int, int]:
+    """
+    Returns the parts of a stat result that change when a file is rewritten.
+    """
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def _get_umask() -> int:
+    """
+    Returns the current process umask.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+_PROJECT_COLUMNS = ('project_name', 'member_shots', 'date_created', 'description', 'user_data')
+_SHOT_COLUMNS = ('shot_name', 'frame_start', 'frame_end', 'project_name', 'tags', 'user_data')
+
+
+def _dumps(value: Any) -> Optional[str]:
+    """
+    Serializes a nested value for a TEXT column. None is stored as NULL.
+    """
+    if value is None:
+        return None
+    return json.dumps(value)
+
+
+def _loads(value: Optional[str]) -> Any:
+    """
+    Deserializes a nested value from a TEXT column.
+    """
+    if value is None:
+        return None
+    return json.loads(value)
+
+
+def sqlite_path(db_path: str) -> str:
+    """
+    Returns the path of the SQLite database that corresponds to a configured database path. Configured .json paths
+    are mapped to a .sqlite file next to them so switching DB_TYPE is enough after migrating.
+    :param str db_path: configured database path
+    :return: path to the SQLite database
+    """
+    root, extension = os.path.splitext(db_path)
+    if extension.lower() == '.json':
+        return f"{root}.sqlite"
+    return db_path
+
+
+def migrate_json_to_sqlite(json_path: str, record_type: RecordType = RecordType.PROJECT,
+                           target_path: str = '') -> 'SqliteDataAccessor':
+    """
+    One-shot migration of a JSON database into a SQLite database. The JSON file is left untouched.
+    :param str json_path: path to the JSON database
+    :param RecordType record_type: kind of records stored in the database
+    :param str target_path: path to the SQLite database, defaults to the JSON path with a .sqlite extension
+    :return: accessor for the migrated database
+    """
+    if not target_path:
+        target_path = sqlite_path(json_path)
+
+    json_accessor = JsonDataAccessor(json_path, create_if_missing=False)
+    sqlite_accessor = SqliteDataAccessor(target_path, record_type)
+    sqlite_accessor.save_data(json_accessor.data)
+    sqlite_accessor.get_data()
+
+    log.info(f"Migrated {len(sqlite_accessor.data)} records from {json_path} to {target_path}")
+    return sqlite_accessor
+
+
+def convert_file_format(db_path: str, file_format: serialization.SerializationFormat,
+                        target_path: str = '') -> JsonDataAccessor:
+    """
+    Rewrites a file database in another serialization format. The current format is detected, so any format can be
+    converted to any other.
+    :param str db_path: path to the database file
+    :param SerializationFormat file_format: format to convert to
+    :param str target_path: path to write the converted database to, defaults to converting in place
+    :return: accessor for the converted database
+    """
+    source_accessor = JsonDataAccessor(db_path, create_if_missing=False)
+    if not target_path or target_path == db_path:
+        target_accessor = source_accessor
+        target_accessor.file_format = file_format
+    else:
+        target_accessor = JsonDataAccessor(target_path, file_format=file_format)
+    target_accessor.save_data(source_accessor.data)
+
+    log.info(f"Converted {len(source_accessor.data)} records in {db_path} to {file_format.value} at "
+             f"{target_accessor.db_path}")
+    return target_accessor
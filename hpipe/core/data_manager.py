@@ -1,24 +1,30 @@
 """
-Module contains data manager class for the Projects database. Also includes the JsonDataAccessor class that directly
-interfaces with the JSON database. The _get_data_accessor() function is a factory function that returns the appropriate
-data accessor based on the current configuration, which could be useful in the case that we have more than one data
-accessor type. In the future, this could be a constructor argument for the ProjectDataManager class.
+Module contains data manager class for the Projects database. The data managers use a data accessor (JsonDataAccessor
+or SqliteDataAccessor) that directly interfaces with the database on disk. The _get_data_accessor() function is a
+factory function that returns the appropriate data accessor based on the DB_TYPE configuration. In the future, this
+could be a constructor argument for the ProjectDataManager class.
 """
+import contextlib
 import json
 import os
+import threading
 from typing import *
 
 from hpipe.core import project, shot, assetEntry
 from hpipe.core import constants
-from hpipe.core.hutils import logger, system
+from hpipe.core.hutils import logger, system, serialization
+from hpipe.core.hutils.shot_index import ShotIndex
 from hpipe.assets import asset
 from hpipe.assets.husd import husd_util
-from hpipe.core.data_accessor import JsonDataAccessor
+from hpipe.core.data_accessor import JsonDataAccessor, SqliteDataAccessor, RecordType, sqlite_path
 from hpipe.core.config_manager import ConfigDataManager
 
 log = logger.setup_logger()
 log.debug("data_manager.py loaded")
 
+# Config values that determine which databases the ProjectDataManager uses
+DATABASE_CONFIGS = ('DB_PATH', 'ARCHIVE_DB_PATH', 'DB_TYPE', 'DB_FORMAT', 'DB_BACKUP')
+
 
 class ProjectDataManager:
     """
@@ -26,23 +32,252 @@ class ProjectDataManager:
     AbstractDataAccessor interface to access the database directly.
     """
 
+    _shared: Optional['ProjectDataManager'] = None
+    _shared_lock = threading.Lock()
+
     def __init__(self):
-        self.accessor = JsonDataAccessor(ConfigDataManager().get_config_filepath('DB_PATH').system_path())
+        self.database_config = _get_database_config()
+        self.accessor = _get_data_accessor('DB_PATH', lazy=True)
         self.data = self.accessor.data
-        self.archive_accessor = JsonDataAccessor(ConfigDataManager().get_config_filepath('ARCHIVE_DB_PATH').system_path())
+        self.archive_accessor = _get_data_accessor('ARCHIVE_DB_PATH', lazy=True)
+        self.backup_directory = _get_backup_directory()
+
+        # Lazily built lookup tables. The index maps lowercase project names to their key in self.data and the cache
+        # holds projects that have already been materialized from that data.
+        self._project_index: Optional[Dict[str, str]] = None
+        self._project_cache: Dict[str, project.Project] = {}
+        self._indexed_data: Optional[dict] = None
+
+        # Secondary shot indexes used by find_shots(). Built on the first query and then updated per project whenever a
+        # project changes.
+        self._shot_index: Optional[ShotIndex] = None
+        self._shot_indexed_data: Optional[dict] = None
+        self._user_data_index_keys: Set[str] = set()
+
+        # Change tracking for the save path. Only projects touched since the last save are re-serialized, and saves
+        # requested inside a batch() block are deferred until the outermost block exits.
+        self._dirty_projects: Set[str] = set()
+        self._batch_depth = 0
+        self._pending_write = False
+        self._saved_data = self.data
 
     def __repr__(self) -> str:
         return f" Project Manager @ {self.accessor.db_path}"
 
+    @classmethod
+    def shared(cls) -> 'ProjectDataManager':
+        """
+        Returns the process-wide shared ProjectDataManager. The database is only loaded the first time, after that
+        each call just stats the database file and reloads it if it changed on disk. Use this for read-heavy callers
+        like GUI actions and DCC menu callbacks instead of building a new manager every time.
+        :return: shared ProjectDataManager
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            else:
+                cls._shared.reload_if_changed()
+            return cls._shared
+
+    @classmethod
+    def clear_shared(cls) -> None:
+        """
+        Drops the shared ProjectDataManager so the next call to shared() builds a new one, e.g. after the database
+        paths in the config changed.
+        """
+        with cls._shared_lock:
+            cls._shared = None
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reloads the data if the database changed on disk since it was last loaded or saved. Unsaved changes are never
+        thrown away, if there are any the reload is skipped and the changes will be merged on save instead.
+        :return: True if the data was reloaded
+        """
+        reloaded = False
+        if self.accessor.is_stale():
+            if self._dirty_projects or self._pending_write:
+                log.warning(f"Database at path {self.accessor.db_path} changed on disk, but there are unsaved changes. "
+                            f"Skipping reload.")
+            else:
+                log.debug(f"Database at path {self.accessor.db_path} changed on disk, reloading.")
+                self.data = self.accessor.get_data()
+                self._saved_data = self.data
+                self._invalidate_project_index()
+                reloaded = True
+
+        if self.archive_accessor.is_stale():
+            self.archive_accessor.get_data()
+
+        return reloaded
+
+    def _get_project_index(self) -> Dict[str, str]:
+        """
+        Returns the case-insensitive project name index, building it from the current data if needed. The index is
+        also rebuilt if self.data has been replaced since it was built.
+        :return: dictionary of lowercase project names to database keys
+        """
+        if self._project_index is None or self._indexed_data is not self.data:
+            self._project_index = {}
+            for key in self.data.keys():
+                self._project_index[key.lower()] = key
+            self._project_cache = {}
+            self._indexed_data = self.data
+        return self._project_index
+
+    def _invalidate_project_index(self) -> None:
+        """
+        Invalidates the project index and all materialized projects. Called whenever self.data is reloaded or merged.
+        """
+        self._project_index = None
+        self._project_cache = {}
+
+    def _update_project_index(self, project_key: str, project_instance: Optional[project.Project] = None) -> None:
+        """
+        Updates the index and the materialized project of a single project after it was added, updated or removed.
+        The other projects stay materialized.
+        :param str project_key: key of the project in the database
+        :param project_instance: project the data was taken from, kept as its materialized project so that changes
+            made to it before the next save are saved too
+        """
+        if self._project_index is not None and self._indexed_data is self.data:
+            if project_key in self.data:
+                self._project_index[project_key.lower()] = project_key
+            else:
+                self._project_index.pop(project_key.lower(), None)
+        if project_instance is not None and project_key in self.data:
+            self._project_cache[project_key] = project_instance
+        else:
+            self._project_cache.pop(project_key, None)
+
+    def _materialize_project(self, project_key: str) -> project.Project:
+        """
+        Builds a single project.Project object from the current data, reusing it if it was already built.
+        :param str project_key: key of the project in the database
+        :return: project.Project object
+        """
+        if project_key not in self._project_cache:
+            self._project_cache[project_key] = project.Project.from_dict(self.data[project_key])
+        return self._project_cache[project_key]
+
     def save(self) -> bool:
         """
         Saves the current state of our data to the database via the specific implementation of the DataAccessor.
+        Only projects that were touched since the last save are re-serialized. If called inside a batch() block, the
+        write is deferred until the block exits.
         :return: True if successful
         """
-        for project_inst in self.get_projects():
-            self.update_project(project_inst, push=False)
-
-        return self.accessor.save_data(self.data)
+        if self._batch_depth > 0:
+            self._pending_write = True
+            return True
+
+        for project_key in self._dirty_projects:
+            if project_key in self._project_cache and project_key in self.data:
+                self.data[project_key] = self._project_cache[project_key].to_dict()
+                self._update_shot_index(project_key)
+
+        # If self.data was replaced wholesale since the last save we can't know what changed.
+        changed_keys: Optional[Set[str]] = set(self._dirty_projects)
+        if self.data is not self._saved_data:
+            changed_keys = None
+
+        log.debug(f"Saving {len(self._dirty_projects)} changed projects to {self.accessor.db_path}")
+        # A SaveConflictError leaves the changes marked as unsaved, so they aren't reloaded over before the conflict
+        # is resolved.
+        saved = self.accessor.save_data(self.data, changed_keys=changed_keys)
+        if saved:
+            self._dirty_projects.clear()
+            self._pending_write = False
+            self._saved_data = self.data
+        if self.accessor.last_save_merged:
+            # Someone else's changes were merged into self.data, so any projects we built are out of date.
+            self._invalidate_project_index()
+            self._shot_index = None
+
+        # Backing up on save is throttled, so this is a cheap no-op for all but one save per interval.
+        self.backup(min_interval=constants.DB_BACKUP_INTERVAL)
+        return saved
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator['ProjectDataManager']:
+        """
+        Context manager that defers writing to the database until the block exits, so that any number of pushes
+        inside the block cost a single write. Batches can be nested, only the outermost block writes. If the block
+        raises, the write is skipped but the changes made before the error are not undone, they stay marked as unsaved
+        and are written by the next save().
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+
+        if self._batch_depth == 0 and self._pending_write:
+            self.save()
+
+    def _mark_dirty(self, project_name: str) -> None:
+        """
+        Marks a project as changed since the last save.
+        :param str project_name: key of the project in the database
+        """
+        self._dirty_projects.add(project_name)
+        self._update_shot_index(project_name)
+
+    def _get_shot_index(self) -> ShotIndex:
+        """
+        Returns the secondary shot indexes, building them from the current data if needed. Building parses every
+        project but doesn't build any project.Project or shot.Shot objects. The indexes are also rebuilt if self.data
+        has been replaced since they were built.
+        :return: shot index
+        """
+        if self._shot_index is None or self._shot_indexed_data is not self.data:
+            self._shot_index = ShotIndex(self._user_data_index_keys)
+            for project_key in self.data.keys():
+                self._shot_index.index_project(project_key, self.data[project_key])
+            self._shot_indexed_data = self.data
+        return self._shot_index
+
+    def _update_shot_index(self, project_key: str) -> None:
+        """
+        Re-indexes the shots of a single project after it changed. Does nothing if the indexes haven't been built yet.
+        :param str project_key: key of the project in the database
+        """
+        if self._shot_index is not None and self._shot_indexed_data is self.data:
+            self._shot_index.index_project(project_key, self.data.get(project_key))
+
+    def index_user_data(self, user_data_key: str) -> None:
+        """
+        Opts a shot user_data key in to being indexed, so that find_shots() can filter on its value.
+        :param str user_data_key: user_data key to index
+        """
+        self._user_data_index_keys.add(user_data_key)
+        if self._shot_index is not None:
+            self._shot_index.index_user_data(user_data_key, self.data)
+
+    def find_shots(self, tag: Optional[str] = None, overlaps: Optional[Tuple[int, int]] = None,
+                   project: Optional[str] = None, user_data: Optional[Dict[str, Any]] = None) -> List[shot.Shot]:
+        """
+        Finds the shots matching all the given criteria using the secondary shot indexes. Only the projects of the
+        matching shots are built. Criteria left as None are ignored.
+        :param str tag: tag the shots must have, e.g. 'final'
+        :param overlaps: inclusive (start, end) frame range the shots must overlap, e.g. (1001, 1050)
+        :param str project: name of the project the shots must be in, case-insensitive
+        :param dict user_data: user_data values the shots must have. The keys must be opted in with index_user_data().
+        :return: list of matching shots, sorted by project name then in their order in the project
+        """
+        project_key = None
+        if project is not None:
+            project_key = self._get_project_index().get(project.lower())
+            if project_key is None:
+                log.warning(f"Project {project} not found in database at path {self.accessor.db_path}")
+                return []
+
+        shot_list = []
+        for shot_project_key, shot_name in self._get_shot_index().find(tag, overlaps, project_key, user_data):
+            shot_instance = self._materialize_project(shot_project_key).get_shot(shot_name)
+            if shot_instance is not None:
+                shot_list.append(shot_instance)
+        return shot_list
 
     def get_projects(self) -> List[project.Project]:
         """
@@ -54,26 +289,29 @@ class ProjectDataManager:
             log.warning(f"No projects found in database at path {self.accessor.db_path}")
             return []
 
-        for key, val in self.data.items():
-            project_list.append(project.Project.from_dict(val))
+        self._get_project_index()
+        for key in self.data.keys():
+            project_list.append(self._materialize_project(key))
 
         return project_list
 
     def get_project_names(self) -> List[str]:
         """
-        Builds a list of project names from the current data.
+        Builds a list of project names from the current data. Projects are keyed by name, so this doesn't parse or
+        build any projects.
         :return: list of project names
         """
-        return [project_instance.name for project_instance in self.get_projects()]
+        return list(self.data.keys())
 
     def get_project(self, project_name: str) -> project.Project:
         """
-        Builds a project.Project object from the current data given a project name.
+        Builds a project.Project object from the current data given a project name. The lookup is case-insensitive
+        and only the requested project is built.
         param str project_name: name of project
         """
-        for project_instance in self.get_projects():
-            if project_instance.name.lower() == project_name.lower():
-                return project_instance
+        project_key = self._get_project_index().get(project_name.lower())
+        if project_key is not None:
+            return self._materialize_project(project_key)
 
         raise ValueError(f"Project {project_name} not found in database at path {self.accessor.db_path}")
 
@@ -98,6 +336,8 @@ class ProjectDataManager:
             return False
 
         self.data[project_name] = project_to_update.to_dict()
+        self._update_project_index(project_name, project_to_update)
+        self._mark_dirty(project_name)
 
         if push:
             return self.save()
@@ -118,6 +358,8 @@ class ProjectDataManager:
 
         log.info(f"Adding project {project_instance.name} to database at path {self.accessor.db_path}")
         self.data[project_instance.name] = project_instance.to_dict()
+        self._update_project_index(project_instance.name, project_instance)
+        self._mark_dirty(project_instance.name)
 
         ProjectDirectoryGenerator(project_instance, push_directories=True)
 
@@ -135,7 +377,7 @@ class ProjectDataManager:
             log.warning(f"Project {project_instance.name} does not exist in database at path {self.accessor.db_path}")
             return False
 
-        if shot_instance.name in [s.name for s in project_instance.get_shots()]:
+        if project_instance.get_shot(shot_instance.name) is not None:
             log.warning(f"Shot {shot_instance.name} already exists in project {project_instance.name} in database at "
                         f"path {self.accessor.db_path}")
             return False
@@ -147,8 +389,7 @@ class ProjectDataManager:
         self.update_project(project_instance, push=False)
 
         ProjectDirectoryGenerator(project_instance, shot_instance, push_directories=True)
-        self.save()
-        husd_util.ShotUsd(project_instance.name, shot_instance.name)
+        husd_util.ShotUsd(project_instance.name, shot_instance.name, database=self)
 
         if push:
             return self.save()
@@ -215,6 +456,9 @@ class ProjectDataManager:
 
         log.warning(f"Removing project {project_name} from database at path {self.accessor.db_path}")
         self.data.pop(project_name)
+        self._update_project_index(project_name)
+        self._dirty_projects.discard(project_name)
+        self._update_shot_index(project_name)
 
         if archive_project:
             log.warning(f"Archiving project {project_name}")
@@ -240,7 +484,7 @@ class ProjectDataManager:
             log.warning(f"Project {project_name} not found in database at path {self.accessor.db_path}")
             return False
 
-        if shot_to_remove.name not in self.data[project_name]["shots"].keys():
+        if shot_to_remove.name not in self.data[project_name]["member_shots"].keys():
             log.warning(f"Shot {shot_to_remove.name} not found in project {project_name} in database at "
                         f"path {self.accessor.db_path}")
             return False
@@ -248,19 +492,32 @@ class ProjectDataManager:
         log.warning(f"Removing shot {shot_to_remove.name} from project {project_name} in database at "
                     f"path {self.accessor.db_path}")
 
-        self.data[project_name]["shots"].pop(shot_to_remove.name)
+        self.data[project_name]["member_shots"].pop(shot_to_remove.name)
+        self._update_project_index(project_name)
+        self._mark_dirty(project_name)
 
         if push:
             return self.save()
 
         return True
 
-    def backup(self) -> bool:
+    def backup(self, min_interval: float = 0.0) -> bool:
         """
-        Backs up the database to json. This is the primary method for backing up the database. If it's mongodb, it will
-        be backed up to json. If it's json, it will be backed up to json.
+        Backs up the database to a compressed snapshot in the DB_BACKUP directory. This is the primary method for
+        backing up the database. Snapshots are only written if the database changed and are rotated according to
+        the retention policy in constants. A failed backup is logged but never fails the caller.
+        :param float min_interval: seconds that must have passed since the newest snapshot
+        :return: True if successful
         """
-        return self.accessor.backup(increment=True)
+        if not self.backup_directory:
+            log.debug("DB_BACKUP is not configured, skipping backup.")
+            return False
+
+        try:
+            return self.accessor.backup(self.backup_directory, increment=True, min_interval=min_interval)
+        except OSError as e:
+            log.error(f"Could not back up database at path {self.accessor.db_path}: {e}")
+            return False
 
     def archive_project(self, project_to_archive: project.Project) -> bool:
         """
@@ -270,8 +527,11 @@ class ProjectDataManager:
         """
         log.debug(f"Archiving project {project_to_archive.name}")
         self.archive_accessor.data[project_to_archive.name] = self.data.pop(project_to_archive.name)
+        self._update_project_index(project_to_archive.name)
+        self._dirty_projects.discard(project_to_archive.name)
+        self._update_shot_index(project_to_archive.name)
         self.save()
-        self.archive_accessor.save_data(self.archive_accessor.data)
+        self.archive_accessor.save_data(self.archive_accessor.data, changed_keys=[project_to_archive.name])
         return True
 
     def unarchive_project(self, project_to_unarchive: project.Project) -> bool:
@@ -282,8 +542,10 @@ class ProjectDataManager:
         """
         log.debug(f"Unarchiving project {project_to_unarchive.name}")
         self.data[project_to_unarchive.name] = self.archive_accessor.data.pop(project_to_unarchive.name)
+        self._update_project_index(project_to_unarchive.name)
+        self._mark_dirty(project_to_unarchive.name)
         self.save()
-        self.archive_accessor.save_data(self.archive_accessor.data)
+        self.archive_accessor.save_data(self.archive_accessor.data, changed_keys=[])
         return True
 
     def get_archive_projects(self):
@@ -326,7 +588,7 @@ class ProjectDirectoryGenerator:
 
         self.project_structure: dict[Any, Dict[Any, Any]] = constants.PROJECT_STRUCTURE.copy()
         self.shot_structure: dict[Any, Dict[Any, Any]] = constants.SHOT_STRUCTURE.copy()
-        self.config = ConfigDataManager()
+        self.config = ConfigDataManager.shared()
 
         if project_instance and not shot_instance:
             self.project = project_instance
@@ -412,7 +674,7 @@ class AssetDataManager:
     AbstractDataAccessor interface to access the database directly.
     """
     def __init__(self):
-        self.accessor = JsonDataAccessor(ConfigDataManager().get_config_filepath('ASSET_DB_PATH').system_path())
+        self.accessor = _get_data_accessor('ASSET_DB_PATH', RecordType.ASSET)
         self.data = self.accessor.data
         # self.archive_accessor = JsonDataAccessor(constants.ARCHIVE_ASSET_PATH)
 
@@ -505,7 +767,7 @@ class AssetDirectoryGenerator:
         Generates the directories for an asset instance.
         :return: True if successful
         """
-        root_constant = ConfigDataManager().get_config_directory('ASSETS_ROOT').system_path()
+        root_constant = ConfigDataManager.shared().get_config_directory('ASSETS_ROOT').system_path()
 
         asset_path = f'{root_constant}/{self.asset_name}'
         self.asset_structure[asset_path] = self.asset_structure.pop("name")
@@ -521,6 +783,66 @@ class AssetDirectoryGenerator:
         return True
 
 
+def _get_data_accessor(config_name: str, record_type: RecordType = RecordType.PROJECT, lazy: bool = False) \
+        -> Union[JsonDataAccessor, SqliteDataAccessor]:
+    """
+    Factory function that returns the data accessor for a configured database path based on the DB_TYPE and DB_FORMAT
+    configs.
+    :param str config_name: name of the config holding the database path, e.g. DB_PATH
+    :param RecordType record_type: kind of records stored in the database
+    :param bool lazy: if True, JSON databases only parse records when they are accessed
+    :return: data accessor for the database
+    """
+    config = ConfigDataManager.shared()
+    db_path = config.get_config_filepath(config_name).system_path()
+    db_type = str(config.get_all_config().get('DB_TYPE', 'json')).lower()
+    file_format = serialization.get_format(config.get_all_config().get('DB_FORMAT', 'json'))
+
+    if db_type == 'json':
+        return JsonDataAccessor(db_path, lazy=lazy, file_format=file_format)
+    if db_type == 'sqlite':
+        return SqliteDataAccessor(sqlite_path(db_path), record_type)
+
+    raise ValueError(f"Database type {db_type} is not supported. Use 'json' or 'sqlite'.")
+
+
+def _get_database_config() -> Tuple[str, ...]:
+    """
+    Returns the config values that determine which databases a ProjectDataManager reads and writes.
+    :return: tuple of config values
+    """
+    config = ConfigDataManager.shared().get_snapshot()
+    return tuple(str(config.get(config_name, '')) for config_name in DATABASE_CONFIGS)
+
+
+def _on_config_changed(config: Mapping[str, str]) -> None:
+    """
+    Config listener that drops the shared ProjectDataManager if the database config changed, so the next call to
+    ProjectDataManager.shared() opens the newly configured databases.
+    :param config: snapshot of the new config
+    """
+    shared = ProjectDataManager._shared
+    if shared is None:
+        return
+    if shared.database_config != tuple(str(config.get(config_name, '')) for config_name in DATABASE_CONFIGS):
+        log.info("Database config changed, dropping the shared project data manager.")
+        ProjectDataManager.clear_shared()
+
+
+ConfigDataManager.add_listener(_on_config_changed)
+
+
+def _get_backup_directory() -> str:
+    """
+    Returns the configured DB_BACKUP directory, or an empty string if it isn't configured.
+    :return: path to the backup directory
+    """
+    config = ConfigDataManager.shared()
+    if not config.get_all_config().get('DB_BACKUP'):
+        return ''
+    return config.get_config_directory('DB_BACKUP').system_path()
+
+
 def _generate_directories(folder_dictionary) -> bool:
     """
     Generates directories for a given folder dictionary.
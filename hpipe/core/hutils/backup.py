@@ -0,0 +1,313 @@
+"""
+Compressed, rotating snapshots of the database files. Snapshots are streamed from the database file in chunks so a
+backup never holds the whole database in memory, and are only written when the content changed since the last one.
+
+Snapshot files live in the backup directory and are named <database>.<timestamp>.<hash>.<extension>.<compression>, for
+example projects.20240105-143000-000000.9f2c61d0a4b3e7f1.json.zst
+"""
+import datetime
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import *
+
+ZSTD_LOADED = False
+try:
+    import zstandard  # type: ignore
+    ZSTD_LOADED = True
+except ImportError:
+    pass
+
+from hpipe.core.hutils import logger
+from hpipe.core.hutils.filelock import FileLock
+
+log = logger.setup_logger()
+log.debug("backup.py loaded")
+
+CHUNK_SIZE = 1024 * 1024
+TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S-%f'
+LATEST_TIMESTAMP = 'latest'
+
+
+class Snapshot(NamedTuple):
+    """
+    A single snapshot file in the backup directory.
+    """
+    path: str
+    timestamp: datetime.datetime
+    content_hash: str
+
+    def get_compression(self) -> str:
+        """
+        Returns the compression of the snapshot, 'zst' or 'gz'.
+        """
+        return self.path.rsplit('.', 1)[-1]
+
+    def is_rolling(self) -> bool:
+        """
+        Returns True if this is the rolling snapshot written with increment=False.
+        """
+        return os.path.basename(self.path).rsplit('.', 4)[1] == LATEST_TIMESTAMP
+
+
+class DatabaseBackup:
+    """
+    Manages the snapshots of a single database file. Snapshots are compressed with zstd if the zstandard module is
+    available and with gzip otherwise. The retention policy keeps every snapshot from the last hour, the newest snapshot
+    per hour for the last `hourly` hours and the newest snapshot per day for the last `daily` days.
+    """
+    def __init__(self, db_path: str, backup_directory: str, hourly: int = 24, daily: int = 30):
+        """
+        :param str db_path: path to the database file to back up
+        :param str backup_directory: directory the snapshots are stored in
+        :param int hourly: number of hours to keep hourly snapshots for
+        :param int daily: number of days to keep daily snapshots for
+        """
+        self.db_path = db_path
+        self.backup_directory = backup_directory
+        self.hourly = hourly
+        self.daily = daily
+        self.db_name, self.db_extension = os.path.splitext(os.path.basename(db_path))
+        self.db_extension = self.db_extension.lstrip('.') or 'db'
+        self.compression = 'zst' if ZSTD_LOADED else 'gz'
+        self._latest: Optional[Snapshot] = None
+
+    def __repr__(self) -> str:
+        return f"DatabaseBackup({self.db_path} -> {self.backup_directory})"
+
+    def is_due(self, min_interval: float) -> bool:
+        """
+        Checks whether at least min_interval seconds passed since the newest snapshot.
+        :param float min_interval: seconds between snapshots
+        :return: True if a new snapshot is due
+        """
+        latest = self.get_latest()
+        if not latest or not min_interval:
+            return True
+        return (datetime.datetime.now() - latest.timestamp).total_seconds() >= min_interval
+
+    def snapshot(self, force: bool = False, min_interval: float = 0.0, increment: bool = True,
+                 source_path: str = '') -> Optional[Snapshot]:
+        """
+        Takes a snapshot of the database if its content changed since the newest snapshot, then rotates old ones.
+        :param bool force: if True, writes a snapshot even if the content did not change
+        :param float min_interval: seconds that must have passed since the newest snapshot, otherwise nothing is done.
+            Used to bound the cost of backing up on every save.
+        :param bool increment: if False, replaces a single rolling snapshot instead of adding to the history
+        :param str source_path: file to read the snapshot from, defaults to the database. Used to snapshot a consistent
+            copy of databases that can't be read directly.
+        :return: the newest snapshot, or None if the database does not exist
+        """
+        if not source_path:
+            source_path = self.db_path
+
+        if not os.path.exists(source_path):
+            log.warning(f"Database {source_path} does not exist, nothing to back up.")
+            return None
+
+        latest = self.get_latest()
+        if not force and not self.is_due(min_interval):
+            return latest
+
+        content_hash = _hash_file(source_path)
+        if latest and latest.content_hash == content_hash and not force:
+            log.debug(f"Database {self.db_path} unchanged since {latest.timestamp}, skipping backup.")
+            return latest
+
+        os.makedirs(self.backup_directory, exist_ok=True)
+        timestamp = datetime.datetime.now()
+        if increment:
+            snapshot_name = self._snapshot_name(timestamp.strftime(TIMESTAMP_FORMAT), content_hash)
+        else:
+            for snapshot in self.list_snapshots(include_latest=True):
+                if snapshot.is_rolling():
+                    os.remove(snapshot.path)
+            snapshot_name = self._snapshot_name(LATEST_TIMESTAMP, content_hash)
+        snapshot_path = os.path.join(self.backup_directory, snapshot_name)
+
+        file_descriptor, temp_path = tempfile.mkstemp(prefix=f".{snapshot_name}.", suffix='.tmp',
+                                                      dir=self.backup_directory)
+        os.close(file_descriptor)
+        try:
+            with open(source_path, 'rb') as source, _open_compressed(temp_path, 'wb', self.compression) as target:
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+            os.replace(temp_path, snapshot_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        log.info(f"Backed up {self.db_path} to {snapshot_path}")
+        self._latest = Snapshot(snapshot_path, timestamp, content_hash)
+        self.rotate()
+        return self._latest
+
+    def get_latest(self) -> Optional[Snapshot]:
+        """
+        Returns the newest snapshot. Cached after the first lookup so repeated backups don't list the directory.
+        :return: newest snapshot or None
+        """
+        if self._latest is None or not os.path.exists(self._latest.path):
+            snapshots = self.list_snapshots(include_latest=True)
+            self._latest = snapshots[0] if snapshots else None
+        return self._latest
+
+    def list_snapshots(self, include_latest: bool = False) -> List[Snapshot]:
+        """
+        Lists the snapshots of this database, newest first.
+        :param bool include_latest: if True, includes the rolling snapshot written with increment=False
+        :return: list of snapshots
+        """
+        if not os.path.isdir(self.backup_directory):
+            return []
+
+        snapshots = []
+        for file_name in os.listdir(self.backup_directory):
+            parts = file_name.rsplit('.', 4)
+            # projects.json and projects.sqlite share a name, the extension keeps their snapshots apart
+            if len(parts) != 5 or parts[0] != self.db_name or parts[3] != self.db_extension:
+                continue
+            name, timestamp, content_hash, extension, compression = parts
+            path = os.path.join(self.backup_directory, file_name)
+            if timestamp == LATEST_TIMESTAMP:
+                if include_latest:
+                    modified = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+                    snapshots.append(Snapshot(path, modified, content_hash))
+                continue
+            try:
+                snapshots.append(Snapshot(path, datetime.datetime.strptime(timestamp, TIMESTAMP_FORMAT), content_hash))
+            except ValueError:
+                continue
+
+        snapshots.sort(key=lambda snapshot: snapshot.timestamp, reverse=True)
+        return snapshots
+
+    def rotate(self, now: Optional[datetime.datetime] = None) -> List[Snapshot]:
+        """
+        Deletes the snapshots that fall outside the retention policy. Every snapshot from the last hour and the newest
+        snapshot are always kept.
+        :param now: time to apply the policy at, defaults to the current time
+        :return: list of deleted snapshots
+        """
+        if now is None:
+            now = datetime.datetime.now()
+
+        snapshots = self.list_snapshots()
+        retained = set(snapshot.path for snapshot in snapshots[:1])
+        hours: Set[str] = set()
+        days: Set[str] = set()
+        for snapshot in snapshots:
+            age = now - snapshot.timestamp
+            if age <= datetime.timedelta(hours=1):
+                retained.add(snapshot.path)
+                continue
+            if age <= datetime.timedelta(hours=self.hourly):
+                bucket, buckets = snapshot.timestamp.strftime('%Y%m%d%H'), hours
+            elif age <= datetime.timedelta(days=self.daily):
+                bucket, buckets = snapshot.timestamp.strftime('%Y%m%d'), days
+            else:
+                continue
+            if bucket not in buckets:
+                buckets.add(bucket)
+                retained.add(snapshot.path)
+
+        removed = []
+        for snapshot in snapshots:
+            if snapshot.path not in retained:
+                os.remove(snapshot.path)
+                removed.append(snapshot)
+
+        if removed:
+            log.debug(f"Removed {len(removed)} old backups of {self.db_path}")
+        return removed
+
+    def restore(self, snapshot: Optional[Snapshot] = None, target_path: str = '') -> str:
+        """
+        Restores a snapshot over the database. The current database is snapshotted first so the restore can be undone.
+        The snapshot is extracted next to the target and renamed over it while holding the database lock. Only for
+        databases that are a single file written under that lock, SQLite databases are restored through
+        SqliteDataAccessor.restore().
+        :param snapshot: snapshot to restore, defaults to the newest one
+        :param str target_path: path to restore to, defaults to the database path
+        :return: path that was restored to
+        """
+        if snapshot is None:
+            snapshot = self.get_latest()
+        if snapshot is None:
+            raise ValueError(f"No backups of {self.db_path} found in {self.backup_directory}")
+        if not target_path:
+            target_path = self.db_path
+
+        if target_path == self.db_path:
+            self.snapshot()
+
+        with FileLock(f"{target_path}.lock"):
+            self.extract(snapshot, target_path)
+
+        log.warning(f"Restored {snapshot.path} to {target_path}")
+        return target_path
+
+    def extract(self, snapshot: Snapshot, target_path: str) -> str:
+        """
+        Decompresses a snapshot to a file. The snapshot is streamed into a temp file next to the target and renamed
+        over it, so the target is never half written.
+        :param snapshot: snapshot to extract
+        :param str target_path: path of the file to write
+        :return: path that was written
+        """
+        target_directory = os.path.dirname(target_path) or '.'
+        os.makedirs(target_directory, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(target_path)}.",
+                                                      suffix='.tmp', dir=target_directory)
+        try:
+            with _open_compressed(snapshot.path, 'rb', snapshot.get_compression()) as source, \
+                    os.fdopen(file_descriptor, 'wb') as target:
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+                target.flush()
+                os.fsync(target.fileno())
+            if os.path.exists(target_path):
+                os.chmod(temp_path, os.stat(target_path).st_mode)
+            os.replace(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return target_path
+
+    def _snapshot_name(self, timestamp: str, content_hash: str) -> str:
+        """
+        Builds the file name of a snapshot.
+        """
+        return f"{self.db_name}.{timestamp}.{content_hash}.{self.db_extension}.{self.compression}"
+
+
+def _hash_file(file_path: str) -> str:
+    """
+    Hashes a file in chunks.
+    :param str file_path: file to hash
+    :return: first 16 hex digits of the blake2b hash of the file
+    """
+    file_hash = hashlib.blake2b(digest_size=8)
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def _open_compressed(file_path: str, mode: str, compression: str) -> BinaryIO:
+    """
+    Opens a compressed file for streaming.
+    :param str file_path: path to the compressed file
+    :param str mode: 'rb' or 'wb'
+    :param str compression: 'zst' or 'gz'
+    :return: binary file object
+    """
+    if compression == 'zst':
+        if not ZSTD_LOADED:
+            raise ImportError(f"zstandard is required to open {file_path}")
+        if mode == 'rb':
+            return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(file_path, 'wb'), closefd=True)
+    return gzip.open(file_path, mode, compresslevel=6)  # type: ignore
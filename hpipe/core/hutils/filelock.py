@@ -0,0 +1,99 @@
+"""
+Advisory file locking. Used to queue up writers to the databases on the file server so that two artists saving at the
+same time can't interleave their writes.
+"""
+import os
+import time
+from typing import *
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    fcntl = None  # type: ignore
+    import msvcrt  # type: ignore
+
+from hpipe.core.hutils import logger
+
+log = logger.setup_logger()
+log.debug("filelock.py loaded")
+
+
+class FileLock:
+    """
+    Advisory inter-process lock backed by a lock file. The uncontended case is a single open and lock call, so it is
+    cheap enough to take on every save. Meant to be used as a context manager.
+    """
+    def __init__(self, lock_path: str, timeout: float = 30.0, poll_interval: float = 0.05):
+        """
+        :param str lock_path: path to the lock file, created if it doesn't exist
+        :param float timeout: seconds to wait for the lock before raising TimeoutError
+        :param float poll_interval: seconds between attempts while the lock is held by someone else
+        """
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._file_descriptor: Optional[int] = None
+
+    def __repr__(self) -> str:
+        return f'FileLock({self.lock_path})'
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.release()
+
+    def acquire(self) -> bool:
+        """
+        Acquires the lock, waiting for other holders to release it.
+        :return: True once the lock is held
+        """
+        file_descriptor = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                _lock(file_descriptor)
+                self._file_descriptor = file_descriptor
+                return True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(file_descriptor)
+                    raise TimeoutError(f"Could not acquire lock {self.lock_path} within {self.timeout} seconds")
+                log.debug(f"Waiting for lock {self.lock_path}")
+                time.sleep(self.poll_interval)
+
+    def release(self) -> None:
+        """
+        Releases the lock if it is held.
+        """
+        if self._file_descriptor is None:
+            return
+        try:
+            _unlock(self._file_descriptor)
+        finally:
+            os.close(self._file_descriptor)
+            self._file_descriptor = None
+
+
+def _lock(file_descriptor: int) -> None:
+    """
+    Takes a non-blocking exclusive lock on a file descriptor. Raises OSError if it is already locked.
+    """
+    if fcntl:
+        fcntl.flock(file_descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        os.lseek(file_descriptor, 0, os.SEEK_SET)
+        msvcrt.locking(file_descriptor, msvcrt.LK_NBLCK, 1)
+
+
+def _unlock(file_descriptor: int) -> None:
+    """
+    Releases a lock taken with _lock.
+    """
+    if fcntl:
+        fcntl.flock(file_descriptor, fcntl.LOCK_UN)
+    else:
+        os.lseek(file_descriptor, 0, os.SEEK_SET)
+        msvcrt.locking(file_descriptor, msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,231 @@
+"""
+Persistent cache of directory listings and scan results, stored in a SQLite database in the user cache directory.
+
+A listing is keyed by the path and mtime of its directory. Adding, removing or renaming an entry changes the mtime of
+the directory it is in, so a cached listing is reused as long as the mtime of its directory hasn't changed. Rescanning
+an unchanged tree then costs one stat per directory instead of listing every directory. Scan results, e.g. the image
+sequences found in a tree, are stored with the mtimes of every directory they were built from and are only reused if
+none of those changed.
+
+Listings of directories modified in the last few seconds are not cached. File servers can have mtimes as coarse as two
+seconds, so a file added in the same tick as the listing wouldn't change the mtime.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import *
+
+from hpipe.core.hutils import logger, walker
+
+log = logger.setup_logger()
+log.debug("scan_cache.py loaded")
+
+# Directories modified less than this many seconds before they are listed are not cached
+RACY_WINDOW = 2.0
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS listings (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    entries TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    directories TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+'''
+
+
+class CachedEntry(NamedTuple):
+    """
+    Entry of a cached directory listing. Has the name, path, is_dir() and is_symlink() of os.DirEntry, so
+    walker.walk() and prune functions can use it the same way.
+    """
+    name: str
+    path: str
+    is_directory: bool
+    is_link: bool = False
+
+    def is_dir(self) -> bool:
+        return self.is_directory
+
+    def is_file(self) -> bool:
+        return not self.is_directory
+
+    def is_symlink(self) -> bool:
+        return self.is_link
+
+
+def get_cache_directory() -> str:
+    """
+    Returns the user cache directory of the pipe: %LOCALAPPDATA%/hpipe on Windows, ~/Library/Caches/hpipe on macOS and
+    $XDG_CACHE_HOME/hpipe or ~/.cache/hpipe on Linux.
+    """
+    if sys.platform == 'win32':
+        cache_root = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~/AppData/Local')
+    elif sys.platform == 'darwin':
+        cache_root = os.path.expanduser('~/Library/Caches')
+    else:
+        cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_root, 'hpipe')
+
+
+class ScanCache:
+    """
+    Cache of directory listings and scan results. Safe to use from several threads, each thread gets its own
+    connection to the database.
+    """
+    _shared: Optional['ScanCache'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, db_path: str = ''):
+        """
+        :param str db_path: path of the SQLite database, defaults to scan_cache.sqlite in the user cache directory
+        """
+        self.db_path = db_path or os.path.join(get_cache_directory(), 'scan_cache.sqlite')
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def __repr__(self) -> str:
+        return f"ScanCache @ {self.db_path}"
+
+    @classmethod
+    def shared(cls) -> Optional['ScanCache']:
+        """
+        Returns the process-wide scan cache in the user cache directory.
+        :return: shared scan cache, or None if the cache database can't be opened
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                try:
+                    cls._shared = cls()
+                except (OSError, sqlite3.Error) as e:
+                    log.warning(f"Could not open the scan cache, scanning without it: {e}")
+                    return None
+            return cls._shared
+
+    def list_directory(self, directory_path: str, mtimes: Optional[Dict[str, int]] = None) -> List[CachedEntry]:
+        """
+        Lists a directory, from the cache if its mtime hasn't changed since it was cached. Can be used as the lister
+        of walker.walk().
+        :param str directory_path: directory to list
+        :param mtimes: dictionary the mtime of the directory is recorded in, used to cache scan results
+        :return: entries of the directory
+        """
+        mtime_ns = os.stat(directory_path).st_mtime_ns
+        if mtimes is not None:
+            mtimes[directory_path] = mtime_ns
+
+        row = self._execute('SELECT mtime_ns, entries FROM listings WHERE path = ?', (directory_path,)).fetchone()
+        if row is not None and row[0] == mtime_ns:
+            cached_entries = json.loads(row[1])
+            # Listings cached before links were recorded don't say which entries are links, they are listed again
+            if all(len(cached_entry) == 3 for cached_entry in cached_entries):
+                return [CachedEntry(name, os.path.join(directory_path, name), bool(is_directory), bool(is_link))
+                        for name, is_directory, is_link in cached_entries]
+
+        entries = []
+        with os.scandir(directory_path) as scandir_entries:
+            for entry in scandir_entries:
+                try:
+                    is_directory = entry.is_dir()
+                except OSError:
+                    is_directory = False
+                entries.append(CachedEntry(entry.name, entry.path, is_directory, entry.is_symlink()))
+
+        if not _is_racy(mtime_ns):
+            listing = [(entry.name, int(entry.is_directory), int(entry.is_link)) for entry in entries]
+            self._execute('INSERT OR REPLACE INTO listings (path, mtime_ns, entries) VALUES (?, ?, ?)',
+                          (directory_path, mtime_ns, json.dumps(listing)))
+        return entries
+
+    def walk(self, root: str, mtimes: Optional[Dict[str, int]] = None, **kwargs) -> Iterator[CachedEntry]:
+        """
+        Walks a directory tree with walker.walk(), listing the directories through the cache. Takes the same arguments
+        as walker.walk().
+        :param str root: directory to walk
+        :param mtimes: dictionary the mtimes of the listed directories are recorded in
+        :return: iterator over the entries
+        """
+        def lister(directory_path: str) -> List[CachedEntry]:
+            return self.list_directory(directory_path, mtimes)
+
+        return walker.walk(root, lister=lister, **kwargs)
+
+    def get_result(self, key: str) -> Optional[Any]:
+        """
+        Gets a cached scan result if none of the directories it was built from changed.
+        :param str key: key of the result
+        :return: the result, or None if it isn't cached or is out of date
+        """
+        row = self._execute('SELECT directories, data FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        for directory_path, mtime_ns in json.loads(row[0]).items():
+            try:
+                if os.stat(directory_path).st_mtime_ns != mtime_ns:
+                    return None
+            except OSError:
+                return None
+        return json.loads(row[1])
+
+    def set_result(self, key: str, mtimes: Dict[str, int], data: Any) -> bool:
+        """
+        Caches a scan result.
+        :param str key: key of the result
+        :param mtimes: mtimes of the directories the result was built from, as recorded by walk()
+        :param data: json serializable result
+        :return: True if the result was cached, False if a directory changed too recently to trust its mtime
+        """
+        if any(_is_racy(mtime_ns) for mtime_ns in mtimes.values()):
+            return False
+        self._execute('INSERT OR REPLACE INTO results (key, directories, data) VALUES (?, ?, ?)',
+                      (key, json.dumps(mtimes), json.dumps(data)))
+        return True
+
+    def clear(self) -> bool:
+        """
+        Removes everything from the cache.
+        :return: True if successful
+        """
+        self._execute('DELETE FROM listings')
+        self._execute('DELETE FROM results')
+        return True
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current thread, opening it on first use.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        return self._connection().execute(sql, parameters)
+
+
+def get_cache(use_cache: Union[bool, ScanCache] = True) -> Optional[ScanCache]:
+    """
+    Resolves the use_cache argument of the scanners.
+    :param use_cache: True for the shared cache, False for no cache, or the cache to use
+    :return: the cache to use, or None to scan without a cache
+    """
+    if isinstance(use_cache, ScanCache):
+        return use_cache
+    return ScanCache.shared() if use_cache else None
+
+
+def _is_racy(mtime_ns: int) -> bool:
+    """
+    Checks whether an mtime is too recent to be sure later changes in the same tick would change it.
+    """
+    return time.time() - mtime_ns / 1e9 < RACY_WINDOW
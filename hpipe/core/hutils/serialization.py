@@ -0,0 +1,111 @@
+"""
+Serialization formats for the database files. The format used for writing is picked with the DB_FORMAT config, reading
+always detects the format from the contents so databases in different formats can be mixed while converting.
+
+    json     indented json, human readable and loaded lazily by the JsonDataAccessor
+    compact  json without whitespace
+    orjson   compact json written and read with orjson, falls back to the json module if orjson isn't installed
+    msgpack  binary MessagePack, requires the msgpack module
+"""
+import json
+from enum import Enum
+from typing import *
+
+ORJSON_LOADED = False
+try:
+    import orjson  # type: ignore
+    ORJSON_LOADED = True
+except ImportError:
+    pass
+
+MSGPACK_LOADED = False
+try:
+    import msgpack  # type: ignore
+    MSGPACK_LOADED = True
+except ImportError:
+    pass
+
+from hpipe.core.hutils import logger
+
+log = logger.setup_logger()
+log.debug("serialization.py loaded")
+
+
+class SerializationFormat(Enum):
+    """
+    On-disk formats of the database files.
+    """
+    JSON = 'json'
+    COMPACT = 'compact'
+    ORJSON = 'orjson'
+    MSGPACK = 'msgpack'
+
+    def is_available(self) -> bool:
+        """
+        Checks whether the modules needed to write this format are installed. orjson is always available because it
+        falls back to the json module.
+        """
+        return self is not SerializationFormat.MSGPACK or MSGPACK_LOADED
+
+
+def dumps(data: Any, serialization: SerializationFormat = SerializationFormat.JSON) -> bytes:
+    """
+    Serializes data in the given format.
+    :param data: data to serialize
+    :param SerializationFormat serialization: format to write
+    :return: serialized data
+    """
+    if serialization is SerializationFormat.JSON:
+        return json.dumps(data, indent=4).encode()
+    if serialization is SerializationFormat.ORJSON and ORJSON_LOADED:
+        return orjson.dumps(data)
+    if serialization in (SerializationFormat.COMPACT, SerializationFormat.ORJSON):
+        return json.dumps(data, separators=(',', ':')).encode()
+    if serialization is SerializationFormat.MSGPACK:
+        if not MSGPACK_LOADED:
+            raise ImportError("msgpack is required to write databases in the msgpack format")
+        return msgpack.packb(data, use_bin_type=True)
+    raise ValueError(f"Serialization format {serialization} is not supported")
+
+
+def loads(contents: bytes) -> Any:
+    """
+    Deserializes data, detecting the format from the contents. json is read with orjson if it is installed.
+    :param bytes contents: serialized data
+    :return: deserialized data
+    """
+    if detect_format(contents) is SerializationFormat.MSGPACK:
+        if not MSGPACK_LOADED:
+            raise ImportError("msgpack is required to read databases in the msgpack format")
+        return msgpack.unpackb(contents, raw=False)
+    if ORJSON_LOADED:
+        return orjson.loads(contents)
+    return json.loads(contents)
+
+
+def detect_format(contents: bytes) -> SerializationFormat:
+    """
+    Detects the format of serialized data. json documents start with a bracket or whitespace, anything else is assumed
+    to be msgpack. Indented and compact json are told apart by whether there is a newline after the first byte.
+    :param bytes contents: serialized data
+    :return: detected format
+    """
+    stripped = contents[:64].lstrip()
+    if not stripped or stripped[:1] in (b'{', b'['):
+        if contents[1:2] == b'\n':
+            return SerializationFormat.JSON
+        return SerializationFormat.COMPACT
+    return SerializationFormat.MSGPACK
+
+
+def get_format(name: str) -> SerializationFormat:
+    """
+    Gets a serialization format from its config name.
+    :param str name: name of the format, e.g. 'msgpack'
+    :return: serialization format
+    """
+    try:
+        return SerializationFormat(str(name).lower())
+    except ValueError:
+        raise ValueError(f"Serialization format {name} is not supported. Use one of "
+                         f"{[serialization.value for serialization in SerializationFormat]}.")
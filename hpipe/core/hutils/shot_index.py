@@ -0,0 +1,233 @@
+"""
+Secondary indexes over the shots in the project database. The indexes are built from the raw shot dictionaries stored
+in the database, so no Project or Shot objects are built to maintain them. They are kept up to date per project, the
+ProjectDataManager re-indexes a project whenever it changes.
+"""
+import bisect
+from typing import *
+
+from hpipe.core.hutils import logger
+
+log = logger.setup_logger()
+log.debug("shot_index.py loaded")
+
+# (project key, shot name) of a shot in the database
+ShotKey = Tuple[str, str]
+
+
+class IntervalIndex:
+    """
+    Index of inclusive frame ranges that can be queried for the ranges overlapping a given range. Intervals are kept
+    sorted by their start frame, so a query only looks at intervals starting between (query start - longest interval)
+    and the query end.
+    """
+    def __init__(self):
+        self._intervals: List[Tuple[int, int, ShotKey]] = []
+        self._by_key: Dict[ShotKey, Tuple[int, int, ShotKey]] = {}
+        # Upper bound on the length of the indexed intervals. Not lowered when intervals are removed, which only
+        # makes queries look at a few more candidates.
+        self._max_length = 0
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def add(self, key: ShotKey, start: int, end: int) -> None:
+        """
+        Adds an interval, replacing the interval of the key if it was already indexed.
+        :param key: key of the interval
+        :param int start: first frame
+        :param int end: last frame
+        """
+        if key in self._by_key:
+            self.remove(key)
+        if end < start:
+            start, end = end, start
+        interval = (start, end, key)
+        bisect.insort(self._intervals, interval)
+        self._by_key[key] = interval
+        self._max_length = max(self._max_length, end - start)
+
+    def remove(self, key: ShotKey) -> None:
+        """
+        Removes the interval of a key if it is indexed.
+        :param key: key of the interval
+        """
+        interval = self._by_key.pop(key, None)
+        if interval is None:
+            return
+        index = bisect.bisect_left(self._intervals, interval)
+        del self._intervals[index]
+
+    def overlapping(self, start: int, end: int) -> Set[ShotKey]:
+        """
+        Finds the intervals overlapping an inclusive frame range.
+        :param int start: first frame of the range
+        :param int end: last frame of the range
+        :return: set of keys of the overlapping intervals
+        """
+        low = bisect.bisect_left(self._intervals, (start - self._max_length,))
+        high = bisect.bisect_right(self._intervals, (end, float('inf')))
+        return set(key for interval_start, interval_end, key in self._intervals[low:high] if interval_end >= start)
+
+
+class ShotIndex:
+    """
+    Secondary indexes on the shots of the project database: tag -> shots, an interval index on the frame ranges and
+    value -> shots indexes on the user_data keys that were opted in with index_user_data().
+    """
+    def __init__(self, user_data_keys: Iterable[str] = ()):
+        """
+        :param user_data_keys: user_data keys to index
+        """
+        self.user_data_keys: Set[str] = set(user_data_keys)
+        self.frames = IntervalIndex()
+        self._tags: Dict[str, Set[ShotKey]] = {}
+        self._user_data: Dict[str, Dict[Hashable, Set[ShotKey]]] = {key: {} for key in self.user_data_keys}
+        self._projects: Dict[str, Dict[str, int]] = {}
+        self._entries: Dict[ShotKey, Tuple[List[str], Dict[str, Hashable]]] = {}
+
+    def __repr__(self) -> str:
+        return f"ShotIndex({len(self._entries)} shots in {len(self._projects)} projects)"
+
+    def index_user_data(self, user_data_key: str, data: Mapping[str, Any]) -> None:
+        """
+        Starts indexing a user_data key and indexes it for every shot already in the index.
+        :param str user_data_key: user_data key to index
+        :param data: current database data, used to index the shots that are already indexed
+        """
+        if user_data_key in self.user_data_keys:
+            return
+        self.user_data_keys.add(user_data_key)
+        self._user_data[user_data_key] = {}
+        for project_key in list(self._projects):
+            self.index_project(project_key, data.get(project_key))
+
+    def index_project(self, project_key: str, project_dictionary: Optional[Mapping[str, Any]]) -> None:
+        """
+        Re-indexes all shots of a project. Passing None removes the project from the index.
+        :param str project_key: key of the project in the database
+        :param project_dictionary: project dictionary as stored in the database, or None
+        """
+        self.remove_project(project_key)
+        if project_dictionary is None:
+            return
+
+        positions = {}
+        for position, (shot_name, shot_dictionary) in enumerate((project_dictionary.get('member_shots') or {}).items()):
+            positions[shot_name] = position
+            self._add_shot((project_key, shot_name), shot_dictionary)
+        self._projects[project_key] = positions
+
+    def remove_project(self, project_key: str) -> None:
+        """
+        Removes all shots of a project from the index.
+        :param str project_key: key of the project in the database
+        """
+        for shot_name in self._projects.pop(project_key, {}):
+            self._remove_shot((project_key, shot_name))
+
+    def is_indexed(self, project_key: str) -> bool:
+        """
+        Checks whether a project is in the index.
+        """
+        return project_key in self._projects
+
+    def find(self, tag: Optional[str] = None, overlaps: Optional[Tuple[int, int]] = None,
+             project: Optional[str] = None, user_data: Optional[Mapping[str, Any]] = None) -> List[ShotKey]:
+        """
+        Finds the shots matching all the given criteria. Criteria left as None are ignored.
+        :param str tag: tag the shots must have
+        :param overlaps: inclusive (start, end) frame range the shots must overlap
+        :param str project: key of the project the shots must be in
+        :param user_data: user_data values the shots must have. Every key must have been opted in with
+            index_user_data().
+        :return: keys of the matching shots, ordered by project key then shot position in the project
+        """
+        candidates: Optional[Set[ShotKey]] = None
+
+        def narrow(keys: Iterable[ShotKey]) -> Set[ShotKey]:
+            return set(keys) if candidates is None else candidates.intersection(keys)
+
+        if project is not None:
+            candidates = narrow((project, shot_name) for shot_name in self._projects.get(project, {}))
+        if tag is not None:
+            candidates = narrow(self._tags.get(tag, ()))
+        if overlaps is not None:
+            candidates = narrow(self.frames.overlapping(*overlaps))
+        for user_data_key, value in (user_data or {}).items():
+            if user_data_key not in self.user_data_keys:
+                raise ValueError(f"user_data key {user_data_key} is not indexed")
+            candidates = narrow(self._user_data[user_data_key].get(_hashable(value), ()))
+        if candidates is None:
+            candidates = set(self._entries)
+
+        return sorted(candidates, key=lambda shot_key: (shot_key[0], self._projects[shot_key[0]][shot_key[1]]))
+
+    def _add_shot(self, shot_key: ShotKey, shot_dictionary: Mapping[str, Any]) -> None:
+        """
+        Adds a single shot to the indexes.
+        """
+        tags = [tag for tag in (shot_dictionary.get('tags') or []) if tag]
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(shot_key)
+
+        frame_start = _to_frame(shot_dictionary.get('frame_start'))
+        frame_end = _to_frame(shot_dictionary.get('frame_end'))
+        if frame_start is not None and frame_end is not None:
+            self.frames.add(shot_key, frame_start, frame_end)
+
+        user_data_values = {}
+        shot_user_data = shot_dictionary.get('user_data')
+        if not isinstance(shot_user_data, Mapping):
+            shot_user_data = {}
+        for user_data_key in self.user_data_keys:
+            if user_data_key in shot_user_data:
+                value = _hashable(shot_user_data[user_data_key])
+                self._user_data[user_data_key].setdefault(value, set()).add(shot_key)
+                user_data_values[user_data_key] = value
+
+        self._entries[shot_key] = (tags, user_data_values)
+
+    def _remove_shot(self, shot_key: ShotKey) -> None:
+        """
+        Removes a single shot from the indexes.
+        """
+        tags, user_data_values = self._entries.pop(shot_key)
+        for tag in tags:
+            _discard(self._tags, tag, shot_key)
+        self.frames.remove(shot_key)
+        for user_data_key, value in user_data_values.items():
+            _discard(self._user_data[user_data_key], value, shot_key)
+
+
+def _to_frame(value: Any) -> Optional[int]:
+    """
+    Converts a stored frame number to an int. Older databases store frames as strings.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _hashable(value: Any) -> Hashable:
+    """
+    Converts a json value to something that can be used as a dictionary key.
+    """
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    return value
+
+
+def _discard(index: Dict[Hashable, Set[ShotKey]], value: Hashable, shot_key: ShotKey) -> None:
+    """
+    Removes a shot from one entry of an index, dropping the entry once it is empty.
+    """
+    shot_keys = index.get(value)
+    if shot_keys is None:
+        return
+    shot_keys.discard(shot_key)
+    if not shot_keys:
+        del index[value]
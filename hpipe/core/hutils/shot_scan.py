@@ -0,0 +1,142 @@
+"""
+Concurrent scanning of shot directories. Listing a directory on the file server is mostly waiting on the network, so
+scanning the shots of a show one after the other spends nearly all its time waiting. scan_shots() scans them on a
+thread pool instead and hands the results back as they come in, in shot order.
+
+    with shot_scan.scan_shots(shots, [shot_scan.ScanKind.COMPS]) as scan:
+        for result in scan:
+            add_to_grid(result.items)
+"""
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, as_completed
+from enum import Enum
+from typing import *
+
+from hpipe.core import constants
+from hpipe.core.hutils import logger
+
+if TYPE_CHECKING:
+    from hpipe.core import shot
+
+log = logger.setup_logger()
+log.debug("shot_scan.py loaded")
+
+
+class ScanKind(Enum):
+    """
+    What to scan a shot for. The value is the Shot method doing the scan.
+    """
+    COMPS = 'get_comps'
+    PLATES = 'get_plates'
+    PROJECT_FILES = 'get_project_files'
+
+
+class ShotScanResult(NamedTuple):
+    """
+    Result of scanning one shot for one kind of item. error is set, and items empty, if the scan failed.
+    """
+    index: int
+    shot: 'shot.Shot'
+    kind: ScanKind
+    items: list
+    error: Optional[Exception] = None
+
+
+class ShotScan:
+    """
+    Handle on a running scan started by scan_shots(). Iterating it yields the results in shot order, then kind order,
+    each as soon as it and every result before it are done. as_completed() yields them as soon as they are done
+    instead. Cancelling stops the scans that haven't started, the ones running finish their current shot.
+    """
+    def __init__(self, shots: Iterable['shot.Shot'], kinds: Iterable[ScanKind],
+                 max_workers: int = constants.SCAN_MAX_WORKERS):
+        self.shots = list(shots)
+        self.kinds = list(kinds)
+        self._cancelled = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='hpipe_scan')
+        self._futures: List[Future] = [self._executor.submit(self._scan, index, shot_instance, kind)
+                                       for index, shot_instance in enumerate(self.shots) for kind in self.kinds]
+        # Lets the worker threads exit once the queue is empty without waiting for them here
+        self._executor.shutdown(wait=False)
+
+    def __repr__(self) -> str:
+        return f"ShotScan({len(self.shots)} shots, {self.done_count()}/{len(self._futures)} done)"
+
+    def __iter__(self) -> Iterator[ShotScanResult]:
+        for future in self._futures:
+            if self._cancelled.is_set():
+                return
+            try:
+                yield future.result()
+            except CancelledError:
+                return
+
+    def __enter__(self) -> 'ShotScan':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.cancel()
+
+    def as_completed(self) -> Iterator[ShotScanResult]:
+        """
+        Yields the results in the order the scans finish.
+        :return: iterator over the results
+        """
+        for future in as_completed(self._futures):
+            if self._cancelled.is_set():
+                return
+            if not future.cancelled():
+                yield future.result()
+
+    def results(self) -> List[ShotScanResult]:
+        """
+        Waits for the scan to finish.
+        :return: all results in shot order, only the ones finished before cancelling if the scan was cancelled
+        """
+        return list(self)
+
+    def cancel(self) -> None:
+        """
+        Cancels the scans that haven't started yet and stops iterating.
+        """
+        self._cancelled.set()
+        for future in self._futures:
+            future.cancel()
+
+    def is_cancelled(self) -> bool:
+        """
+        Checks whether the scan was cancelled.
+        """
+        return self._cancelled.is_set()
+
+    def done_count(self) -> int:
+        """
+        Returns the number of shot scans that are finished, for progress bars.
+        """
+        return sum(future.done() for future in self._futures)
+
+    def _scan(self, index: int, shot_instance: 'shot.Shot', kind: ScanKind) -> ShotScanResult:
+        """
+        Scans a single shot, runs on the thread pool. Errors are logged and returned with the result so one unreadable
+        shot doesn't stop the scan.
+        """
+        if self._cancelled.is_set():
+            return ShotScanResult(index, shot_instance, kind, [])
+        try:
+            items = getattr(shot_instance, kind.value)()
+        except Exception as e:
+            log.warning(f"Could not scan {shot_instance} for {kind.name.lower()}: {e}")
+            return ShotScanResult(index, shot_instance, kind, [], e)
+        return ShotScanResult(index, shot_instance, kind, items)
+
+
+def scan_shots(shots: Iterable['shot.Shot'], kinds: Iterable[ScanKind] = (ScanKind.COMPS,),
+               max_workers: int = constants.SCAN_MAX_WORKERS) -> ShotScan:
+    """
+    Starts scanning shots on a thread pool and returns right away.
+    :param shots: shots to scan
+    :param kinds: what to scan each shot for
+    :param int max_workers: number of shots scanned at once
+    :return: handle on the scan, iterate it for the results
+    """
+    return ShotScan(shots, kinds, max_workers)
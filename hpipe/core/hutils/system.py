@@ -1,19 +1,34 @@
 """
 This module contains functions for dealing with file paths.
 """
+import functools
 import os
 import platform
+import re
 from enum import Enum
 from typing import *
 import datetime
 
-from hpipe.core.hutils import path
+from hpipe.core.hutils import path, walker
 
 LINUX_ROOT = r'/mnt/share/hlw01/'
 WINDOWS_ROOT = r'Y:/'
 OSX_ROOT = r'/Volumes/hlw01/'
 LOCAL_ROOT = os.path.expanduser('~')
 
+# Roots of the storage volumes on each system, used when the config has no PATH_ROOTS. The first volume is the primary
+# one, its roots are the SystemConfig roots. The local drives have a root on a single system, so their paths are only
+# classified and never translated.
+DEFAULT_PATH_ROOTS = {
+    'hlw01': {'linux': LINUX_ROOT, 'windows': WINDOWS_ROOT, 'osx': OSX_ROOT},
+    'local_windows': {'windows': 'C:/'},
+    # FIXME: This assumes that only osx uses /Users for local storage which is most likely incorrect
+    'local_osx': {'osx': '/Users/'},
+}
+
+# Number of raw paths whose system and translated path are remembered
+PATH_CACHE_SIZE = 16384
+
 
 class System(Enum):
     OSX = 'osx'
@@ -21,53 +36,58 @@ class System(Enum):
     LINUX = 'linux'
     RELATIVE = 'relative'
     LOCAL = 'local'
+    # Canonical storage form of a path, <volume>:/path/in/volume, the same on every system
+    STORAGE = 'storage'
 
 
 class Directory:
     """
     Base class for a directory on disk. This class is meant to be very generic and only describe the most basic
     properties of a directory. It is meant to be subclassed to create more specific directory types.
+
+    Scans build a lot of these, so instances use __slots__ and only store the path. Everything derived from the path is
+    computed when it is accessed.
     """
+    __slots__ = ('force_raw_path', 'directory_path', '_directory_name')
+
     def __init__(self, directory_path: str, directory_name: str = '', force_raw_path: bool = False):
         self.force_raw_path = force_raw_path
         self.directory_path = path.fix_path(directory_path)
-        if directory_name == '':
-            directory_name = os.path.basename(directory_path)
+        self._directory_name = directory_name
         self.directory_path = self.system_path()
-        self.directory_name = directory_name
 
     def __repr__(self):
         return f'Directory({self.directory_path})'
 
+    @property
+    def directory_name(self) -> str:
+        """
+        Name of the directory, defaults to its basename.
+        """
+        return self._directory_name or os.path.basename(self.directory_path)
+
     def get_files(self) -> List['Filepath']:
         """
         Returns a list of all files in the directory.
         """
-        directory_files: list[Filepath] = []
-        for root, dirs, files in os.walk(self.directory_path):
-            for file in files:
-                directory_files.append(Filepath(os.path.join(root, file)))
-
-        return directory_files
+        return [Filepath(file_path) for file_path in walker.walk_paths(self.directory_path)]
 
-    def get_files_by_extension(self, extension: str, recurse=True) -> List['Filepath']:
+    def get_files_by_extension(self, extension: Union[str, Iterable[str]], recurse=True) -> List['Filepath']:
         """
-        Returns a list of all files in the directory with the given extension.
+        Returns a list of all files in the directory with the given extension. Several extensions can be given at once,
+        the directory is then only walked once and the files are grouped by extension in the given order.
+        :param extension: extension or extensions of the files, e.g. '.usd' or ['.png', '.jpg']
+        :param bool recurse: whether to look in the subdirectories too
+        :return: list of files
         """
-        directory_files: list[Filepath] = []
-
-        if recurse:
-            for root, dirs, files in os.walk(self.directory_path):
-                for file in files:
-                    if file.endswith(extension):
-                        directory_files.append(Filepath(os.path.join(root, file)))
-
-        else:
-            for file in os.listdir(self.directory_path):
-                if file.endswith(extension):
-                    directory_files.append(Filepath(os.path.join(self.directory_path, file)))
-
-        return directory_files
+        extensions = [extension] if isinstance(extension, str) else list(extension)
+        file_paths = walker.walk_paths(self.directory_path, extensions=extensions, max_depth=None if recurse else 0)
+        files = [Filepath(file_path) for file_path in file_paths]
+        if len(extensions) > 1:
+            suffixes = [suffix.lower() if suffix.startswith('.') else f'.{suffix.lower()}' for suffix in extensions]
+            files.sort(key=lambda filepath: next(index for index, suffix in enumerate(suffixes)
+                                                 if filepath.basename.lower().endswith(suffix)))
+        return files
 
     def get_parent_directory(self) -> 'Directory':
         """
@@ -86,28 +106,26 @@ class Directory:
         Returns a list of all subdirectories in the directory.
         :return: list of subdirectories
         """
-        subdirectories: list[Directory] = []
-        for root, dirs, files in os.walk(self.directory_path):
-            for directory in dirs:
-                subdirectories.append(Directory(os.path.join(root, directory)))
-        return subdirectories
+        return [Directory(directory_path)
+                for directory_path in walker.walk_paths(self.directory_path, files=False, directories=True)]
 
     def get_children_directories(self) -> List['Directory']:
         """
         Returns a list of all subdirectories in the directory. Does not recurse.
         :return: list of subdirectories
         """
-        subdirectories: list[Directory] = []
-        for f in os.listdir(self.directory_path):
-            if os.path.isdir(os.path.join(self.directory_path, f)):
-                subdirectories.append(Directory(os.path.join(self.directory_path, f)))
-        return subdirectories
+        return [Directory(directory_path) for directory_path in walker.walk_paths(self.directory_path, max_depth=0,
+                                                                                  files=False, directories=True)]
 
     def system_path(self) -> str:
         """
         Returns the system path of the directory.
         """
-        self.directory_path = Filepath(self.directory_path, force_raw_path=self.force_raw_path).system_path()
+        directory_path = path.fix_path(self.directory_path)
+        if '~' in directory_path:
+            directory_path = directory_path.replace('~', SystemConfig.get_home())
+        path_system, translated_path = _translate_root(directory_path)
+        self.directory_path = directory_path if self.force_raw_path else translated_path
         return self.directory_path
 
     def exists(self) -> bool:
@@ -122,23 +140,50 @@ class Filepath:
     Base class for a filepath. This class is meant to be very generic and only describe the most basic
     properties of a filepath. It is meant to be subclassed to create more specific filepath types, like images,
     project files, etc.
+
+    Scans build tens of thousands of these, so instances use __slots__ and only store the path and its system. The
+    basename, extension, name and system root are computed when they are accessed.
     """
+    __slots__ = ('force_raw_path', 'filepath_path', 'system', '_filepath_name')
 
     def __init__(self, filepath_path: str, filepath_name: str = '', force_raw_path: bool = False):
         self.force_raw_path = force_raw_path
         self.filepath_path = path.fix_path(filepath_path)
         self.filepath_path = self.expand_path()
-        if filepath_name == '':
-            filepath_name = os.path.basename(filepath_path)
-        self.filepath_name = filepath_name
-        self.basename = os.path.basename(filepath_path)
-        self.extension = os.path.splitext(filepath_path)[1]
+        self._filepath_name = filepath_name
         self.system = self.get_path_system()
-        self.system_root = self.get_root()
 
     def __repr__(self):
         return f'Filepath({self.filepath_path})'
 
+    @property
+    def filepath_name(self) -> str:
+        """
+        Name of the filepath, defaults to its basename.
+        """
+        return self._filepath_name or self.basename
+
+    @property
+    def basename(self) -> str:
+        """
+        Basename of the filepath, e.g. render_1001.exr
+        """
+        return os.path.basename(self.filepath_path)
+
+    @property
+    def extension(self) -> str:
+        """
+        Extension of the filepath including the dot, e.g. .exr
+        """
+        return os.path.splitext(self.filepath_path)[1]
+
+    @property
+    def system_root(self) -> str:
+        """
+        Root of the system the filepath is on.
+        """
+        return self.get_root()
+
     def has_frame_number(self) -> bool:
         """
         Checks if the filepath has a frame number.
@@ -170,28 +215,9 @@ class Filepath:
 
     def get_path_system(self) -> System:
         """
-        Returns the current system
+        Returns the system the filepath is on
         """
-
-        # TODO logic needs to be reworked
-        if LINUX_ROOT in self.filepath_path:
-            return System.LINUX
-        if WINDOWS_ROOT in self.filepath_path:
-            return System.WINDOWS
-        if r"C:" in self.filepath_path:
-            return System.WINDOWS
-        if OSX_ROOT in self.filepath_path:
-            return System.OSX
-        if "/Users" in self.filepath_path:
-            # FIXME: This assumes that only osx uses /users for local storage
-            #       which is most likely incorrect
-            return System.OSX
-
-        # FIXME: This is a hacky way to check if the path is relative
-        if self.filepath_path == '.' or self.filepath_path == r'./':
-            return System.RELATIVE
-
-        raise ValueError(f'Filepath: {self.filepath_path} does not contain a valid system root.')
+        return get_path_system(self.filepath_path)
 
     def expand_path(self) -> str:
         """
@@ -203,35 +229,22 @@ class Filepath:
 
     def get_root(self) -> str:
         """
-        Returns the root path for the current system
+        Returns the root the filepath is under, e.g. Y:/
         """
-        if self.system == System.LINUX:
-            return LINUX_ROOT
-        if self.system == System.WINDOWS:
-            return WINDOWS_ROOT
-        if self.system == System.OSX:
-            return OSX_ROOT
         if self.system == System.RELATIVE:
             return ''
-        raise ValueError('Filepath does not contain a valid system root.')
+        resolved = get_root_mapping().resolve(self.filepath_path)
+        if resolved is None:
+            raise ValueError('Filepath does not contain a valid system root.')
+        return resolved[0] + '/'
 
     def system_path(self) -> str:
         """
         Returns the path for the current system
         """
-        sys_config = SystemConfig()
-        environment = sys_config.system
-
         if self.force_raw_path:
             return self.filepath_path
-
-        if '~' in self.filepath_path:
-            self.filepath_path.replace('~', sys_config.get_home())
-
-        if environment != self.system and self.system != System.RELATIVE:
-            return self.filepath_path.replace(self.system_root, sys_config.system_root)
-        else:
-            return self.filepath_path
+        return translate_path(self.filepath_path)
 
     def get_extension(self) -> str:
         """
@@ -278,6 +291,206 @@ def path_factory(filepath: str) -> Union[Filepath, Directory]:
         return Filepath(filepath)
 
 
+class RootMapping:
+    """
+    Mapping of the roots of the storage volumes between systems. Each volume has a root per system it is mounted on,
+    e.g. {'hlw01': {'linux': '/mnt/share/hlw01/', 'windows': 'Y:/'}}, and a storage root, hlw01:/, that is the same on
+    every system. All roots are compiled into a single pattern that finds the longest root a path starts with.
+    """
+    def __init__(self, volumes: Mapping[str, Mapping[str, str]]):
+        """
+        :param volumes: roots of each volume by system name
+        """
+        self.volumes: Dict[str, Dict[System, str]] = {}
+        self._roots: Dict[str, Tuple[str, System]] = {}
+        current_system = SystemConfig.get_system()
+        for volume, system_roots in volumes.items():
+            if len(volume) < 2:
+                raise ValueError(f'Volume name {volume} is too short, single letters are drive letters.')
+            self.volumes[volume] = {}
+            for system_name, root in system_roots.items():
+                system = System(system_name)
+                if system not in (System.LINUX, System.WINDOWS, System.OSX):
+                    raise ValueError(f'Volume {volume} has a root for {system_name}, which is not an operating system.')
+                root = path.fix_path(root)
+                if not root:
+                    raise ValueError(f'Volume {volume} has an empty root for {system_name}.')
+                self.volumes[volume][system] = root
+                # Two systems sharing a root is ambiguous, the current system wins so its paths aren't translated
+                if root not in self._roots or system == current_system:
+                    self._roots[root] = (volume, system)
+            self.volumes[volume][System.STORAGE] = f'{volume}:'
+            self._roots[f'{volume}:'] = (volume, System.STORAGE)
+
+        # Longest roots first, so the first alternative that matches is the longest root. A root only matches whole
+        # directory names.
+        roots = sorted(self._roots, key=len, reverse=True)
+        self._pattern = re.compile(f"(?:{'|'.join(re.escape(root) for root in roots)})(?=/|$)")
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, RootMapping) and self.volumes == other.volumes
+
+    def __repr__(self) -> str:
+        return f'RootMapping({list(self.volumes)})'
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> 'RootMapping':
+        """
+        Builds the root mapping from the config. PATH_ROOTS holds the roots of every volume and defaults to
+        DEFAULT_PATH_ROOTS. SITE_PATH_ROOTS holds per site overrides of those roots, the ones of the configured SITE are
+        applied on top, e.g.
+            "SITE": "london",
+            "SITE_PATH_ROOTS": {"london": {"hlw01": {"windows": "Z:/"}}}
+        :param config: config to read the roots from
+        :return: root mapping
+        """
+        volumes = {volume: dict(system_roots)
+                   for volume, system_roots in (config.get('PATH_ROOTS') or DEFAULT_PATH_ROOTS).items()}
+        site = config.get('SITE')
+        if site:
+            site_volumes = (config.get('SITE_PATH_ROOTS') or {}).get(site)
+            if site_volumes is None:
+                raise ValueError(f'SITE is {site} but SITE_PATH_ROOTS has no roots for it.')
+            for volume, system_roots in site_volumes.items():
+                volumes.setdefault(volume, {}).update(system_roots)
+        return cls(volumes)
+
+    def resolve(self, filepath_path: str) -> Optional[Tuple[str, str, System]]:
+        """
+        Finds the longest root a path starts with.
+        :param str filepath_path: path to resolve
+        :return: (root, volume, system) of the root, or None if the path isn't under any root
+        """
+        match = self._pattern.match(filepath_path)
+        if match is None:
+            return None
+        root = match.group()
+        return (root,) + self._roots[root]
+
+    def translate(self, filepath_path: str, system: Optional[System] = None) -> str:
+        """
+        Translates a path to the root of its volume on another system. Paths that aren't under any root, or whose volume
+        has no root on the system, are returned unchanged.
+        :param str filepath_path: path to translate
+        :param System system: system to translate to, System.STORAGE for the storage form. Defaults to the current
+            system.
+        :return: translated path
+        """
+        resolved = self.resolve(filepath_path)
+        if resolved is None:
+            return filepath_path
+        root, volume, path_system = resolved
+        target_root = self.volumes[volume].get(system or SystemConfig.get_system())
+        if target_root is None or target_root == root:
+            return filepath_path
+        return target_root + filepath_path[len(root):]
+
+    def get_primary_root(self, system: System) -> str:
+        """
+        Returns the root of the primary volume, the first one, on a system.
+        :param System system: system to get the root for
+        :return: root ending with a /
+        """
+        for system_roots in self.volumes.values():
+            if system in system_roots:
+                return system_roots[system] + '/'
+            break
+        raise ValueError(f'The primary volume has no root on {system.value}.')
+
+
+_root_mapping: Optional[RootMapping] = None
+
+
+def get_root_mapping() -> RootMapping:
+    """
+    Returns the root mapping used to translate paths. Until set_root_mapping() is called, which the ConfigDataManager
+    does when it loads the config, this is built from DEFAULT_PATH_ROOTS.
+    :return: current root mapping
+    """
+    global _root_mapping
+    if _root_mapping is None:
+        _root_mapping = RootMapping(DEFAULT_PATH_ROOTS)
+    return _root_mapping
+
+
+def set_root_mapping(root_mapping: RootMapping) -> None:
+    """
+    Replaces the root mapping used to translate paths and clears the path caches.
+    :param RootMapping root_mapping: new root mapping
+    """
+    global _root_mapping
+    _root_mapping = root_mapping
+    _translate_root.cache_clear()
+    get_system_config.cache_clear()
+
+
+def get_path_system(filepath_path: str) -> System:
+    """
+    Returns the system a path is on, based on the root it starts with.
+    :param str filepath_path: path to check
+    :return: system of the path
+    """
+    return _translate_root(filepath_path)[0]
+
+
+def translate_path(filepath_path: str) -> str:
+    """
+    Translates a path to the root of the current system.
+    :param str filepath_path: path to translate, with its ~ already expanded
+    :return: path on the current system
+    """
+    return _translate_root(filepath_path)[1]
+
+
+def to_storage_path(filepath_path: str) -> str:
+    """
+    Translates a path to its storage form, e.g. Y:/projects/a.exr to hlw01:/projects/a.exr. Paths in storage form are
+    the same on every system, so they are what should be stored in databases and files shared between systems.
+    :param str filepath_path: path to translate
+    :return: path in storage form, or the path unchanged if it isn't under any volume
+    """
+    return get_root_mapping().translate(path.fix_path(filepath_path), System.STORAGE)
+
+
+def translate_many(filepath_paths: Iterable[str], system: Optional[System] = None) -> List[str]:
+    """
+    Translates many paths at once, for scanners. Skips the path cache, which scanned paths would only flush. Paths are
+    expected to already be fixed with path.fix_path().
+    :param filepath_paths: paths to translate
+    :param System system: system to translate to, System.STORAGE for the storage form. Defaults to the current system.
+    :return: translated paths, in the same order
+    """
+    translate = get_root_mapping().translate
+    system = system or SystemConfig.get_system()
+    return [translate(filepath_path, system) for filepath_path in filepath_paths]
+
+
+@functools.lru_cache(maxsize=PATH_CACHE_SIZE)
+def _translate_root(filepath_path: str) -> Tuple[System, str]:
+    """
+    Finds the system of a path and translates it to the current system. Both are needed for every Filepath, so they
+    share a cache entry.
+    """
+    root_mapping = get_root_mapping()
+    resolved = root_mapping.resolve(filepath_path)
+    if resolved is not None:
+        return resolved[2], root_mapping.translate(filepath_path)
+
+    # FIXME: This is a hacky way to check if the path is relative
+    if filepath_path == '.' or filepath_path == r'./':
+        return System.RELATIVE, filepath_path
+
+    raise ValueError(f'Filepath: {filepath_path} does not contain a valid system root.')
+
+
+@functools.lru_cache(maxsize=None)
+def get_system_config() -> 'SystemConfig':
+    """
+    Returns the SystemConfig of the current system. The system can't change while running, so it is only built once.
+    """
+    return SystemConfig()
+
+
 class SystemConfig:
     """
     Class for determining the current system and setting the correct paths.
@@ -295,31 +508,26 @@ class SystemConfig:
         return datetime.datetime.now().strftime('%Y_%m_%d')
 
     @staticmethod
+    @functools.lru_cache(maxsize=None)
     def get_system() -> System:
         """
         Returns the current system
         """
-
-        if platform.system() == 'Darwin':
+        platform_system = platform.system()
+        if platform_system == 'Darwin':
             return System.OSX
-        if platform.system() == 'Windows':
+        if platform_system == 'Windows':
             return System.WINDOWS
-        if platform.system() == 'Linux':
+        if platform_system == 'Linux':
             return System.LINUX
         else:
             return System.WINDOWS
 
     def get_root(self) -> str:
         """
-        Returns the root path for the current system
+        Returns the root of the primary volume for the current system
         """
-        if self.system == System.LINUX:
-            return LINUX_ROOT
-        if self.system == System.WINDOWS:
-            return WINDOWS_ROOT
-        if self.system == System.OSX:
-            return OSX_ROOT
-        raise ValueError('Filepath does not contain a valid system root.')
+        return get_root_mapping().get_primary_root(self.system)
 
     @staticmethod
     def get_home() -> str:
@@ -0,0 +1,732 @@
+"""
+Watches directory trees and files for changes on a background thread. On Linux, local trees are watched with inotify,
+so the kernel reports changes as they happen. Network shares don't get inotify events for changes made from other
+machines, and the other platforms don't have inotify, so those trees are polled instead. A poll stats each directory of
+the tree and only lists the ones whose mtime changed, the same way the scan cache checks its listings. Watched files
+are always polled, that is a single stat each.
+
+Changes are handed to the callback in batches, once nothing changed for a moment, so a render writing hundreds of
+frames doesn't call it hundreds of times.
+
+    watcher = DirectoryWatcher(on_changes)
+    watcher.watch(render_directory)
+    watcher.start()
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from enum import Enum
+from typing import *
+
+from hpipe.core import constants
+from hpipe.core.hutils import logger, scan_cache, walker
+
+log = logger.setup_logger()
+log.debug("watcher.py loaded")
+
+INOTIFY_AVAILABLE = False
+_libc = None
+if sys.platform.startswith('linux'):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        INOTIFY_AVAILABLE = hasattr(_libc, 'inotify_init1')
+    except OSError as e:
+        log.debug(f"libc not found, watching by polling only: {e}")
+
+# inotify event flags, from sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+# Files are reported once they are closed after writing, not when they are created, so frames aren't picked up while
+# they are still being written.
+INOTIFY_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF |
+                IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Filesystems whose changes from other machines aren't reported by inotify, trees on them are polled
+NETWORK_FILESYSTEMS = ('nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'afs', 'ceph', 'glusterfs', '9p', 'fuse.sshfs',
+                       'fuse.rclone')
+
+# Changes are handed over once nothing changed for SETTLE_TIME seconds, or after MAX_LATENCY seconds if things keep
+# changing. The watcher thread checks for new and removed watches every WAKE_INTERVAL seconds.
+SETTLE_TIME = 0.25
+MAX_LATENCY = 2.0
+WAKE_INTERVAL = 0.25
+
+
+class ChangeType(Enum):
+    """
+    Type of a change. LISTED entries come from a full listing of a tree, taken when it starts being watched or when
+    the watcher lost track of it. A listing starts with a LISTED change of the root itself and replaces everything
+    known about the tree.
+    """
+    CREATED = 'created'
+    DELETED = 'deleted'
+    MODIFIED = 'modified'
+    LISTED = 'listed'
+
+
+class Change(NamedTuple):
+    """
+    Change to a watched tree or file. Files written again are reported as CREATED again when watched with inotify.
+    root is the watched directory or file the change belongs to.
+    """
+    change_type: ChangeType
+    path: str
+    is_directory: bool
+    root: str
+
+
+def is_network_path(path: str) -> bool:
+    """
+    Checks whether a path is on a network filesystem by looking up its mount in the mount table. Only Linux has a mount
+    table to read, on the other platforms this returns False.
+    :param str path: path to check
+    :return: True if the path is on a network filesystem
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        with open('/proc/self/mounts') as mounts_file:
+            mounts = [line.split()[1:3] for line in mounts_file]
+    except OSError:
+        return False
+
+    real_path = os.path.realpath(path)
+    mount_point_length, filesystem = -1, ''
+    for mount_point, mount_filesystem in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if real_path == mount_point or real_path.startswith(mount_point.rstrip('/') + '/'):
+            if len(mount_point) > mount_point_length:
+                mount_point_length, filesystem = len(mount_point), mount_filesystem
+    return filesystem in NETWORK_FILESYSTEMS
+
+
+class _PolledTree:
+    """
+    Directory tree watched by polling. Keeps the mtime and entries of every directory in the tree.
+    """
+    def __init__(self, root: str, prune: Optional[walker.Prune] = None):
+        self.root = root
+        self.prune = prune
+        # Directory path to its mtime and its entries, entry name to whether it is a directory. The mtime is None if
+        # it was too recent to be trusted, the directory is then listed again on the next poll.
+        self.directories: Dict[str, Tuple[Optional[int], Dict[str, bool]]] = {}
+
+    def list(self) -> List[Change]:
+        """
+        Lists the whole tree.
+        :return: LISTED changes of the root and every entry in the tree
+        """
+        self.directories = {}
+        changes = [Change(ChangeType.LISTED, self.root, True, self.root)]
+        self._add_tree(self.root, ChangeType.LISTED, changes)
+        return changes
+
+    def poll(self) -> List[Change]:
+        """
+        Stats every directory of the tree and lists the ones that changed.
+        :return: changes since the last poll
+        """
+        changes = []
+        for directory_path in list(self.directories):
+            snapshot = self.directories.get(directory_path)
+            if snapshot is None:
+                # Dropped with a parent that was deleted earlier in this poll
+                continue
+            try:
+                mtime_ns = os.stat(directory_path).st_mtime_ns
+            except OSError:
+                # Deleted directories are reported by the listing of their parent, only the root has to be done here
+                if directory_path == self.root:
+                    self._drop_tree(self.root)
+                    changes.append(Change(ChangeType.DELETED, self.root, True, self.root))
+                continue
+            if mtime_ns != snapshot[0]:
+                self._relist(directory_path, changes)
+        if self.root not in self.directories and os.path.isdir(self.root):
+            changes.append(Change(ChangeType.CREATED, self.root, True, self.root))
+            self._add_tree(self.root, ChangeType.CREATED, changes)
+        return changes
+
+    def close(self) -> None:
+        self.directories = {}
+
+    def _list_directory(self, directory_path: str) -> Dict[str, bool]:
+        """
+        Lists a directory and stores its mtime and entries.
+        """
+        listed_at = time.time()
+        # Stat before listing, anything changing during the listing then changes the mtime after the stored one
+        mtime_ns = os.stat(directory_path).st_mtime_ns
+        entries = {}
+        with os.scandir(directory_path) as scandir_entries:
+            for entry in scandir_entries:
+                if self.prune is not None and self.prune(entry):
+                    continue
+                # Links to directories aren't walked into, the same as inotify reports them
+                try:
+                    entries[entry.name] = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    entries[entry.name] = False
+        if listed_at - mtime_ns / 1e9 < scan_cache.RACY_WINDOW:
+            self.directories[directory_path] = (None, entries)
+        else:
+            self.directories[directory_path] = (mtime_ns, entries)
+        return entries
+
+    def _add_tree(self, directory_path: str, change_type: ChangeType, changes: List[Change]) -> None:
+        """
+        Lists a directory and all its subdirectories, adding a change of the given type for each of their entries.
+        """
+        stack = [directory_path]
+        while stack:
+            current_path = stack.pop()
+            try:
+                entries = self._list_directory(current_path)
+            except OSError:
+                continue
+            for name, is_directory in entries.items():
+                entry_path = os.path.join(current_path, name)
+                changes.append(Change(change_type, entry_path, is_directory, self.root))
+                if is_directory:
+                    stack.append(entry_path)
+
+    def _relist(self, directory_path: str, changes: List[Change]) -> None:
+        """
+        Lists a directory again and adds the entries that were added or removed since the last listing.
+        """
+        old_entries = self.directories[directory_path][1]
+        try:
+            new_entries = self._list_directory(directory_path)
+        except OSError:
+            return
+        for name, was_directory in old_entries.items():
+            if new_entries.get(name) != was_directory:
+                entry_path = os.path.join(directory_path, name)
+                if was_directory:
+                    self._drop_tree(entry_path)
+                changes.append(Change(ChangeType.DELETED, entry_path, was_directory, self.root))
+        for name, is_directory in new_entries.items():
+            if old_entries.get(name) != is_directory:
+                entry_path = os.path.join(directory_path, name)
+                changes.append(Change(ChangeType.CREATED, entry_path, is_directory, self.root))
+                if is_directory:
+                    self._add_tree(entry_path, ChangeType.CREATED, changes)
+
+    def _drop_tree(self, directory_path: str) -> None:
+        """
+        Forgets a directory and all its subdirectories.
+        """
+        prefix = os.path.join(directory_path, '')
+        for path in [path for path in self.directories if path == directory_path or path.startswith(prefix)]:
+            del self.directories[path]
+
+
+class _Inotify:
+    """
+    inotify instance shared by the inotify trees of a watcher, so a watcher uses a single file descriptor however many
+    trees it watches. Events are handed to the trees watching the directory they are about. Trees watching the same
+    directory, e.g. nested roots, share its watch, which is only removed once none of them uses it anymore.
+    """
+    def __init__(self):
+        self.fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        # poll() rather than select(), which can't wait on file descriptors past FD_SETSIZE
+        self._poller = select.poll()
+        self._poller.register(self.fd, select.POLLIN)
+        self.trees: Dict[int, Set['_InotifyTree']] = {}
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits for events.
+        :param timeout: seconds to wait at most
+        :return: True if there are events to read
+        """
+        return bool(self._poller.poll(timeout * 1000))
+
+    def add_watch(self, tree: '_InotifyTree', directory_path: str) -> int:
+        """
+        Watches a directory for a tree.
+        :return: watch descriptor of the directory
+        :raises OSError: if the directory can't be watched
+        """
+        watch_descriptor = _libc.inotify_add_watch(self.fd, os.fsencode(directory_path), INOTIFY_MASK)
+        if watch_descriptor < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), directory_path)
+        self.trees.setdefault(watch_descriptor, set()).add(tree)
+        return watch_descriptor
+
+    def remove_watch(self, tree: '_InotifyTree', watch_descriptor: int) -> None:
+        """
+        Stops watching a directory for a tree. The watch is removed once no tree watches the directory.
+        """
+        trees = self.trees.get(watch_descriptor)
+        if trees is None:
+            return
+        trees.discard(tree)
+        if not trees:
+            del self.trees[watch_descriptor]
+            # Fails harmlessly if the kernel already removed the watch of a deleted directory
+            _libc.inotify_rm_watch(self.fd, watch_descriptor)
+
+    def read(self) -> Tuple[Dict['_InotifyTree', List[Tuple[int, int, str]]], bool]:
+        """
+        Reads the pending events.
+        :return: watch descriptor, mask and name of the events of each tree, and whether the event queue overflowed
+        """
+        events: Dict[_InotifyTree, List[Tuple[int, int, str]]] = {}
+        overflowed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                watch_descriptor, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+                name_start = offset + _EVENT_HEADER.size
+                name = os.fsdecode(data[name_start:name_start + name_length].rstrip(b'\0'))
+                offset = name_start + name_length
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                    continue
+                for tree in self.trees.get(watch_descriptor, ()):
+                    events.setdefault(tree, []).append((watch_descriptor, mask, name))
+                if mask & IN_IGNORED:
+                    # The kernel removed the watch, the directory was deleted
+                    self.trees.pop(watch_descriptor, None)
+        return events, overflowed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _InotifyTree:
+    """
+    Directory tree watched with inotify. Every directory of the tree has its own watch, directories created in the tree
+    are watched as soon as they are reported.
+    """
+    def __init__(self, root: str, inotify: _Inotify, prune: Optional[walker.Prune] = None):
+        self.root = root
+        self.inotify = inotify
+        self.prune = prune
+        self.watch_paths: Dict[int, str] = {}
+        self.watch_descriptors: Dict[str, int] = {}
+
+    def list(self) -> List[Change]:
+        """
+        Watches and lists the whole tree.
+        :return: LISTED changes of the root and every entry in the tree
+        :raises OSError: if the tree can't be watched, e.g. because the inotify watch limit was reached
+        """
+        self.close()
+        if not os.path.isdir(self.root):
+            raise OSError(errno.ENOENT, "Watched directory does not exist", self.root)
+        changes = [Change(ChangeType.LISTED, self.root, True, self.root)]
+        self._add_tree(self.root, ChangeType.LISTED, changes)
+        return changes
+
+    def handle_events(self, events: List[Tuple[int, int, str]]) -> List[Change]:
+        """
+        Turns the events read for the tree into changes.
+        :param events: watch descriptor, mask and name of each event, see _Inotify.read()
+        :return: changes since the last events
+        :raises OSError: if a new directory can't be watched
+        """
+        changes = []
+        for watch_descriptor, mask, name in events:
+            self._handle_event(watch_descriptor, mask, name, changes)
+        return changes
+
+    def close(self) -> None:
+        """
+        Stops watching the whole tree.
+        """
+        for watch_descriptor in list(self.watch_paths):
+            self.inotify.remove_watch(self, watch_descriptor)
+        self.watch_paths = {}
+        self.watch_descriptors = {}
+
+    def _handle_event(self, watch_descriptor: int, mask: int, name: str, changes: List[Change]) -> None:
+        """
+        Turns an inotify event into changes.
+        """
+        if mask & IN_IGNORED:
+            directory_path = self.watch_paths.pop(watch_descriptor, None)
+            if directory_path is not None and self.watch_descriptors.get(directory_path) == watch_descriptor:
+                del self.watch_descriptors[directory_path]
+            return
+
+        directory_path = self.watch_paths.get(watch_descriptor)
+        if directory_path is None:
+            return
+        if not name:
+            # Events about a watched directory itself. Subdirectories are reported by their parent, only the root has
+            # to be done here.
+            if directory_path == self.root and mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                self._drop_tree(self.root)
+                changes.append(Change(ChangeType.DELETED, self.root, True, self.root))
+            return
+
+        path = os.path.join(directory_path, name)
+        is_directory = bool(mask & IN_ISDIR)
+        if self.prune is not None and self.prune(scan_cache.CachedEntry(name, path, is_directory)):
+            return
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            if is_directory:
+                self._drop_tree(path)
+            changes.append(Change(ChangeType.DELETED, path, is_directory, self.root))
+        elif is_directory and mask & (IN_CREATE | IN_MOVED_TO):
+            changes.append(Change(ChangeType.CREATED, path, True, self.root))
+            self._add_tree(path, ChangeType.CREATED, changes)
+        elif not is_directory and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            changes.append(Change(ChangeType.CREATED, path, False, self.root))
+
+    def _add_watch(self, directory_path: str) -> bool:
+        """
+        Watches a single directory.
+        :return: False if the directory is gone or can't be read
+        :raises OSError: if the directory can't be watched for any other reason
+        """
+        try:
+            watch_descriptor = self.inotify.add_watch(self, directory_path)
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return False
+            raise
+        self.watch_paths[watch_descriptor] = directory_path
+        self.watch_descriptors[directory_path] = watch_descriptor
+        return True
+
+    def _add_tree(self, directory_path: str, change_type: ChangeType, changes: List[Change]) -> None:
+        """
+        Watches and lists a directory and all its subdirectories, adding a change of the given type for each of their
+        entries. Directories are watched before they are listed so nothing created in between is missed.
+        """
+        stack = [directory_path]
+        while stack:
+            current_path = stack.pop()
+            if not self._add_watch(current_path):
+                continue
+            try:
+                with os.scandir(current_path) as scandir_entries:
+                    entries = list(scandir_entries)
+            except OSError:
+                continue
+            for entry in entries:
+                if self.prune is not None and self.prune(entry):
+                    continue
+                # Links to directories aren't watched, a link loop would add watches until the limit is reached
+                try:
+                    is_directory = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_directory = False
+                changes.append(Change(change_type, entry.path, is_directory, self.root))
+                if is_directory:
+                    stack.append(entry.path)
+
+    def _drop_tree(self, directory_path: str) -> None:
+        """
+        Stops watching a directory and all its subdirectories.
+        """
+        prefix = os.path.join(directory_path, '')
+        for path in [path for path in self.watch_descriptors if path == directory_path or path.startswith(prefix)]:
+            watch_descriptor = self.watch_descriptors.pop(path)
+            self.watch_paths.pop(watch_descriptor, None)
+            self.inotify.remove_watch(self, watch_descriptor)
+
+
+class _WatchedFile:
+    """
+    File watched by polling its size and mtime.
+    """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.signature = self._get_signature()
+
+    def poll(self) -> List[Change]:
+        signature = self._get_signature()
+        if signature == self.signature:
+            return []
+        self.signature = signature
+        return [Change(ChangeType.MODIFIED, self.file_path, False, self.file_path)]
+
+    def _get_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            file_stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+
+class DirectoryWatcher:
+    """
+    Watches directory trees and files and calls back with batches of changes. The callback is called on the watcher
+    thread, started with start(). Trees are listed on the watcher thread too, so watch() returns right away.
+    """
+    def __init__(self, callback: Callable[[List[Change]], None],
+                 poll_interval: float = constants.WATCH_POLL_INTERVAL):
+        """
+        :param callback: function taking a list of changes
+        :param float poll_interval: seconds between two polls of the polled trees and the watched files
+        """
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Watches asked for, changed from any thread. The watcher thread starts and stops the trees and files to match.
+        self._roots: Dict[str, Tuple[Optional[walker.Prune], Optional[bool]]] = {}
+        self._file_paths: Set[str] = set()
+        self._trees: Dict[str, Union[_InotifyTree, _PolledTree]] = {}
+        self._files: Dict[str, _WatchedFile] = {}
+        # Shared by all the inotify trees, opened with the first one
+        self._inotify: Optional[_Inotify] = None
+
+    def __repr__(self) -> str:
+        return f"DirectoryWatcher({len(self._roots)} trees, {len(self._file_paths)} files)"
+
+    def __enter__(self) -> 'DirectoryWatcher':
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def watch(self, root: str, prune: Optional[walker.Prune] = None, polling: Optional[bool] = None) -> bool:
+        """
+        Starts watching a directory tree. The whole tree is reported as LISTED changes once it is being watched. A root
+        that doesn't exist yet is reported as CREATED once it is created, when it is polled.
+        :param str root: directory to watch
+        :param prune: function taking an entry and returning True to ignore it, see walker.prune_names()
+        :param polling: True to poll the tree, False to use inotify, or None to poll only if inotify can't be used
+        :return: True if successful
+        """
+        root = root.rstrip('/\\') or root
+        with self._lock:
+            self._roots[root] = (prune, polling)
+        return True
+
+    def unwatch(self, root: str) -> bool:
+        """
+        Stops watching a directory tree.
+        :param str root: directory given to watch()
+        :return: True if the tree was being watched
+        """
+        root = root.rstrip('/\\') or root
+        with self._lock:
+            return self._roots.pop(root, None) is not None
+
+    def watch_file(self, file_path: str) -> bool:
+        """
+        Starts watching a file. Changes to its size or mtime are reported as MODIFIED changes.
+        :param str file_path: file to watch
+        :return: True if successful
+        """
+        with self._lock:
+            self._file_paths.add(file_path)
+        return True
+
+    def unwatch_file(self, file_path: str) -> bool:
+        """
+        Stops watching a file.
+        :param str file_path: file given to watch_file()
+        :return: True if the file was being watched
+        """
+        with self._lock:
+            if file_path not in self._file_paths:
+                return False
+            self._file_paths.remove(file_path)
+            return True
+
+    def start(self) -> bool:
+        """
+        Starts the watcher thread.
+        :return: True if successful
+        """
+        if self.is_running():
+            return True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='hpipe_watcher', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> bool:
+        """
+        Stops the watcher thread and closes the watches.
+        :return: True if successful
+        """
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        for tree in self._trees.values():
+            tree.close()
+        self._trees = {}
+        self._files = {}
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        return True
+
+    def is_running(self) -> bool:
+        """
+        Checks whether the watcher thread is running.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll(self) -> List[Change]:
+        """
+        Checks all watches for changes right away, for using the watcher without its thread. Does not call the callback.
+        :return: changes since the last check
+        """
+        if self.is_running():
+            log.warning("Can't poll a watcher that is running, its changes are handed to the callback.")
+            return []
+        changes = self._update_watches()
+        changes += self._read_inotify()
+        changes += self._poll_all()
+        return changes
+
+    def _run(self) -> None:
+        """
+        Watcher thread. Waits for inotify events or the next poll and hands the changes to the callback in batches.
+        """
+        pending: List[Change] = []
+        first_change_time = last_change_time = 0.0
+        next_poll_time = time.monotonic() + self.poll_interval
+        while not self._stop.is_set():
+            changes = self._update_watches()
+
+            timeout = min(max(0.0, next_poll_time - time.monotonic()), WAKE_INTERVAL)
+            if self._inotify is not None:
+                if self._inotify.wait(timeout):
+                    changes += self._read_inotify()
+            else:
+                self._stop.wait(timeout)
+
+            if time.monotonic() >= next_poll_time:
+                changes += self._poll_all()
+                next_poll_time = time.monotonic() + self.poll_interval
+
+            now = time.monotonic()
+            if changes:
+                if not pending:
+                    first_change_time = now
+                pending += changes
+                last_change_time = now
+            if pending and (now - last_change_time >= SETTLE_TIME or now - first_change_time >= MAX_LATENCY):
+                batch, pending = pending, []
+                try:
+                    self.callback(batch)
+                except Exception as e:
+                    log.error(f"Watcher callback {self.callback} failed: {e}")
+
+    def _update_watches(self) -> List[Change]:
+        """
+        Starts and stops trees and files to match the watches asked for.
+        :return: listings of the trees that were started
+        """
+        with self._lock:
+            roots = dict(self._roots)
+            file_paths = set(self._file_paths)
+
+        for root in [root for root in self._trees if root not in roots]:
+            self._trees.pop(root).close()
+        for file_path in [file_path for file_path in self._files if file_path not in file_paths]:
+            del self._files[file_path]
+        for file_path in file_paths:
+            if file_path not in self._files:
+                self._files[file_path] = _WatchedFile(file_path)
+
+        changes = []
+        for root, (prune, polling) in roots.items():
+            if root not in self._trees:
+                changes += self._start_tree(root, prune, polling)
+        return changes
+
+    def _start_tree(self, root: str, prune: Optional[walker.Prune], polling: Optional[bool]) -> List[Change]:
+        """
+        Starts watching a tree with inotify if it can, polling it otherwise.
+        :return: listing of the tree
+        """
+        if polling is None:
+            polling = not INOTIFY_AVAILABLE or is_network_path(root)
+        if not polling:
+            tree = None
+            try:
+                if self._inotify is None:
+                    self._inotify = _Inotify()
+                tree = _InotifyTree(root, self._inotify, prune)
+                changes = tree.list()
+                self._trees[root] = tree
+                return changes
+            except OSError as e:
+                if tree is not None:
+                    tree.close()
+                if os.path.isdir(root):
+                    log.warning(f"Could not watch {root} with inotify, polling it instead: {e}")
+
+        tree = _PolledTree(root, prune)
+        self._trees[root] = tree
+        return tree.list()
+
+    def _read_inotify(self) -> List[Change]:
+        """
+        Reads the inotify events of the inotify trees. A tree that can't watch a new directory is polled from then on.
+        """
+        if self._inotify is None:
+            return []
+        events, overflowed = self._inotify.read()
+        changes = []
+        for tree in [tree for tree in self._trees.values() if isinstance(tree, _InotifyTree)]:
+            try:
+                if overflowed:
+                    log.warning(f"Lost track of changes in {tree.root}, listing it again.")
+                    changes += tree.list()
+                elif tree in events:
+                    changes += tree.handle_events(events[tree])
+                else:
+                    continue
+                if not tree.watch_paths:
+                    # The root was deleted, polling notices when it is created again
+                    tree.close()
+                    self._trees[tree.root] = _PolledTree(tree.root, tree.prune)
+            except OSError as e:
+                log.warning(f"Could not keep watching {tree.root} with inotify, polling it instead: {e}")
+                tree.close()
+                polled_tree = _PolledTree(tree.root, tree.prune)
+                self._trees[tree.root] = polled_tree
+                changes += polled_tree.list()
+        return changes
+
+    def _poll_all(self) -> List[Change]:
+        """
+        Polls the polled trees and the watched files.
+        """
+        changes = []
+        for tree in self._trees.values():
+            if isinstance(tree, _PolledTree):
+                changes += tree.poll()
+        for watched_file in self._files.values():
+            changes += watched_file.poll()
+        return changes
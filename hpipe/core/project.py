@@ -7,8 +7,8 @@ import datetime
 import os
 from typing import *
 
-from hpipe.core import shot
-from hpipe.core.hutils import logger, manager_utils
+from hpipe.core import constants, shot
+from hpipe.core.hutils import logger
 import sys
 from hpipe.core.config_manager import ConfigDataManager
 
@@ -31,6 +31,7 @@ class Project:
     """
     Class representing a Project in the Project Database
     """
+    __slots__ = ('name', 'description', 'config', 'year', 'date', '_shots', 'user_data')
 
     def __init__(self, project_name: str, date_created: str = '', description: str = '',
                  member_shots: Union[Dict[str, Any], None] = None, user_data: Union[Dict[Any, Any], None] = None):
@@ -40,12 +41,12 @@ class Project:
         :param str project_name: Name of the project
         :param str date_created: Date the project was created
         :param str description: Description of the project
-        :param list member_shots: List of shots in the project
+        :param dict member_shots: Dictionary of shot names to shot dictionaries as stored in the database
         :param dict user_data: User data for the project if any. This can be used to store custom data per shot
         """
         self.name = project_name
         self.description = description
-        self.config = ConfigDataManager()
+        self.config = ConfigDataManager.shared()
 
         if not date_created:
             date_created = str(datetime.date.today())
@@ -56,19 +57,35 @@ class Project:
         if not member_shots:
             member_shots = {}
 
-        self.shots = manager_utils.shots_from_dict(member_shots, self)
+        # Shots keyed by name, in the order they were added. Shots from the database are kept as their raw shot
+        # dictionaries until they are first accessed, so building a project doesn't build every shot.
+        self._shots: Dict[str, Union[shot.Shot, 'shot.ShotDict']] = dict(member_shots)
         self.user_data = user_data
 
     def __repr__(self):
         return f"Project <{self.name.upper()}> {self.description}, created on {self.date}, " \
-               f"with {len(self.shots)} shots."
+               f"with {len(self._shots)} shots."
+
+    @property
+    def shots(self) -> List[shot.Shot]:
+        """
+        List of shots in the project. Use add_shot, update_shot and remove_shot to change them.
+        """
+        return self.get_shots()
 
     def get_shots(self) -> List[shot.Shot]:
         """
-        Returns the list of shots in the project.
+        Returns the list of shots in the project. Builds every shot, use get_shot_names if only the names are needed.
         :return: list of shots if they exist
         """
-        return self.shots
+        return [self._materialize_shot(shot_name) for shot_name in self._shots]
+
+    def get_shot_names(self) -> List[str]:
+        """
+        Returns the names of the shots in the project without building any shots.
+        :return: list of shot names
+        """
+        return list(self._shots)
 
     def get_shot(self, shot_name: str = '') -> Optional[shot.Shot]:
         """
@@ -76,11 +93,35 @@ class Project:
         :param str shot_name: Name of the shot
         :return: Shot object
         """
-        log.debug(f"Getting shot {shot_name} from project {self.name}")
-        shot_list = [s for s in self.shots if s.name == shot_name]
-        if len(shot_list) == 0:
+        if shot_name not in self._shots:
             return None
-        return shot_list[0]
+        return self._materialize_shot(shot_name)
+
+    def _materialize_shot(self, shot_name: str) -> shot.Shot:
+        """
+        Builds a shot object from its raw shot dictionary the first time it is accessed.
+        :param str shot_name: Name of the shot
+        :return: Shot object
+        """
+        shot_instance = self._shots[shot_name]
+        if not isinstance(shot_instance, shot.Shot):
+            shot_instance = shot.Shot.from_dict(shot_instance, self)
+            self._shots[shot_name] = shot_instance
+        return shot_instance
+
+    def get_frame_rate(self) -> float:
+        """
+        Get the frame rate of the project, set as frame_rate in its user data, for review videos and DCC scenes
+        :return: frame rate, constants.FRAME_RATE if the project doesn't set one
+        """
+        if not self.user_data or not self.user_data.get('frame_rate'):
+            return constants.FRAME_RATE
+        try:
+            return float(self.user_data['frame_rate'])
+        except (TypeError, ValueError):
+            log.warning(f"Invalid frame rate {self.user_data['frame_rate']} for {self.name}, "
+                        f"using {constants.FRAME_RATE}")
+            return constants.FRAME_RATE
 
     def get_project_path(self) -> str:
         """
@@ -163,7 +204,7 @@ class Project:
 
         new_shot = shot.Shot(shot_name, project_instance=self, frame_start=frame_start, frame_end=frame_end,
                              user_data=user_data, tags=tags)
-        self.shots.append(new_shot)
+        self._shots[new_shot.name] = new_shot
         return new_shot
 
     def add_shot(self, shot_instance: shot.Shot) -> bool:
@@ -172,11 +213,11 @@ class Project:
         :param shot.Shot shot_instance: shot instance to be added to the project
         :returns: True if successful.
         """
-        if shot_instance.name in [s.name for s in self.get_shots()]:
+        if shot_instance.name in self._shots:
             log.warning(f"Shot {shot_instance.name} already exists in project {self.name}")
             return False
 
-        self.shots.append(shot_instance)
+        self._shots[shot_instance.name] = shot_instance
         return True
 
     def remove_shot(self, shot_name: str) -> bool:
@@ -185,50 +226,42 @@ class Project:
         :param shot_name: shot name to be removed.
         :returns: True if successful.
         """
-        if not self.get_shot(shot_name):
+        if shot_name not in self._shots:
             log.warning('Shot to remove does not exist.')
             return False
 
-        shot_amount = len(self.shots)
-
-        new_shot_list = []
-        for shot_instance in self.shots:
-            if shot_instance.name == shot_name:
-                continue
-            new_shot_list.append(shot_instance)
-        self.shots = new_shot_list
-
-        if len(self.shots) != shot_amount-1:
-            raise Exception
-
+        del self._shots[shot_name]
         return True
 
     def update_shot(self, shot_to_update: shot.Shot) -> bool:
         """
-        Updates a project in the database given a project instance. This is the primary method for updating a project.
-        :param project.Project shot_to_update: project instance to be updated in the database
+        Replaces a shot in the project with the given shot instance of the same name. The shot keeps its position.
+        :param shot.Shot shot_to_update: shot instance to replace the existing shot with
         :returns: True if successful.
         """
         shot_name = shot_to_update.name
 
-        if shot_name not in [s.name for s in self.get_shots()]:
-            log.warning(f"Project {shot_name} not found in database in project {self.name}")
+        if shot_name not in self._shots:
+            log.warning(f"Shot {shot_name} not found in project {self.name}")
             return False
 
-        self.remove_shot(shot_name)
-        self.shots.append(shot_to_update)
+        self._shots[shot_name] = shot_to_update
 
         return True
 
     def export_shots(self) -> dict:
         """
-        Export the shots in the project to a dictionary for storage in the database.
+        Export the shots in the project to a dictionary for storage in the database. Shots that were never accessed are
+        passed through as the shot dictionaries they were loaded from.
         :return: dict of shots
         """
 
         shot_dictionary = {}
-        for shot_instance in self.get_shots():
-            shot_dictionary[shot_instance.name] = shot_instance.to_dict()
+        for shot_name, shot_instance in self._shots.items():
+            if isinstance(shot_instance, shot.Shot):
+                shot_dictionary[shot_name] = shot_instance.to_dict()
+            else:
+                shot_dictionary[shot_name] = shot_instance
         return shot_dictionary
 
     @classmethod
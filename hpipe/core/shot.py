@@ -34,7 +34,9 @@ class ShotDict(TypedDict):
 class Shot:
     """
     Base class for a shot in database. This class is meant to be used with the project class and not on its own.
+    Uses __slots__ since a project can hold thousands of shots, the base path is only looked up when it is first used.
     """
+    __slots__ = ('name', 'project', 'frame_start', 'frame_end', 'tags', 'user_data', '_base_path')
 
     def __init__(self, shot_name: str, project_instance: 'project.Project', frame_start: int = constants.FRAME_START,
                  frame_end: int = constants.FRAME_END, tags: Union[List[str], None] = None,
@@ -62,12 +64,21 @@ class Shot:
         self.frame_end = frame_end
         self.tags = tags
         self.user_data = user_data
-        self.base_path = self.get_base_path()
+        self._base_path: Optional[str] = None
 
     def __repr__(self):
         return f"Shot <{self.name.upper()}> from project <{self.project.name.upper()}>, " \
                f"frames {self.frame_start} to {self.frame_end}"
 
+    @property
+    def base_path(self) -> str:
+        """
+        Base path of the shot, see get_base_path. Looked up the first time it is used.
+        """
+        if self._base_path is None:
+            self._base_path = self.get_base_path()
+        return self._base_path
+
     def get_base_path(self) -> str:
         """
         Returns the base path of the shot. This is the path of the project + shots folder.
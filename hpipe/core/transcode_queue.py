@@ -0,0 +1,526 @@
+"""
+Local queue for transcoding image sequences to review videos. Generating dailies for a show means hundreds of ffmpeg
+runs, the queue runs TRANSCODE_MAX_JOBS of them at once on this machine and keeps the state of every job in a SQLite
+journal in the user cache directory. Jobs that were queued or running when the process stopped are picked up again the
+next time the queue starts. Every queue holds a lock file while it runs and records itself as the owner of its jobs, so
+a queue only picks up the jobs of queues that aren't running anymore, never the ones of another app still running them.
+
+    queue = transcode_queue.TranscodeQueue.shared()
+    queue.add_listener(on_job_changed)
+    for image_sequence in reviewable.get_reviewable_image_sequences():
+        queue.submit(image_sequence, frame_rate=project.get_frame_rate())
+
+A video is up to date, and its job skipped, if it is newer than every frame of its sequence and was encoded from the
+same frames. Videos the queue didn't encode, e.g. with GenericImageSequence.to_mp4, only have to be newer. Videos are
+written next to their final path and renamed once complete, so a crash never leaves a partial video behind that looks
+finished.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from typing import *
+
+from hpipe.assets import imageSequence, review_encode
+from hpipe.core import constants
+from hpipe.core.hutils import logger, scan_cache, system
+from hpipe.core.hutils.filelock import FileLock
+
+log = logger.setup_logger()
+log.debug("transcode_queue.py loaded")
+
+# Seconds between two progress updates of a running job sent to the listeners
+PROGRESS_INTERVAL = 0.5
+# Finished jobs are kept in the journal for this many days
+JOURNAL_KEEP_DAYS = 7
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    output_path TEXT PRIMARY KEY,
+    frames TEXT NOT NULL,
+    source_mtime_ns INTEGER NOT NULL
+);
+'''
+
+
+class JobState(Enum):
+    """
+    State of a transcode job.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+
+FINISHED_STATES = (JobState.DONE, JobState.SKIPPED, JobState.FAILED, JobState.CANCELLED)
+
+
+class TranscodeJob(NamedTuple):
+    """
+    A sequence to transcode. The sequence is stored as its group, so the job can be rebuilt from the journal.
+    """
+    job_id: str
+    group: list
+    asset_name: str
+    output_path: str
+    frame_rate: float
+    state: JobState = JobState.QUEUED
+    frames_done: int = 0
+    frame_count: int = 0
+    error: str = ''
+    submitted: float = 0.0
+    finished: float = 0.0
+    # Queue running the job, see TranscodeQueue.owner, and whether to transcode it even if the video is up to date
+    owner: str = ''
+    force: bool = False
+
+    def get_progress(self) -> float:
+        """
+        Returns the fraction of the frames of the job that are encoded.
+        """
+        if self.state in (JobState.DONE, JobState.SKIPPED):
+            return 1.0
+        return self.frames_done / self.frame_count if self.frame_count else 0.0
+
+    def is_finished(self) -> bool:
+        """
+        Checks whether the job is done, skipped, failed or cancelled.
+        """
+        return self.state in FINISHED_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Converts the job to a json serializable dictionary.
+        """
+        job_dictionary = self._asdict()
+        job_dictionary['state'] = self.state.value
+        return job_dictionary
+
+    @classmethod
+    def from_dict(cls, job_dictionary: Dict[str, Any]) -> 'TranscodeJob':
+        """
+        Converts a dictionary made by to_dict back to a job.
+        """
+        return cls(**{**job_dictionary, 'state': JobState(job_dictionary['state'])})
+
+
+class QueueProgress(NamedTuple):
+    """
+    Progress of the jobs submitted since the queue started, and of the jobs resumed from the journal.
+    """
+    jobs_done: int
+    job_count: int
+    frames_done: int
+    frame_count: int
+
+
+class TranscodeQueue:
+    """
+    Queue of transcode jobs run on a pool of TRANSCODE_MAX_JOBS threads, each running one ffmpeg at a time. Listeners
+    are called with the job every time its state changes, and every PROGRESS_INTERVAL seconds while it runs.
+    """
+    _shared: Optional['TranscodeQueue'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, journal_path: str = '', max_jobs: int = constants.TRANSCODE_MAX_JOBS):
+        """
+        :param str journal_path: path of the SQLite journal, defaults to transcode_queue.sqlite in the user cache
+            directory
+        :param int max_jobs: number of jobs run at once
+        """
+        self.journal_path = journal_path or os.path.join(scan_cache.get_cache_directory(), 'transcode_queue.sqlite')
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        self.max_jobs = max(1, max_jobs)
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[TranscodeJob], None]] = []
+        self._jobs: Dict[str, TranscodeJob] = {}
+        self._futures: Dict[str, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Id of this queue in the journal. Its lock file is held while it runs, so other queues know its jobs are taken.
+        self.owner = uuid.uuid4().hex
+        self._owner_lock: Optional[FileLock] = None
+
+    def __repr__(self) -> str:
+        progress = self.get_progress()
+        return f"TranscodeQueue({progress.jobs_done}/{progress.job_count} jobs done, {self.max_jobs} at once)"
+
+    @classmethod
+    def shared(cls) -> 'TranscodeQueue':
+        """
+        Returns the process-wide transcode queue. It is started the first time, resuming the jobs left in the journal.
+        :return: shared TranscodeQueue
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+                cls._shared.start()
+            return cls._shared
+
+    def start(self) -> bool:
+        """
+        Starts running jobs. Jobs that were queued or running when their queue stopped are queued again, the jobs of
+        queues that are still running, e.g. in another app, are left to them.
+        :return: True if successful
+        """
+        with self._lock:
+            if self._executor is not None:
+                return True
+            self._owner_lock = FileLock(self._get_owner_lock_path(self.owner))
+            self._owner_lock.acquire()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix='hpipe_transcode')
+
+        self._execute('DELETE FROM jobs WHERE state IN (?, ?, ?, ?) AND updated < ?',
+                      tuple(state.value for state in FINISHED_STATES) + (time.time() - JOURNAL_KEEP_DAYS * 86400,))
+        rows = self._execute('SELECT data FROM jobs WHERE state IN (?, ?)',
+                             (JobState.QUEUED.value, JobState.RUNNING.value)).fetchall()
+        jobs = [TranscodeJob.from_dict(json.loads(row[0])) for row in rows]
+        resumed_jobs = sorted((job for job in jobs if job.owner == self.owner or not self._is_owner_running(job.owner)),
+                              key=lambda job: job.submitted)
+        for job in resumed_jobs:
+            self._queue(job._replace(state=JobState.QUEUED, frames_done=0, owner=self.owner))
+        if resumed_jobs:
+            log.info(f"Resumed {len(resumed_jobs)} transcode jobs from {self.journal_path}")
+        return True
+
+    def stop(self, wait: bool = True) -> bool:
+        """
+        Stops running jobs. Queued jobs stay in the journal and are resumed by the next start().
+        :param bool wait: whether to wait for the running jobs to finish
+        :return: True if successful
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures, self._futures = self._futures, {}
+        if executor is None:
+            return True
+        for future in futures.values():
+            future.cancel()
+        executor.shutdown(wait=wait)
+        with self._lock:
+            owner_lock, self._owner_lock = self._owner_lock, None
+        if owner_lock is not None:
+            owner_lock.release()
+            _remove_lock_file(owner_lock.lock_path)
+        return True
+
+    def is_running(self) -> bool:
+        """
+        Checks whether the queue is running jobs.
+        """
+        return self._executor is not None
+
+    def add_listener(self, listener: Callable[[TranscodeJob], None]) -> None:
+        """
+        Registers a function to be called when a job changes.
+        :param listener: function taking the job, called on the thread of the job
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[TranscodeJob], None]) -> None:
+        """
+        Unregisters a function added with add_listener().
+        :param listener: function to remove
+        """
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def submit(self, image_sequence: 'imageSequence.GenericImageSequence', output_path: str = '',
+               frame_rate: float = constants.FRAME_RATE, force: bool = False) -> TranscodeJob:
+        """
+        Queues an image sequence to be transcoded. If a job for the same video is already queued or running, that job
+        is returned instead.
+        :param image_sequence: image sequence to transcode
+        :param str output_path: path of the video, defaults to the path used by GenericImageSequence.to_mp4
+        :param frame_rate: frame rate of the video, see Project.get_frame_rate
+        :param bool force: whether to transcode even if the video is up to date
+        :return: the job
+        """
+        output_path = output_path or image_sequence.get_mp4_path().filepath_path
+        with self._lock:
+            for job in self._jobs.values():
+                if job.output_path == output_path and not job.is_finished():
+                    return job
+        if force:
+            self._execute('DELETE FROM outputs WHERE output_path = ?', (output_path,))
+
+        job = TranscodeJob(uuid.uuid4().hex, image_sequence.get_group().to_list(), image_sequence.asset_name,
+                           output_path, frame_rate, frame_count=len(image_sequence.frames), submitted=time.time(),
+                           owner=self.owner, force=force)
+        self._queue(job)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a queued job. Running jobs can't be cancelled, their ffmpeg finishes.
+        :param str job_id: id of the job
+        :return: True if the job was cancelled, False if it isn't queued
+        """
+        with self._lock:
+            future = self._futures.get(job_id)
+            job = self._jobs.get(job_id)
+        if future is None or job is None or not future.cancel():
+            return False
+        self._update(job._replace(state=JobState.CANCELLED, finished=time.time()))
+        return True
+
+    def get_job(self, job_id: str) -> Optional[TranscodeJob]:
+        """
+        Returns a job submitted to or resumed by this queue.
+        :param str job_id: id of the job
+        :return: the job, or None if it doesn't exist
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_jobs(self, states: Optional[Iterable[JobState]] = None) -> List[TranscodeJob]:
+        """
+        Returns the jobs submitted to or resumed by this queue.
+        :param states: states of the jobs to return, all if None
+        :return: jobs in the order they were submitted
+        """
+        states = None if states is None else set(states)
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in jobs if states is None or job.state in states]
+
+    def get_progress(self) -> QueueProgress:
+        """
+        Returns the progress of the jobs of this queue.
+        """
+        jobs = self.get_jobs()
+        return QueueProgress(sum(job.is_finished() for job in jobs), len(jobs),
+                             sum(job.frame_count if job.state in (JobState.DONE, JobState.SKIPPED) else job.frames_done
+                                 for job in jobs),
+                             sum(job.frame_count for job in jobs))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits for every queued and running job to finish.
+        :param timeout: seconds to wait at most, None to wait until they finish
+        :return: True if every job finished, False if it timed out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                futures = [future for future in self._futures.values() if not future.done()]
+            if not futures:
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                futures[0].result(timeout=remaining)
+            except Exception:
+                pass
+
+    def is_up_to_date(self, image_sequence: 'imageSequence.GenericImageSequence', output_path: str) -> bool:
+        """
+        Checks whether a video was encoded from the same frames as the image sequence has now, and is newer than all
+        of them. Videos the queue didn't encode are only checked for being newer than the frames.
+        :param image_sequence: image sequence of the video
+        :param str output_path: path of the video
+        :return: True if the video doesn't need to be transcoded again
+        """
+        row = self._execute('SELECT frames, source_mtime_ns FROM outputs WHERE output_path = ?',
+                            (output_path,)).fetchone()
+        if row is not None and row[0] != str(image_sequence.frames):
+            return False
+        try:
+            output_mtime_ns = os.stat(output_path).st_mtime_ns
+            source_mtime_ns = get_source_mtime(image_sequence)
+        except OSError:
+            return False
+        if row is not None and source_mtime_ns != row[1]:
+            return False
+        return output_mtime_ns >= source_mtime_ns
+
+    def _queue(self, job: TranscodeJob) -> None:
+        """
+        Records a job in the journal and submits it to the pool.
+        """
+        with self._lock:
+            executor = self._executor
+        self._update(job)
+        if executor is None:
+            # Stays queued in the journal until the queue is started
+            return
+        future = executor.submit(self._run, job.job_id)
+        with self._lock:
+            self._futures[job.job_id] = future
+
+    def _run(self, job_id: str) -> None:
+        """
+        Runs a job, on the pool.
+        """
+        job = self.get_job(job_id)
+        if job is None or job.state != JobState.QUEUED:
+            return
+        try:
+            image_sequence = imageSequence.sequence_from_group(imageSequence.SequenceGroup.from_list(job.group),
+                                                               job.asset_name)
+        except (ValueError, TypeError) as e:
+            self._update(job._replace(state=JobState.FAILED, error=str(e), finished=time.time()))
+            return
+
+        if not job.force and self.is_up_to_date(image_sequence, job.output_path):
+            log.debug(f"{job.output_path} is up to date, skipping")
+            self._update(job._replace(state=JobState.SKIPPED, finished=time.time()))
+            return
+
+        job = job._replace(state=JobState.RUNNING, frame_count=len(image_sequence.frames))
+        self._update(job)
+        self._execute('DELETE FROM outputs WHERE output_path = ?', (job.output_path,))
+        try:
+            source_mtime_ns = get_source_mtime(image_sequence)
+            success = self._encode(job, image_sequence)
+        except Exception as e:
+            log.error(f"Transcoding {job.output_path} failed: {e}")
+            success = False
+        if not success:
+            self._update(job._replace(state=JobState.FAILED, error="Encoding failed, see the log",
+                                      finished=time.time()))
+            return
+
+        self._execute('INSERT OR REPLACE INTO outputs (output_path, frames, source_mtime_ns) VALUES (?, ?, ?)',
+                      (job.output_path, str(image_sequence.frames), source_mtime_ns))
+        self._update(job._replace(state=JobState.DONE, frames_done=job.frame_count, finished=time.time()))
+
+    def _encode(self, job: TranscodeJob, image_sequence: 'imageSequence.GenericImageSequence') -> bool:
+        """
+        Encodes the video of a job to a temporary path next to it, and moves it in place once it is complete.
+        :return: True if successful
+        """
+        output_root, output_extension = os.path.splitext(job.output_path)
+        partial_path = f"{output_root}.partial{output_extension}"
+        os.makedirs(os.path.dirname(job.output_path) or '.', exist_ok=True)
+        # A partial file left by a crash would make ffmpeg refuse to write over it
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+        last_update = [time.monotonic()]
+
+        def progress(frames_done: int) -> None:
+            if time.monotonic() - last_update[0] >= PROGRESS_INTERVAL:
+                last_update[0] = time.monotonic()
+                self._update(job._replace(frames_done=frames_done), journal=False)
+
+        if image_sequence.get_extension().lower() == 'exr':
+            # The cores are shared between the jobs running at once
+            decode_workers = max(1, (os.cpu_count() or 1) // self.max_jobs)
+            success = review_encode.encode_exr_sequence(image_sequence, partial_path, job.frame_rate,
+                                                        max_workers=decode_workers, progress=progress)
+        else:
+            success = imageSequence.sequence_to_video(image_sequence, system.Filepath(partial_path), job.frame_rate)
+
+        if not success:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return False
+        os.replace(partial_path, job.output_path)
+        return True
+
+    def _update(self, job: TranscodeJob, journal: bool = True) -> None:
+        """
+        Stores the new state of a job, in the journal unless it is only a progress update, and tells the listeners.
+        """
+        with self._lock:
+            self._jobs[job.job_id] = job
+            if job.is_finished():
+                self._futures.pop(job.job_id, None)
+        if journal:
+            self._execute('INSERT OR REPLACE INTO jobs (job_id, state, updated, data) VALUES (?, ?, ?, ?)',
+                          (job.job_id, job.state.value, time.time(), json.dumps(job.to_dict())))
+        self._publish(job)
+
+    def _publish(self, job: TranscodeJob) -> None:
+        """
+        Calls the listeners with a job. A failing listener is logged and does not stop the others from being called.
+        """
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(job)
+            except Exception as e:
+                log.error(f"Transcode listener {listener} failed: {e}")
+
+    def _get_owner_lock_path(self, owner: str) -> str:
+        """
+        Returns the path of the lock file a queue holds while it runs.
+        :param str owner: id of the queue
+        """
+        return f"{os.path.splitext(self.journal_path)[0]}.{owner}.lock"
+
+    def _is_owner_running(self, owner: str) -> bool:
+        """
+        Checks whether the queue that owns jobs in the journal is still running, by trying to take its lock file. The
+        lock file of a queue that is gone is removed.
+        :param str owner: id of the queue
+        :return: True if the queue holds its lock file
+        """
+        if not owner:
+            return False
+        lock_path = self._get_owner_lock_path(owner)
+        if not os.path.exists(lock_path):
+            return False
+        owner_lock = FileLock(lock_path, timeout=0)
+        try:
+            owner_lock.acquire()
+        except TimeoutError:
+            return True
+        owner_lock.release()
+        _remove_lock_file(lock_path)
+        return False
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current thread, opening it on first use.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.journal_path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        return self._connection().execute(sql, parameters)
+
+
+def get_source_mtime(image_sequence: 'imageSequence.GenericImageSequence') -> int:
+    """
+    Returns the mtime of the most recently written frame of an image sequence.
+    :param image_sequence: image sequence
+    :return: mtime in nanoseconds
+    """
+    return max(os.stat(image_sequence.get_frame_path(frame)).st_mtime_ns for frame in image_sequence.frames)
+
+
+def _remove_lock_file(lock_path: str) -> None:
+    """
+    Removes the lock file of a queue that stopped.
+    """
+    try:
+        os.remove(lock_path)
+    except OSError:
+        pass
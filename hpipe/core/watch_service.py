@@ -0,0 +1,380 @@
+"""
+Watch service for the pipe apps. Watches the output folders of shots and the project database, and turns what changes
+on disk into pipe events: a reviewable or sequence was added, the frame range of a sequence was extended, a shot was
+added to the database. The apps update what they show from the events instead of reloading everything.
+
+    service = watch_service.WatchService.shared()
+    service.add_listener(on_watch_events)
+    service.watch_outputs(shot_instance.get_comps_path())
+
+Listeners are called on the watcher thread with a list of events. Qt apps should hand them to the GUI thread with a
+signal. The scan cache doesn't need to be told about changes, it checks the mtimes of the directories it lists.
+"""
+import os
+import threading
+from enum import Enum
+from typing import *
+
+from hpipe.assets import imageSequence
+from hpipe.core import constants, data_manager
+from hpipe.core.data_accessor import SqliteDataAccessor
+from hpipe.core.hutils import logger, system, walker
+from hpipe.core.hutils.watcher import Change, ChangeType, DirectoryWatcher
+
+log = logger.setup_logger()
+log.debug("watch_service.py loaded")
+
+# Key of a sequence, the directory it is in and its basename
+SequenceKey = Tuple[str, str]
+# Frame count and frame range of a sequence, None if it doesn't exist
+SequenceState = Optional[Tuple[int, int, int]]
+
+
+class WatchEventType(Enum):
+    """
+    Type of a watch event.
+    """
+    REVIEWABLE_ADDED = 'reviewable_added'
+    REVIEWABLE_REMOVED = 'reviewable_removed'
+    SEQUENCE_ADDED = 'sequence_added'
+    FRAMES_ADDED = 'frames_added'
+    FRAMES_REMOVED = 'frames_removed'
+    SEQUENCE_REMOVED = 'sequence_removed'
+    PROJECT_ADDED = 'project_added'
+    PROJECT_REMOVED = 'project_removed'
+    SHOT_ADDED = 'shot_added'
+    SHOT_REMOVED = 'shot_removed'
+    DATABASE_CHANGED = 'database_changed'
+
+
+class WatchEvent(NamedTuple):
+    """
+    Event of the watch service. name is the name of the reviewable, sequence basename, project or shot. path is the
+    directory of the reviewable or sequence, and empty for database events. frame_range is the first and last frame of
+    the sequence after the change, for sequence events.
+    """
+    event_type: WatchEventType
+    name: str
+    path: str = ''
+    project_name: str = ''
+    frame_range: Optional[Tuple[int, int]] = None
+
+
+class WatchService:
+    """
+    Watches output folders and the project database and sends the changes to its listeners as watch events. Output
+    folders are folders of reviewables like the comp folder of a shot: each subdirectory is a reviewable and the image
+    sequences are anywhere below them.
+    """
+    _shared: Optional['WatchService'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, watcher: Optional[DirectoryWatcher] = None):
+        """
+        :param watcher: watcher to use, a new one calling back this service if None
+        """
+        self.watcher = watcher or DirectoryWatcher(self._on_changes)
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[WatchEvent]], None]] = []
+        self._output_counts: Dict[str, int] = {}
+
+        # State of the watched trees, only used on the watcher thread
+        self._sequences: Dict[SequenceKey, Set[int]] = {}
+        self._reviewables: Set[str] = set()
+        self._listed_roots: Set[str] = set()
+
+        # Database state, the watched database files and the shot names of each project
+        self._database: Optional[data_manager.ProjectDataManager] = None
+        self._database_files: List[str] = []
+        self._shot_names: Dict[str, Set[str]] = {}
+
+    def __repr__(self) -> str:
+        return f"WatchService({len(self._output_counts)} output folders, database: {bool(self._database_files)})"
+
+    @classmethod
+    def shared(cls) -> 'WatchService':
+        """
+        Returns the process-wide watch service, watching the project database. Its watcher thread is started the first
+        time.
+        :return: shared WatchService
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+                cls._shared.watch_database()
+                cls._shared.start()
+            return cls._shared
+
+    def start(self) -> bool:
+        """
+        Starts the watcher thread.
+        :return: True if successful
+        """
+        return self.watcher.start()
+
+    def stop(self) -> bool:
+        """
+        Stops the watcher thread.
+        :return: True if successful
+        """
+        return self.watcher.stop()
+
+    def add_listener(self, listener: Callable[[List[WatchEvent]], None]) -> None:
+        """
+        Registers a function to be called with the events of each batch of changes.
+        :param listener: function taking a list of watch events, called on the watcher thread
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[List[WatchEvent]], None]) -> None:
+        """
+        Unregisters a function added with add_listener().
+        :param listener: function to remove
+        """
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def watch_outputs(self, directory: Union[str, 'system.Directory']) -> bool:
+        """
+        Starts watching an output folder. Folders are counted, so several apps can watch the same folder and each
+        unwatch it when they are done with it.
+        :param directory: output folder, e.g. the comp folder of a shot
+        :return: True if successful
+        """
+        directory_path = _get_directory_path(directory)
+        with self._lock:
+            self._output_counts[directory_path] = self._output_counts.get(directory_path, 0) + 1
+            if self._output_counts[directory_path] > 1:
+                return True
+        # Same as the sequence scans, tmp files and folders and proxies are never shown
+        return self.watcher.watch(directory_path, prune=walker.prune_names(('tmp',),
+                                                                          directories=(constants.PROXY_DIRECTORY,)))
+
+    def unwatch_outputs(self, directory: Union[str, 'system.Directory']) -> bool:
+        """
+        Stops watching an output folder, once everyone that watched it unwatched it.
+        :param directory: output folder given to watch_outputs()
+        :return: True if the folder was being watched
+        """
+        directory_path = _get_directory_path(directory)
+        with self._lock:
+            if directory_path not in self._output_counts:
+                return False
+            self._output_counts[directory_path] -= 1
+            if self._output_counts[directory_path] > 0:
+                return True
+            del self._output_counts[directory_path]
+        return self.watcher.unwatch(directory_path)
+
+    def watch_database(self) -> bool:
+        """
+        Starts watching the project database in the config. Reads the shot names of every project so added and removed
+        shots can be told apart later.
+        :return: True if successful
+        """
+        self._database = data_manager.ProjectDataManager()
+        self._shot_names = _get_shot_names(self._database)
+        self._database_files = [self._database.accessor.db_path]
+        if isinstance(self._database.accessor, SqliteDataAccessor):
+            # Other writers' changes land in the write-ahead log first
+            self._database_files.append(f"{self._database.accessor.db_path}-wal")
+        for file_path in self._database_files:
+            self.watcher.watch_file(file_path)
+        return True
+
+    def _on_changes(self, changes: List[Change]) -> None:
+        """
+        Watcher callback. Turns a batch of changes into events and sends them to the listeners.
+        """
+        events: List[WatchEvent] = []
+        # State of every sequence and reviewable touched by this batch before the batch, events are made by comparing
+        # it to the state after, so a batch of frames of one sequence makes a single event.
+        sequences_before: Dict[SequenceKey, SequenceState] = {}
+        reviewables_before: Dict[str, bool] = {}
+        # Roots listed for the first time, what is found in them is already there and doesn't make events
+        new_roots: Set[str] = set()
+        database_changed = False
+
+        for change in changes:
+            if change.root in self._database_files:
+                database_changed = True
+            elif change.change_type == ChangeType.LISTED and change.path == change.root:
+                if change.root not in self._listed_roots:
+                    self._listed_roots.add(change.root)
+                    new_roots.add(change.root)
+                self._drop_tree(change.root, sequences_before, reviewables_before)
+            elif change.change_type == ChangeType.DELETED:
+                if change.is_directory:
+                    self._drop_tree(change.path, sequences_before, reviewables_before)
+                else:
+                    self._remove_frame(change.path, sequences_before)
+            elif change.change_type in (ChangeType.CREATED, ChangeType.LISTED):
+                if change.is_directory:
+                    if os.path.dirname(change.path) == change.root:
+                        reviewables_before.setdefault(change.path, change.path in self._reviewables)
+                        self._reviewables.add(change.path)
+                else:
+                    self._add_frame(change.path, sequences_before)
+
+        for reviewable_path, existed in reviewables_before.items():
+            exists = reviewable_path in self._reviewables
+            if exists == existed or os.path.dirname(reviewable_path) in new_roots:
+                continue
+            event_type = WatchEventType.REVIEWABLE_ADDED if exists else WatchEventType.REVIEWABLE_REMOVED
+            events.append(WatchEvent(event_type, os.path.basename(reviewable_path), reviewable_path))
+
+        for key, state_before in sequences_before.items():
+            event = self._sequence_event(key, state_before)
+            if event is not None and not any(_is_in_directory(key[0], root) for root in new_roots):
+                events.append(event)
+
+        if database_changed:
+            events += self._database_events()
+
+        if events:
+            self._publish(events)
+
+    def _add_frame(self, file_path: str, sequences_before: Dict[SequenceKey, SequenceState]) -> None:
+        """
+        Adds a frame to the sequence it belongs to.
+        """
+        directory_path, file_name = os.path.split(file_path)
+        frame_name = imageSequence.parse_frame_name(file_name)
+        if frame_name is None:
+            return
+        key = (directory_path, frame_name.basename)
+        self._touch_sequence(key, sequences_before)
+        self._sequences.setdefault(key, set()).add(frame_name.frame)
+
+    def _remove_frame(self, file_path: str, sequences_before: Dict[SequenceKey, SequenceState]) -> None:
+        """
+        Removes a frame from the sequence it belongs to, and the sequence if it was its last frame.
+        """
+        directory_path, file_name = os.path.split(file_path)
+        frame_name = imageSequence.parse_frame_name(file_name)
+        if frame_name is None:
+            return
+        key = (directory_path, frame_name.basename)
+        if key not in self._sequences:
+            return
+        self._touch_sequence(key, sequences_before)
+        self._sequences[key].discard(frame_name.frame)
+        if not self._sequences[key]:
+            del self._sequences[key]
+
+    def _drop_tree(self, directory_path: str, sequences_before: Dict[SequenceKey, SequenceState],
+                   reviewables_before: Dict[str, bool]) -> None:
+        """
+        Forgets the sequences and reviewables in a directory and its subdirectories.
+        """
+        for key in [key for key in self._sequences if _is_in_directory(key[0], directory_path)]:
+            self._touch_sequence(key, sequences_before)
+            del self._sequences[key]
+        for reviewable_path in [path for path in self._reviewables if _is_in_directory(path, directory_path)]:
+            reviewables_before.setdefault(reviewable_path, True)
+            self._reviewables.remove(reviewable_path)
+
+    def _touch_sequence(self, key: SequenceKey, sequences_before: Dict[SequenceKey, SequenceState]) -> None:
+        """
+        Records the state of a sequence before the batch, the first time the batch changes it.
+        """
+        if key not in sequences_before:
+            sequences_before[key] = _get_sequence_state(self._sequences.get(key))
+
+    def _sequence_event(self, key: SequenceKey, state_before: SequenceState) -> Optional[WatchEvent]:
+        """
+        Compares the state of a sequence before and after the batch.
+        :return: event of the change, or None if the sequence is the same as before
+        """
+        state_after = _get_sequence_state(self._sequences.get(key))
+        if state_after == state_before:
+            return None
+        directory_path, basename = key
+        if state_after is None:
+            return WatchEvent(WatchEventType.SEQUENCE_REMOVED, basename, directory_path)
+
+        frame_range = (state_after[1], state_after[2])
+        if state_before is None:
+            event_type = WatchEventType.SEQUENCE_ADDED
+        elif state_after[0] >= state_before[0]:
+            event_type = WatchEventType.FRAMES_ADDED
+        else:
+            event_type = WatchEventType.FRAMES_REMOVED
+        return WatchEvent(event_type, basename, directory_path, frame_range=frame_range)
+
+    def _database_events(self) -> List[WatchEvent]:
+        """
+        Reloads the watched database and compares its projects and shots to the ones before.
+        :return: project and shot events, and a DATABASE_CHANGED event if the database was reloaded
+        """
+        try:
+            if not self._database.reload_if_changed():
+                return []
+            shot_names = _get_shot_names(self._database)
+        except Exception as e:
+            log.error(f"Could not reload the watched database: {e}")
+            return []
+
+        events = []
+        for project_name in shot_names.keys() - self._shot_names.keys():
+            events.append(WatchEvent(WatchEventType.PROJECT_ADDED, project_name, project_name=project_name))
+        for project_name in self._shot_names.keys() - shot_names.keys():
+            events.append(WatchEvent(WatchEventType.PROJECT_REMOVED, project_name, project_name=project_name))
+        for project_name, project_shot_names in shot_names.items():
+            old_shot_names = self._shot_names.get(project_name, set())
+            for shot_name in sorted(project_shot_names - old_shot_names):
+                events.append(WatchEvent(WatchEventType.SHOT_ADDED, shot_name, project_name=project_name))
+            for shot_name in sorted(old_shot_names - project_shot_names):
+                events.append(WatchEvent(WatchEventType.SHOT_REMOVED, shot_name, project_name=project_name))
+        self._shot_names = shot_names
+        events.append(WatchEvent(WatchEventType.DATABASE_CHANGED, self._database.accessor.db_path))
+        return events
+
+    def _publish(self, events: List[WatchEvent]) -> None:
+        """
+        Calls the listeners with the events. A failing listener is logged and does not stop the others from being
+        called.
+        """
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(events)
+            except Exception as e:
+                log.error(f"Watch listener {listener} failed: {e}")
+
+
+def _get_directory_path(directory: Union[str, 'system.Directory']) -> str:
+    """
+    Returns the path of a watched directory on the current system.
+    """
+    if isinstance(directory, system.Directory):
+        return directory.directory_path
+    return system.Directory(directory).directory_path
+
+
+def _get_shot_names(database: data_manager.ProjectDataManager) -> Dict[str, Set[str]]:
+    """
+    Returns the shot names of every project in a database, read from the project dictionaries so no project is built.
+    """
+    return {project_name: set((project_dictionary or {}).get('member_shots') or {})
+            for project_name, project_dictionary in database.data.items()}
+
+
+def _get_sequence_state(frames: Optional[Set[int]]) -> SequenceState:
+    """
+    Returns the frame count and frame range of a sequence's frames.
+    """
+    if not frames:
+        return None
+    return len(frames), min(frames), max(frames)
+
+
+def _is_in_directory(path: str, directory_path: str) -> bool:
+    """
+    Checks whether a path is a directory or inside it.
+    """
+    return path == directory_path or path.startswith(os.path.join(directory_path, ''))
@@ -130,12 +130,7 @@ class Megascan3dAssetAccessor(AbstractAssetAccessor):
         # Note about LODs
         # The LODs are stored in the same directory as the main asset, asset_LOD#.extension
         extensions = [".fbx", ".obj", ".abc", ".usd"]
-        files = []
-        for extension in extensions:
-            if subdirectory:
-                files += subdirectory.get_files_by_extension(extension)
-            else:
-                files += self.asset_directory.get_files_by_extension(extension)
+        files = (subdirectory or self.asset_directory).get_files_by_extension(extensions)
 
         # should order the list reverse LOD order lambda the file name. The last index should be the highest LOD
         files.sort(key=lambda x: x.basename, reverse=True)
@@ -150,9 +145,7 @@ class Megascan3dAssetAccessor(AbstractAssetAccessor):
         # Note about LODs
         # The LODs are stored in the same directory as the main asset, asset_LOD#.extension
         extensions = [".tga", ".png", ".jpg", ".jpeg", ".exr", ".tif", ".tiff"]
-        files = []
-        for extension in extensions:
-            files += self.asset_directory.get_files_by_extension(extension, recurse=True)
+        files = self.asset_directory.get_files_by_extension(extensions, recurse=True)
 
         return files
 
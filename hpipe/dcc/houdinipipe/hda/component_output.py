@@ -30,7 +30,7 @@ class UsdAssetBuilder:
 
 
         self.database = data_manager.ProjectDataManager()
-        self.config = data_manager.ConfigDataManager()
+        self.config = data_manager.ConfigDataManager.shared()
         self.node_name = self.node.name()
 
         # self.session = session.HoudiniSession()
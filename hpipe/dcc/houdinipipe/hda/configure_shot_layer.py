@@ -22,7 +22,7 @@ def major_type_menu(kwargs) -> list[str]:
     import os
     project_name = hou.getenv("PROJECT")
     shot_name = hou.getenv("SHOT")
-    database = data_manager.ProjectDataManager()
+    database = data_manager.ProjectDataManager.shared()
     project = database.get_project(project_name)
     shot = project.get_shot(shot_name)
     usd_layers = shot.get_major_usd_layers()
@@ -40,7 +40,7 @@ def get_layer_path() -> str:
     """
     shot = hou.getenv("SHOT")
     project = hou.getenv("PROJECT")
-    database = data_manager.ProjectDataManager()
+    database = data_manager.ProjectDataManager.shared()
     project_instance = database.get_project(project)
     shot_instance = project_instance.get_shot(shot)
     major_type = hou.pwd().parm('majortype').eval()
@@ -19,7 +19,7 @@ def layer_menu(kwargs) -> list[str]:
     """
     shot = hou.getenv("SHOT")
     project = hou.getenv("PROJECT")
-    database = data_manager.ProjectDataManager()
+    database = data_manager.ProjectDataManager.shared()
     project_instance = database.get_project(project)
     shot_instance = project_instance.get_shot(shot)
 
@@ -20,7 +20,7 @@ def get_pass_path(node: 'hou.Node') -> str:
     pass_version_minor = str(pass_version_minor).zfill(3)
     hip_file = hou.hipFile.name().split('/')[-1].split('.')[0].split('-')[:-1]
     hip_file = '-'.join(hip_file)
-    project = data_manager.ProjectDataManager().get_project(project_name)
+    project = data_manager.ProjectDataManager.shared().get_project(project_name)
     shot = project.get_shot(shot_name)
     render_path = shot.get_render_path()
 
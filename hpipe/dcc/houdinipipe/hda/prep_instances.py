@@ -20,7 +20,7 @@ def get_layer_path() -> str:
     shot = hou.getenv("SHOT")
     project = hou.getenv("PROJECT")
 
-    database = data_manager.ProjectDataManager()
+    database = data_manager.ProjectDataManager.shared()
     project_instance = database.get_project(project)
     shot_instance = project_instance.get_shot(shot)
 
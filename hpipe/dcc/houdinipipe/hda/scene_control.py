@@ -95,11 +95,11 @@ def project_menu() -> List[str]:
     """
     Get a list of the projects and return it as a formatted houdini list.
     """
-    project_list = data_manager.ProjectDataManager().get_projects()
+    project_names = data_manager.ProjectDataManager.shared().get_project_names()
     menu = []
-    for project in project_list:
-        menu.append(project.name)
-        menu.append(project.name)
+    for project_name in project_names:
+        menu.append(project_name)
+        menu.append(project_name)
     return menu
 
 
@@ -111,10 +111,10 @@ def shot_menu() -> List[str]:
     name = hou.getenv('PROJECT')
     if not name:
         return []
-    project = data_manager.ProjectDataManager().get_project(name)
-    for shot in project.get_shots():
-        menu.append(shot.name)
-        menu.append(shot.name)
+    project = data_manager.ProjectDataManager.shared().get_project(name)
+    for shot_name in project.get_shot_names():
+        menu.append(shot_name)
+        menu.append(shot_name)
     return menu
 
 
@@ -123,7 +123,7 @@ def hip_menu() -> List[str]:
     Get a list of the available hip files and return it as a formatted houdini list.
     :return: A list of the available hip files.
     """
-    database = data_manager.ProjectDataManager()
+    database = data_manager.ProjectDataManager.shared()
     project_name = hou.getenv('PROJECT')
     shot_name = hou.getenv('SHOT')
 
@@ -165,7 +165,7 @@ def set_project(kwargs: Dict[Any, Any]) -> bool:
         node.cook(True)
         return False
 
-    database = data_manager.ProjectDataManager()
+    database = data_manager.ProjectDataManager.shared()
     project = database.get_project(project_name)
 
     # TODO: potentially this should be a for loop over the shot global vars enum
@@ -208,7 +208,7 @@ def set_shot(kwargs: dict = None, node: 'hou.node' = None) -> bool:
         node.cook(True)
         return False
 
-    database = data_manager.ProjectDataManager()
+    database = data_manager.ProjectDataManager.shared()
 
     project_name = hou.getenv('PROJECT')
     project = database.get_project(project_name)
@@ -262,7 +262,7 @@ def set_task(kwargs):
         node.cook(True)
         return False
 
-    database = data_manager.ProjectDataManager()
+    database = data_manager.ProjectDataManager.shared()
 
     project_name = hou.getenv('PROJECT')
     project = database.get_project(project_name)
@@ -17,7 +17,7 @@ def get_root_path() -> str:
     asset = node.parm('assetanimation').eval()
 
     if asset == 1:
-        config_manager = data_manager.ConfigDataManager()
+        config_manager = data_manager.ConfigDataManager.shared()
         asset_root = config_manager.get_config("ASSETS_ROOT")
         asset_name = node.parm('assetname').eval()
         descriptor = hou.pwd().parm('descriptor').eval()
@@ -26,7 +26,7 @@ def get_root_path() -> str:
 
     else:
         log.warning('LOADING DATABASE')
-        database = data_manager.ProjectDataManager()
+        database = data_manager.ProjectDataManager.shared()
         project_instance = database.get_project(project)
         shot_instance = project_instance.get_shot(shot)
         descriptor = hou.pwd().parm('descriptor').eval()
@@ -20,7 +20,7 @@ class HoudiniSession:
     """
     def __init__(self):
         self.database = data_manager.ProjectDataManager()
-        self.config = data_manager.ConfigDataManager()
+        self.config = data_manager.ConfigDataManager.shared()
         self.projectFile = self.get_project_file()
         self.version = self.get_version()
 
@@ -94,9 +94,7 @@ class Megascan3dAssetAccessor(AbstractAssetAccessor):
         # Note about LODs
         # The LODs are stored in the same directory as the main asset, asset_LOD#.extension
         extensions = [".fbx", ".obj", ".abc", ".usd"]
-        files = []
-        for extension in extensions:
-            files += self.asset_directory.get_files_by_extension(extension)
+        files = self.asset_directory.get_files_by_extension(extensions)
 
         # should order the list reverse LOD order lambda the file name. The last index should be the highest LOD
         files.sort(key=lambda x: x.basename, reverse=True)
@@ -111,9 +109,7 @@ class Megascan3dAssetAccessor(AbstractAssetAccessor):
         # Note about LODs
         # The LODs are stored in the same directory as the main asset, asset_LOD#.extension
         extensions = [".tga", ".png", ".jpg", ".jpeg", ".exr", ".tif", ".tiff"]
-        files = []
-        for extension in extensions:
-            files += self.asset_directory.get_files_by_extension(extension, recurse=False)
+        files = self.asset_directory.get_files_by_extension(extensions, recurse=False)
 
         # we do not need to deal with LODs for all the textures
         return files
@@ -256,9 +252,7 @@ class SpeedTreeAssetAccessor(AbstractAssetAccessor):
         # Note about LODs
         # The LODs are stored in the same directory as the main asset, asset_LOD#.extension
         extensions = [".fbx", ".obj", ".abc", ".usd"]
-        files = []
-        for extension in extensions:
-            files += self.asset_directory.get_files_by_extension(extension)
+        files = self.asset_directory.get_files_by_extension(extensions)
 
         # should order the list reverse LOD order lambda the file name. The last index should be the highest LOD
         files.sort(key=lambda x: x.basename, reverse=True)
@@ -273,9 +267,7 @@ class SpeedTreeAssetAccessor(AbstractAssetAccessor):
         # Note about LODs
         # The LODs are stored in the same directory as the main asset, asset_LOD#.extension
         extensions = [".tga", ".png", ".jpg", ".jpeg", ".exr", ".tif", ".tiff"]
-        files = []
-        for extension in extensions:
-            files += self.asset_directory.get_files_by_extension(extension, recurse=False)
+        files = self.asset_directory.get_files_by_extension(extensions, recurse=False)
 
         # we do not need to deal with LODs for all the textures
         return files
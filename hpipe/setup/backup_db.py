@@ -0,0 +1,100 @@
+"""
+Command line tool for the database backups. Lists, takes and restores snapshots of the configured databases in the
+DB_BACKUP directory.
+
+    python -m hpipe.setup.backup_db list
+    python -m hpipe.setup.backup_db backup
+    python -m hpipe.setup.backup_db restore --database ARCHIVE_DB_PATH --snapshot <snapshot file name>
+"""
+import argparse
+import os
+from typing import *
+
+from hpipe.core import constants, data_manager
+from hpipe.core.config_manager import ConfigDataManager
+from hpipe.core.data_accessor import JsonDataAccessor, RecordType, SqliteDataAccessor
+from hpipe.core.hutils import logger
+from hpipe.core.hutils.backup import DatabaseBackup
+
+log = logger.setup_logger()
+log.debug("backup_db.py loaded")
+
+DATABASES = ['DB_PATH', 'ARCHIVE_DB_PATH', 'ASSET_DB_PATH']
+
+
+def get_data_accessor(config_name: str) -> Union[JsonDataAccessor, SqliteDataAccessor]:
+    """
+    Returns the data accessor of a configured database, for the database type set by DB_TYPE.
+    :param str config_name: name of the config holding the database path, e.g. DB_PATH
+    :return: data accessor of the database
+    """
+    record_type = RecordType.ASSET if config_name == 'ASSET_DB_PATH' else RecordType.PROJECT
+    return data_manager._get_data_accessor(config_name, record_type, lazy=True)
+
+
+def get_backup_directory() -> str:
+    """
+    Returns the DB_BACKUP directory the snapshots are stored in.
+    """
+    return ConfigDataManager.shared().get_config_directory('DB_BACKUP').system_path()
+
+
+def get_database_backup(config_name: str) -> DatabaseBackup:
+    """
+    Returns the backup manager for a configured database. The path is the one the data manager uses, so on a SQLite
+    setup this is the .sqlite file next to the configured path.
+    :param str config_name: name of the config holding the database path, e.g. DB_PATH
+    :return: backup manager for the database
+    """
+    return DatabaseBackup(get_data_accessor(config_name).db_path, get_backup_directory(),
+                          hourly=constants.DB_BACKUP_HOURLY, daily=constants.DB_BACKUP_DAILY)
+
+
+def list_backups(config_name: str) -> bool:
+    """
+    Prints the snapshots of a configured database, newest first.
+    :param str config_name: name of the config holding the database path
+    :return: True if successful
+    """
+    for snapshot in get_database_backup(config_name).list_snapshots(include_latest=True):
+        size = os.path.getsize(snapshot.path)
+        print(f"{snapshot.timestamp:%Y-%m-%d %H:%M:%S}  {snapshot.content_hash}  {size:>12}  "
+              f"{os.path.basename(snapshot.path)}")
+    return True
+
+
+def restore_backup(config_name: str, snapshot_name: str = '') -> bool:
+    """
+    Restores a snapshot over a configured database through its data accessor. The current database is backed up
+    first.
+    :param str config_name: name of the config holding the database path
+    :param str snapshot_name: file name of the snapshot to restore, defaults to the newest one
+    :return: True if successful
+    """
+    database_backup = get_database_backup(config_name)
+    snapshot = None
+    if snapshot_name:
+        matches = [s for s in database_backup.list_snapshots(include_latest=True)
+                   if os.path.basename(s.path) == snapshot_name]
+        if not matches:
+            raise ValueError(f"Snapshot {snapshot_name} not found in {database_backup.backup_directory}")
+        snapshot = matches[0]
+
+    return get_data_accessor(config_name).restore(snapshot, get_backup_directory())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="List, take and restore database backups.")
+    parser.add_argument('command', choices=['list', 'backup', 'restore'])
+    parser.add_argument('--database', default='DB_PATH', choices=DATABASES,
+                        help="config name of the database, defaults to DB_PATH")
+    parser.add_argument('--snapshot', default='', help="snapshot file name to restore, defaults to the newest")
+    arguments = parser.parse_args()
+
+    if arguments.command == 'list':
+        list_backups(arguments.database)
+    elif arguments.command == 'backup':
+        # The accessor takes a consistent copy of SQLite databases before snapshotting them
+        get_data_accessor(arguments.database).backup(get_backup_directory())
+    else:
+        restore_backup(arguments.database, arguments.snapshot)
@@ -17,15 +17,18 @@ Startup script to configure the pipe environment and get user preferences.
 # "ARCHIVE_DB_PATH": "/Users/hunterwilliams/Documents/project_db/projects_archive.json", quick
 # "DB_BACKUP": "/Users/hunterwilliams/Documents/vault/db_backup/", quick
 # "DB_TYPE": "json", quick
+# "DB_FORMAT": "json", quick
 # "GLOBAL_ASSETS": "/Users/hunterwilliams/Documents/_global_assets/", quick
 # "ASSET_DB_PATH": "/Users/hunterwilliams/Documents/project_db/assets.json", quick
 # "HPIPE_PATH": "/Users/hunterwilliams/Documents/project_db/", quick
 # "BETA": "False" quick
+# "PATH_ROOTS": {"hlw01": {"linux": "/mnt/share/hlw01/", "windows": "Y:/", "osx": "/Volumes/hlw01/"}}
+# "SITE": "", "SITE_PATH_ROOTS": {"<site>": {"hlw01": {"windows": "Z:/"}}} per site overrides of PATH_ROOTS
 # Houdini environment file
 # .nuke folder
 
-# TODO need to figure out a way to store these in a much more performant way throughout the code. I dont think its
-# very efficient to be calling the configuration manager in a ton of areas
+# The rest of the pipeline reads these through ConfigDataManager.shared(), which only reads the config file again when
+# it changes on disk.
 
 class SetupConfiguredEnvironment:
     """
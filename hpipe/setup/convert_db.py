@@ -0,0 +1,46 @@
+"""
+Converts the file databases (projects, archive and assets) to another serialization format, see hutils.serialization.
+The databases are rewritten in place. Loading detects the format, so tools still configured for the old format keep
+working, they just write the old format back on their next save until DB_FORMAT is switched for everyone.
+"""
+import argparse
+import os
+
+from hpipe.core.config_manager import ConfigDataManager
+from hpipe.core.data_accessor import convert_file_format
+from hpipe.core.hutils import logger, serialization
+
+log = logger.setup_logger()
+log.debug("convert_db.py loaded")
+
+DATABASES = ('DB_PATH', 'ARCHIVE_DB_PATH', 'ASSET_DB_PATH')
+
+
+def convert_databases(file_format: serialization.SerializationFormat, switch_config: bool = False) -> bool:
+    """
+    Converts every configured file database to a serialization format.
+    :param SerializationFormat file_format: format to convert to
+    :param bool switch_config: if True, sets DB_FORMAT to the new format once all databases are converted
+    :return: True if successful
+    """
+    config = ConfigDataManager.shared()
+    for config_name in DATABASES:
+        db_path = config.get_config_filepath(config_name).system_path()
+        if not os.path.exists(db_path):
+            log.warning(f"Database {db_path} does not exist, skipping.")
+            continue
+        convert_file_format(db_path, file_format)
+
+    if switch_config:
+        config.set_config('DB_FORMAT', file_format.value)
+        log.info(f"Switched DB_FORMAT to {file_format.value}")
+
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('format', choices=[file_format.value for file_format in serialization.SerializationFormat])
+    parser.add_argument('--switch', action='store_true', help="set DB_FORMAT to the new format after converting")
+    arguments = parser.parse_args()
+    convert_databases(serialization.get_format(arguments.format), switch_config=arguments.switch)
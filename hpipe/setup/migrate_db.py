@@ -0,0 +1,44 @@
+"""
+One-shot migration of the JSON databases (projects, archive and assets) to SQLite. Each database is written next to its
+JSON file with a .sqlite extension, which is where the data managers look for it once DB_TYPE is set to 'sqlite'. The
+JSON files are left untouched so the migration can be re-run or rolled back by setting DB_TYPE back to 'json'.
+"""
+import argparse
+
+from hpipe.core.config_manager import ConfigDataManager
+from hpipe.core.data_accessor import RecordType, migrate_json_to_sqlite
+from hpipe.core.hutils import logger
+
+log = logger.setup_logger()
+log.debug("migrate_db.py loaded")
+
+DATABASES = {
+    'DB_PATH': RecordType.PROJECT,
+    'ARCHIVE_DB_PATH': RecordType.PROJECT,
+    'ASSET_DB_PATH': RecordType.ASSET,
+}
+
+
+def migrate_databases(switch_config: bool = False) -> bool:
+    """
+    Migrates every configured JSON database to SQLite.
+    :param bool switch_config: if True, sets DB_TYPE to 'sqlite' once all databases are migrated
+    :return: True if successful
+    """
+    config = ConfigDataManager.shared()
+    for config_name, record_type in DATABASES.items():
+        json_path = config.get_config_filepath(config_name).system_path()
+        migrate_json_to_sqlite(json_path, record_type)
+
+    if switch_config:
+        config.set_config('DB_TYPE', 'sqlite')
+        log.info("Switched DB_TYPE to sqlite")
+
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--switch', action='store_true', help="set DB_TYPE to 'sqlite' after migrating")
+    arguments = parser.parse_args()
+    migrate_databases(switch_config=arguments.switch)
@@ -0,0 +1,206 @@
+"""
+Benchmarks for the database layer. Builds a synthetic project database in a temp directory in the home directory so it
+can be run anywhere without touching the configured databases.
+"""
+import os
+import tempfile
+from typing import *
+
+from hpipe.core import constants, data_accessor
+from hpipe.core.hutils import logger, system, serialization
+from hpipe.core.hutils.backup import DatabaseBackup
+
+log = logger.setup_logger()
+log.debug("db_benchmark.py loaded")
+
+
+def synthetic_db(project_count: int = 100, shots_per_project: int = 100) -> dict:
+    """
+    Builds a synthetic project database dictionary.
+    :param int project_count: number of projects
+    :param int shots_per_project: number of shots per project
+    :return: database dictionary in the same shape as the JSON database
+    """
+    data = {}
+    for project_index in range(project_count):
+        project_name = f"project_{project_index:04d}"
+        shots = {}
+        for shot_index in range(shots_per_project):
+            shot_name = f"PRJ_{project_index:03d}_{shot_index * 10:04d}"
+            shots[shot_name] = {
+                'shot_name': shot_name,
+                'frame_start': 1001,
+                'frame_end': 1001 + shot_index % 200,
+                'project_name': project_name,
+                'tags': ['ingested', 'final'] if shot_index % 7 == 0 else ['ingested'],
+                'user_data': {'notes': f"synthetic shot {shot_index}", 'lens': 35 + shot_index % 50},
+            }
+        data[project_name] = {
+            'project_name': project_name,
+            'member_shots': shots,
+            'date_created': '2024-01-01',
+            'description': f"synthetic project {project_index}",
+            'user_data': {},
+        }
+    return data
+
+
+class DbBenchmark:
+    """
+    Class for benchmarking the project database
+    """
+    def __init__(self, project_count: int = 100, shots_per_project: int = 100, iterations: int = 20):
+        self.iterations = iterations
+        self.temp_directory = tempfile.TemporaryDirectory(dir=system.SystemConfig.get_home())
+        self.db_path = os.path.join(self.temp_directory.name, 'projects.json')
+        self.backup_directory = os.path.join(self.temp_directory.name, 'db_backup')
+
+        self.accessor = data_accessor.JsonDataAccessor(self.db_path)
+        self.accessor.save_data(synthetic_db(project_count, shots_per_project))
+        log.info(f"Synthetic database: {os.path.getsize(self.db_path) / 1024 / 1024:.2f} MB")
+
+        self.load_pass = self.load()
+        self.lazy_load_pass = self.lazy_load()
+        self.save_pass = self.save()
+        self.save_with_backup_pass = self.save_with_backup()
+        self.backup_pass = self.backup()
+        self.unchanged_backup_pass = self.unchanged_backup()
+
+        self.log_benchmarks()
+        self.temp_directory.cleanup()
+
+    @logger.timeit
+    def load(self) -> bool:
+        """
+        Loads the whole database and lists the project names.
+        """
+        for i in range(self.iterations):
+            accessor = data_accessor.JsonDataAccessor(self.db_path)
+            list(accessor.data.keys())
+        return True
+
+    @logger.timeit
+    def lazy_load(self) -> bool:
+        """
+        Lazily loads the database, lists the project names and parses a single project.
+        """
+        for i in range(self.iterations):
+            accessor = data_accessor.JsonDataAccessor(self.db_path, lazy=True)
+            list(accessor.data.keys())
+            accessor.data['project_0000']
+        return True
+
+    @logger.timeit
+    def save(self) -> bool:
+        """
+        Saves the database without backing up.
+        """
+        for i in range(self.iterations):
+            self.accessor.data['project_0000']['description'] = f"save {i}"
+            self.accessor.save_data(self.accessor.data)
+        return True
+
+    @logger.timeit
+    def save_with_backup(self) -> bool:
+        """
+        Saves the database and backs up with the same throttling as ProjectDataManager.save().
+        """
+        for i in range(self.iterations):
+            self.accessor.data['project_0000']['description'] = f"save with backup {i}"
+            self.accessor.save_data(self.accessor.data)
+            self.accessor.backup(self.backup_directory, min_interval=constants.DB_BACKUP_INTERVAL)
+        return True
+
+    @logger.timeit
+    def backup(self) -> bool:
+        """
+        Snapshots a changed database every iteration. This is the worst case cost of a backup.
+        """
+        database_backup = DatabaseBackup(self.db_path, self.backup_directory)
+        for i in range(self.iterations):
+            self.accessor.data['project_0000']['description'] = f"backup {i}"
+            self.accessor.save_data(self.accessor.data)
+            database_backup.snapshot()
+        return True
+
+    @logger.timeit
+    def unchanged_backup(self) -> bool:
+        """
+        Backs up an unchanged database, which only costs hashing the file.
+        """
+        database_backup = DatabaseBackup(self.db_path, self.backup_directory)
+        for i in range(self.iterations):
+            database_backup.snapshot()
+        return True
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        iterations = self.iterations
+        log.info(f"------ BENCHMARKS: Load ------------------- {self.load_pass[1] / iterations * 1000:.2f} ms")
+        log.info(f"------ BENCHMARKS: Lazy load -------------- {self.lazy_load_pass[1] / iterations * 1000:.2f} ms")
+        log.info(f"------ BENCHMARKS: Save ------------------- {self.save_pass[1] / iterations * 1000:.2f} ms")
+        log.info(f"------ BENCHMARKS: Save with backup ------- "
+                 f"{self.save_with_backup_pass[1] / iterations * 1000:.2f} ms")
+        log.info(f"------ BENCHMARKS: Changed backup --------- {self.backup_pass[1] / iterations * 1000:.2f} ms")
+        log.info(f"------ BENCHMARKS: Unchanged backup ------- "
+                 f"{self.unchanged_backup_pass[1] / iterations * 1000:.2f} ms")
+
+
+class SerializationBenchmark:
+    """
+    Class for benchmarking the serialization formats of the file databases. Formats that aren't installed are skipped.
+    """
+    def __init__(self, project_count: int = 100, shots_per_project: int = 100, iterations: int = 5):
+        self.iterations = iterations
+        self.temp_directory = tempfile.TemporaryDirectory(dir=system.SystemConfig.get_home())
+        self.data = synthetic_db(project_count, shots_per_project)
+        log.info(f"Synthetic database: {project_count * shots_per_project} shots")
+
+        self.results: Dict[str, Tuple[float, float, int]] = {}
+        for file_format in serialization.SerializationFormat:
+            if not file_format.is_available():
+                log.warning(f"Skipping {file_format.value}, it is not installed.")
+                continue
+            db_path = os.path.join(self.temp_directory.name, f'projects_{file_format.value}.json')
+            accessor = data_accessor.JsonDataAccessor(db_path, file_format=file_format)
+            save_pass = self.save(accessor)
+            load_pass = self.load(accessor)
+            self.results[file_format.value] = (load_pass[1], save_pass[1], os.path.getsize(db_path))
+
+        self.log_benchmarks()
+        self.temp_directory.cleanup()
+
+    @logger.timeit
+    def save(self, accessor: data_accessor.JsonDataAccessor) -> bool:
+        """
+        Saves the synthetic database.
+        """
+        for i in range(self.iterations):
+            self.data['project_0000']['description'] = f"save {i}"
+            accessor.save_data(self.data)
+        return True
+
+    @logger.timeit
+    def load(self, accessor: data_accessor.JsonDataAccessor) -> bool:
+        """
+        Loads the whole database.
+        """
+        for i in range(self.iterations):
+            accessor.get_data()
+        return True
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        iterations = self.iterations
+        for name, (load_time, save_time, size) in self.results.items():
+            log.info(f"------ BENCHMARKS: {name:<8} load {load_time / iterations * 1000:8.2f} ms, "
+                     f"save {save_time / iterations * 1000:8.2f} ms, {size / 1024 / 1024:6.2f} MB")
+
+
+if __name__ == '__main__':
+    DbBenchmark()
+    SerializationBenchmark()
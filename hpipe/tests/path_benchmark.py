@@ -0,0 +1,106 @@
+"""
+Benchmarks for building paths and translating them to the current system. Only builds path objects in memory, nothing
+is read from disk.
+"""
+from hpipe.core.hutils import logger, system
+
+log = logger.setup_logger()
+log.debug("path_benchmark.py loaded")
+
+
+def clear_path_caches():
+    """
+    Clears the path caches so the next translation of every path is a cache miss.
+    """
+    system._translate_root.cache_clear()
+
+
+class PathBenchmark:
+    """
+    Class for benchmarking path translation. Paths are on a different system root than the current one so every
+    system_path() call translates. The warm passes translate the same paths every iteration, the cold passes only
+    translate paths that haven't been seen yet, which is what a scan of a new render tree does.
+    """
+    def __init__(self, path_count: int = 1000, iterations: int = 20):
+        self.iterations = iterations
+        self.calls = path_count * iterations
+        foreign_root = system.WINDOWS_ROOT if system.SystemConfig.get_system() != system.System.WINDOWS \
+            else system.LINUX_ROOT
+        self.unique_paths = [f"{foreign_root}projects/shot_{index // 100:05d}/renders/beauty_{index:06d}.exr"
+                             for index in range(self.calls)]
+        self.paths = self.unique_paths[:path_count]
+        self.filepaths = [system.Filepath(filepath) for filepath in self.paths]
+        self.unique_filepaths = [system.Filepath(filepath) for filepath in self.unique_paths]
+
+        clear_path_caches()
+        self.system_path_pass = self.system_path()
+        self.cold_system_path_pass = self.cold_system_path()
+        self.directory_pass = self.directory()
+        self.cold_directory_pass = self.cold_directory()
+        self.translate_many_pass = self.translate_many()
+
+        self.log_benchmarks()
+
+    @logger.timeit
+    def system_path(self) -> bool:
+        """
+        Translates every path to the current system.
+        """
+        for i in range(self.iterations):
+            for filepath in self.filepaths:
+                filepath.system_path()
+        return True
+
+    @logger.timeit
+    def cold_system_path(self) -> bool:
+        """
+        Translates paths that haven't been translated yet.
+        """
+        for filepath in self.unique_filepaths:
+            filepath.system_path()
+        return True
+
+    @logger.timeit
+    def directory(self) -> bool:
+        """
+        Builds a Directory for the parent directory of every path.
+        """
+        for i in range(self.iterations):
+            for filepath in self.paths:
+                system.Directory(filepath.rsplit('/', 1)[0])
+        return True
+
+    @logger.timeit
+    def cold_directory(self) -> bool:
+        """
+        Builds a Directory for paths that haven't been seen yet.
+        """
+        for filepath in self.unique_paths:
+            system.Directory(filepath)
+        return True
+
+    @logger.timeit
+    def translate_many(self) -> bool:
+        """
+        Translates paths that haven't been seen yet in bulk, which is what scanners do.
+        """
+        system.translate_many(self.unique_paths)
+        return True
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        calls = self.calls
+        log.info(f"------ BENCHMARKS: system_path ------------ {self.system_path_pass[1] / calls * 1000000:8.2f} us")
+        log.info(f"------ BENCHMARKS: system_path, cold ------ "
+                 f"{self.cold_system_path_pass[1] / calls * 1000000:8.2f} us")
+        log.info(f"------ BENCHMARKS: Directory -------------- {self.directory_pass[1] / calls * 1000000:8.2f} us")
+        log.info(f"------ BENCHMARKS: Directory, cold -------- "
+                 f"{self.cold_directory_pass[1] / calls * 1000000:8.2f} us")
+        log.info(f"------ BENCHMARKS: translate_many --------- "
+                 f"{self.translate_many_pass[1] / calls * 1000000:8.2f} us per path")
+
+
+if __name__ == '__main__':
+    PathBenchmark()
@@ -0,0 +1,69 @@
+"""
+Benchmarks for the Project class. Projects are built in memory from synthetic data, nothing is written to disk.
+"""
+from hpipe.core import project
+from hpipe.core.hutils import logger
+from hpipe.tests.db_benchmark import synthetic_db
+
+log = logger.setup_logger()
+log.debug("project_benchmark.py loaded")
+
+
+class ProjectBenchmark:
+    """
+    Class for benchmarking bulk shot edits on projects of increasing size. The edit pass does what
+    manager_utils.encode_data does for every shot: get the shot, change it and update it in the project. The time per
+    shot should stay flat as the shot count grows.
+    """
+    def __init__(self, shot_counts: tuple = (250, 500, 1000, 2000, 4000), project_count: int = 50):
+        self.results = {}
+        for shot_count in shot_counts:
+            project_dictionary = synthetic_db(1, shot_count)['project_0000']
+            project_instance = project.Project.from_dict(project_dictionary)
+            self.results[shot_count] = self.bulk_edit(project_instance)[1]
+
+        self.project_count = project_count
+        self.load_results = {}
+        for shots_per_project in (10, 100, 1000):
+            self.load_results[shots_per_project] = self.load(synthetic_db(project_count, shots_per_project))[1]
+
+        self.log_benchmarks()
+
+    @logger.timeit
+    def bulk_edit(self, project_instance: project.Project) -> bool:
+        """
+        Gets, edits and updates every shot in the project, then exports the project.
+        """
+        for shot_name in [shot_instance.name for shot_instance in project_instance.get_shots()]:
+            shot_instance = project_instance.get_shot(shot_name)
+            shot_instance.tags = shot_instance.tags + ['edited']
+            project_instance.update_shot(shot_instance)
+        project_instance.to_dict()
+        return True
+
+    @logger.timeit
+    def load(self, data: dict) -> bool:
+        """
+        Builds every project in the database, lists their shot names and exports them again, which is what listing
+        the projects in the manager GUI costs. Shots are never accessed so this should only scale with project count.
+        """
+        for project_dictionary in data.values():
+            project_instance = project.Project.from_dict(project_dictionary)
+            project_instance.get_shot_names()
+            project_instance.to_dict()
+        return True
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        for shot_count, bulk_edit_time in self.results.items():
+            log.info(f"------ BENCHMARKS: Bulk edit {shot_count:>5} shots -- {bulk_edit_time * 1000:8.2f} ms, "
+                     f"{bulk_edit_time / shot_count * 1000000:6.2f} us per shot")
+        for shots_per_project, load_time in self.load_results.items():
+            log.info(f"------ BENCHMARKS: Load {self.project_count} projects, {shots_per_project:>4} shots each -- "
+                     f"{load_time * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    ProjectBenchmark()
@@ -0,0 +1,485 @@
+"""
+Benchmarks for scanning render trees. Builds a synthetic render tree of empty frame files in a temp directory in the
+home directory so it can be run anywhere without touching the file server.
+"""
+import os
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import *
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore
+
+from hpipe.assets import frame_check, imageSequence
+from hpipe.core import constants, project
+from hpipe.core.hutils import logger, scan_cache, system, walker
+from hpipe.tests.db_benchmark import synthetic_db
+
+log = logger.setup_logger()
+log.debug("scan_benchmark.py loaded")
+
+
+def build_render_tree(root: str, frame_count: int = 100000, frames_per_sequence: int = 1000) -> List[str]:
+    """
+    Builds a synthetic render tree of empty exr files, laid out as <root>/shot_###/v###/shot_###_v###_beauty_####.exr
+    :param str root: directory to build the tree in
+    :param int frame_count: total number of frame files
+    :param int frames_per_sequence: number of frames per sequence
+    :return: list of the paths of the frame files
+    """
+    frame_paths = []
+    for sequence_index in range(frame_count // frames_per_sequence):
+        shot_name, version = f"shot_{sequence_index // 4:03d}", f"v{sequence_index % 4 + 1:03d}"
+        sequence_directory = os.path.join(root, shot_name, version)
+        os.makedirs(sequence_directory, exist_ok=True)
+        for frame in range(1001, 1001 + frames_per_sequence):
+            frame_path = os.path.join(sequence_directory, f"{shot_name}_{version}_beauty_{frame:04d}.exr")
+            open(frame_path, 'wb').close()
+            frame_paths.append(frame_path)
+    return frame_paths
+
+
+def build_exr_frame(width: int = 1920, height: int = 1080, chunk_data_size: int = 100) -> bytes:
+    """
+    Builds the bytes of a zip compressed scanline exr with a valid header, offset table and chunk layout. The pixel
+    data is filler, the frame checks never decode it.
+    :param int width: width of the data window
+    :param int height: height of the data window
+    :param int chunk_data_size: size of the data of each chunk of 16 scanlines
+    :return: bytes of the file
+    """
+    def attribute(name: str, attribute_type: str, value: bytes) -> bytes:
+        return name.encode() + b'\0' + attribute_type.encode() + b'\0' + struct.pack('<i', len(value)) + value
+
+    window = struct.pack('<4i', 0, 0, width - 1, height - 1)
+    channels = b''.join(name + b'\0' + struct.pack('<iB3xii', 1, 0, 1, 1) for name in (b'B', b'G', b'R')) + b'\0'
+    header = (frame_check.EXR_MAGIC + struct.pack('<i', 2)
+              + attribute('channels', 'chlist', channels) + attribute('compression', 'compression', b'\x03')
+              + attribute('dataWindow', 'box2i', window) + attribute('displayWindow', 'box2i', window)
+              + attribute('lineOrder', 'lineOrder', b'\x00')
+              + attribute('pixelAspectRatio', 'float', struct.pack('<f', 1))
+              + attribute('screenWindowCenter', 'v2f', struct.pack('<2f', 0, 0))
+              + attribute('screenWindowWidth', 'float', struct.pack('<f', 1)) + b'\0')
+    chunk_count = -(-height // 16)
+    chunks_start = len(header) + chunk_count * 8
+    chunk_size = 8 + chunk_data_size
+    offsets = struct.pack(f'<{chunk_count}Q', *(chunks_start + index * chunk_size for index in range(chunk_count)))
+    chunks = b''.join(struct.pack('<ii', index * 16, chunk_data_size) + b'\x7f' * chunk_data_size
+                      for index in range(chunk_count))
+    return header + offsets + chunks
+
+
+def get_peak_rss() -> int:
+    """
+    Returns the peak resident set size of the process in bytes, or 0 if it can't be measured on this platform.
+    """
+    if resource is None:
+        return 0
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+class ScanMemoryBenchmark:
+    """
+    Class for benchmarking the memory used by the path, shot and project objects and by scanning a render tree.
+    """
+    def __init__(self, frame_count: int = 100000, sample_count: int = 10000):
+        self.temp_directory = tempfile.TemporaryDirectory(prefix='hpipe_scan_', dir=system.SystemConfig.get_home())
+        self.frame_paths = build_render_tree(self.temp_directory.name, frame_count)
+        self.sample_paths = self.frame_paths[:sample_count]
+        log.info(f"Synthetic render tree: {len(self.frame_paths)} frames")
+
+        shots_dictionary = synthetic_db(1, sample_count)['project_0000']
+        projects_dictionary = synthetic_db(sample_count // 10, 0)
+        self.object_sizes = {
+            'Filepath': self.bytes_per_object(lambda: [system.Filepath(p) for p in self.sample_paths]),
+            'Directory': self.bytes_per_object(lambda: [system.Directory(os.path.dirname(p))
+                                                        for p in self.sample_paths]),
+            'Shot': self.bytes_per_object(lambda: project.Project.from_dict(shots_dictionary).get_shots()),
+            'Project': self.bytes_per_object(lambda: [project.Project.from_dict(project_dictionary)
+                                                      for project_dictionary in projects_dictionary.values()],
+                                             len(projects_dictionary)),
+        }
+
+        self.rss_before_scan = get_peak_rss()
+        self.scan_pass = self.scan()
+        self.rss_after_scan = get_peak_rss()
+
+        self.log_benchmarks()
+        self.temp_directory.cleanup()
+
+    def bytes_per_object(self, build: Callable[[], list], count: int = 0) -> float:
+        """
+        Measures the memory allocated per object by a function building a list of objects. Includes the strings the
+        objects hold on to.
+        :param build: function building the objects
+        :param int count: number of objects built, defaults to the sample count
+        :return: bytes per object
+        """
+        count = count or len(self.sample_paths)
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            objects = build()
+            allocated = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(objects)
+        finally:
+            tracemalloc.stop()
+        return allocated / count
+
+    @logger.timeit
+    def scan(self) -> int:
+        """
+        Scans the render tree for image sequences.
+        """
+        return len(imageSequence.sequences_from_directory(system.Directory(self.temp_directory.name)))
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        for name, size in self.object_sizes.items():
+            log.info(f"------ BENCHMARKS: {name:<9} -------------- {size:8.1f} bytes per object")
+        log.info(f"------ BENCHMARKS: Scan ------------------- {self.scan_pass[1] * 1000:8.2f} ms, "
+                 f"{self.scan_pass[0]} sequences")
+        rss_before_scan, rss_after_scan = self.rss_before_scan / 1024 / 1024, self.rss_after_scan / 1024 / 1024
+        log.info(f"------ BENCHMARKS: Peak RSS --------------- {rss_before_scan:8.1f} MB before scan, "
+                 f"{rss_after_scan:8.1f} MB after")
+
+
+class WalkBenchmark:
+    """
+    Class for benchmarking the directory walker against the os.walk and os.listdir loops the scanners used before.
+    """
+    texture_extensions = (".tga", ".png", ".jpg", ".jpeg", ".exr", ".tif", ".tiff")
+
+    def __init__(self, frame_count: int = 200000):
+        self.temp_directory = tempfile.TemporaryDirectory(prefix='hpipe_scan_', dir=system.SystemConfig.get_home())
+        self.root = self.temp_directory.name
+        self.frame_count = len(build_render_tree(self.root, frame_count))
+        log.info(f"Synthetic render tree: {self.frame_count} frames")
+
+        self.results = {
+            'List files': (self.os_walk_files(), self.walker_files()),
+            'By extension': (self.os_walk_by_extension(), self.walker_by_extension()),
+            'Children': (self.listdir_children(), self.walker_children()),
+        }
+
+        self.log_benchmarks()
+        self.temp_directory.cleanup()
+
+    @logger.timeit
+    def os_walk_files(self) -> int:
+        """
+        Lists every file with os.walk, like Directory.get_files did.
+        """
+        return len([os.path.join(root, file) for root, dirs, files in os.walk(self.root) for file in files])
+
+    @logger.timeit
+    def walker_files(self) -> int:
+        """
+        Lists every file with the walker.
+        """
+        return len(list(walker.walk_paths(self.root)))
+
+    @logger.timeit
+    def os_walk_by_extension(self) -> int:
+        """
+        Finds the texture files with one os.walk per extension, like the asset translators did.
+        """
+        file_paths = []
+        for extension in self.texture_extensions:
+            for root, dirs, files in os.walk(self.root):
+                file_paths += [os.path.join(root, file) for file in files if file.endswith(extension)]
+        return len(file_paths)
+
+    @logger.timeit
+    def walker_by_extension(self) -> int:
+        """
+        Finds the texture files with a single walk.
+        """
+        return len(list(walker.walk_paths(self.root, extensions=self.texture_extensions)))
+
+    @logger.timeit
+    def listdir_children(self) -> int:
+        """
+        Lists the children directories of every shot with os.listdir and os.path.isdir, like
+        Directory.get_children_directories did.
+        """
+        children = []
+        for shot_name in os.listdir(self.root):
+            shot_path = os.path.join(self.root, shot_name)
+            children += [name for name in os.listdir(shot_path) if os.path.isdir(os.path.join(shot_path, name))]
+        return len(children)
+
+    @logger.timeit
+    def walker_children(self) -> int:
+        """
+        Lists the children directories of every shot with the walker.
+        """
+        children = []
+        for shot_path in walker.walk_paths(self.root, max_depth=0, files=False, directories=True):
+            children += walker.walk_paths(shot_path, max_depth=0, files=False, directories=True)
+        return len(children)
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        for name, (old_pass, new_pass) in self.results.items():
+            log.info(f"------ BENCHMARKS: {name:<13} ---------- os {old_pass[1] * 1000:8.2f} ms, "
+                     f"walker {new_pass[1] * 1000:8.2f} ms, {new_pass[0]} entries")
+
+
+class ScanCacheBenchmark:
+    """
+    Class for benchmarking rescanning a render tree with the scan cache. The directory mtimes of the tree are set an
+    hour back, like a show that was rendered a while ago, since directories modified in the last seconds aren't cached.
+    """
+    def __init__(self, frame_count: int = 100000):
+        self.temp_directory = tempfile.TemporaryDirectory(prefix='hpipe_scan_', dir=system.SystemConfig.get_home())
+        self.root = self.temp_directory.name
+        self.frame_count = len(build_render_tree(self.root, frame_count))
+        log.info(f"Synthetic render tree: {self.frame_count} frames")
+        an_hour_ago = time.time() - 3600
+        for directory_path in walker.walk_paths(self.root, files=False, directories=True):
+            os.utime(directory_path, (an_hour_ago, an_hour_ago))
+        # The database is kept out of the tree, writing to it would change the mtime of the root
+        self.cache_directory = tempfile.TemporaryDirectory(dir=system.SystemConfig.get_home())
+        self.cache = scan_cache.ScanCache(os.path.join(self.cache_directory.name, 'scan_cache.sqlite'))
+        self.directory = system.Directory(self.root)
+
+        self.uncached_pass = self.scan(False)
+        self.first_pass = self.scan(self.cache)
+        self.second_pass = self.scan(self.cache)
+        # A frame added to an existing version folder has to invalidate that folder and the cached sequences
+        open(os.path.join(self.root, 'shot_000', 'v001', 'shot_000_v001_beauty_9999.exr'), 'wb').close()
+        self.changed_pass = self.scan(self.cache)
+
+        self.log_benchmarks()
+        self.temp_directory.cleanup()
+        self.cache_directory.cleanup()
+
+    @logger.timeit
+    def scan(self, use_cache) -> int:
+        """
+        Scans the render tree for image sequences.
+        """
+        sequences = imageSequence.sequences_from_directory(self.directory, use_cache=use_cache)
+        return sum(len(sequence.filepaths) for sequence in sequences)
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        for name, scan_pass in (('Uncached', self.uncached_pass), ('First scan', self.first_pass),
+                                ('Rescan', self.second_pass), ('Frame added', self.changed_pass)):
+            log.info(f"------ BENCHMARKS: {name:<12} ----------- {scan_pass[1] * 1000:8.2f} ms, {scan_pass[0]} frames")
+
+
+class SequenceGroupingBenchmark:
+    """
+    Class for benchmarking grouping the frames of a render tree into image sequences, against the basename grouping
+    sequences_from_directory did before. The scan cache isn't used, every pass parses every file name.
+    """
+    def __init__(self, frame_count: int = 100000):
+        self.temp_directory = tempfile.TemporaryDirectory(prefix='hpipe_scan_', dir=system.SystemConfig.get_home())
+        self.root = self.temp_directory.name
+        self.frame_count = len(build_render_tree(self.root, frame_count))
+        log.info(f"Synthetic render tree: {self.frame_count} frames")
+        self.directory = system.Directory(self.root)
+
+        self.basename_pass = self.group_by_basename()
+        self.groups_pass = self.group_frames()
+        self.sequences_pass = self.scan()
+
+        self.log_benchmarks()
+        self.temp_directory.cleanup()
+
+    @logger.timeit
+    def group_by_basename(self) -> int:
+        """
+        Groups the frames like sequences_from_directory did before, by basename only, with a Filepath per frame and
+        every sequence built twice.
+        """
+        sequence_paths: Dict[str, List[str]] = {}
+        for entry in walker.walk(self.root, extensions=imageSequence.IMAGE_EXTENSIONS,
+                                 prune=walker.prune_names(('tmp',))):
+            sequence_paths.setdefault('_'.join(entry.name.split('_')[:-1]), []).append(entry.path)
+
+        sequences = []
+        for basename, file_paths in sequence_paths.items():
+            filepaths = [system.Filepath(file_path) for file_path in file_paths]
+            if imageSequence.sequence_factory(filepaths, basename) in sequences:
+                continue
+            sequences.append(imageSequence.sequence_factory(filepaths, basename))
+        return sum(len(sequence.filepaths) for sequence in sequences)
+
+    @logger.timeit
+    def group_frames(self) -> int:
+        """
+        Groups the frames by directory, basename and extension, without building any sequence.
+        """
+        groups = imageSequence.sequence_groups_from_directory(self.root, use_cache=False)
+        return sum(len(group.frames) for group in groups)
+
+    @logger.timeit
+    def scan(self) -> int:
+        """
+        Scans the render tree for image sequences.
+        """
+        sequences = imageSequence.sequences_from_directory(self.directory, use_cache=False)
+        return sum(len(sequence.filepaths) for sequence in sequences)
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        for name, scan_pass in (('By basename', self.basename_pass), ('Groups only', self.groups_pass),
+                                ('Sequences', self.sequences_pass)):
+            log.info(f"------ BENCHMARKS: {name:<12} ----------- {scan_pass[1] * 1000:8.2f} ms, {scan_pass[0]} frames")
+
+
+class FrameSetBenchmark:
+    """
+    Class for benchmarking the memory of an image sequence, finding its missing frames and slicing it. The sequence
+    has a frame missing every thousand frames, like a render with a few crashed tasks.
+    """
+    def __init__(self, frame_count: int = 20000):
+        self.temp_directory = tempfile.TemporaryDirectory(prefix='hpipe_scan_', dir=system.SystemConfig.get_home())
+        self.root = self.temp_directory.name
+        self.frames = [frame for frame in range(1001, 1001 + frame_count) if frame % 1000 != 500]
+        for frame in self.frames:
+            open(os.path.join(self.root, f"plate_{frame:04d}.exr"), 'wb').close()
+        log.info(f"Synthetic sequence: {len(self.frames)} frames")
+
+        self.sequence = imageSequence.sequences_from_directory(system.Directory(self.root), use_cache=False)[0]
+        # Rebuilt from its serialized group, so the memory the scan leaves behind in the allocator isn't counted
+        group_list = self.sequence.get_group().to_list()
+        self.sequence_size = self.allocated_bytes(
+            lambda: imageSequence.sequence_from_group(imageSequence.SequenceGroup.from_list(group_list)))
+        self.filepaths_size = self.allocated_bytes(
+            lambda: [system.Filepath(os.path.join(self.root, f"plate_{frame:04d}.exr")) for frame in self.frames])
+        self.slice_size = self.allocated_bytes(lambda: self.sequence[5001:15001])
+        self.missing_pass = self.missing_frames()
+        self.complete_pass = self.is_complete()
+        self.slice_pass = self.slice_frames()
+
+        self.log_benchmarks()
+        self.temp_directory.cleanup()
+
+    @staticmethod
+    def allocated_bytes(build: Callable[[], Any]) -> int:
+        """
+        Measures the memory held on to by the object a function builds, including everything it references.
+        :param build: function building the object
+        :return: bytes allocated
+        """
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            built_object = build()
+            allocated = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        del built_object
+        return allocated
+
+    @logger.timeit
+    def missing_frames(self) -> str:
+        """
+        Finds the missing frames of the sequence.
+        """
+        return str(self.sequence.missing_frames())
+
+    @logger.timeit
+    def is_complete(self) -> bool:
+        """
+        Checks if the sequence has every frame of its range.
+        """
+        return self.sequence.is_complete(self.sequence.start_frame, self.sequence.end_frame)
+
+    @logger.timeit
+    def slice_frames(self) -> str:
+        """
+        Slices every tenth frame of the middle half of the sequence, e.g. for a thumbnail strip.
+        """
+        return str(len(self.sequence[5001:15001:10].frames))
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        log.info(f"------ BENCHMARKS: Filepath list --------- {self.filepaths_size / 1024:8.1f} KB")
+        log.info(f"------ BENCHMARKS: Image sequence -------- {self.sequence_size / 1024:8.1f} KB, "
+                 f"{len(self.sequence.frames)} frames")
+        log.info(f"------ BENCHMARKS: Missing frames -------- {self.missing_pass[1] * 1000:8.3f} ms, "
+                 f"{self.missing_pass[0]}")
+        log.info(f"------ BENCHMARKS: Is complete ----------- {self.complete_pass[1] * 1000:8.3f} ms, "
+                 f"{self.complete_pass[0]}")
+        log.info(f"------ BENCHMARKS: Sliced sequence ------- {self.slice_size / 1024:8.1f} KB, frames 5001-15000")
+        log.info(f"------ BENCHMARKS: Slice every 10th ------ {self.slice_pass[1] * 1000:8.3f} ms, "
+                 f"{self.slice_pass[0]} frames")
+
+
+class VerifyBenchmark:
+    """
+    Class for benchmarking verifying the frames of an exr sequence. A few frames are broken the way crashed farm tasks
+    leave them: empty, cut off halfway, or with an offset table that was never filled in.
+    """
+    def __init__(self, frame_count: int = 10000):
+        self.temp_directory = tempfile.TemporaryDirectory(prefix='hpipe_scan_', dir=system.SystemConfig.get_home())
+        self.root = self.temp_directory.name
+        frame_bytes = build_exr_frame()
+        # 68 chunks of 16 scanlines, each with an 8 byte offset in the table and 8 + 100 bytes of chunk
+        chunks_start = len(frame_bytes) - 68 * 108
+        offsets_start = chunks_start - 68 * 8
+        broken_frames = {
+            1100: b'',
+            1200: frame_bytes[:len(frame_bytes) // 2],
+            1300: frame_bytes[:offsets_start] + b'\0' * (chunks_start - offsets_start) + frame_bytes[chunks_start:],
+            1400: b'\0' * len(frame_bytes),
+            1500: build_exr_frame(chunk_data_size=10),
+        }
+        for frame in range(1001, 1001 + frame_count):
+            with open(os.path.join(self.root, f"plate_{frame:04d}.exr"), 'wb') as frame_file:
+                frame_file.write(broken_frames.get(frame, frame_bytes))
+        log.info(f"Synthetic sequence: {frame_count} frames of {len(frame_bytes)} bytes")
+
+        self.sequence = imageSequence.sequences_from_directory(system.Directory(self.root), use_cache=False)[0]
+        self.single_thread_pass = self.verify(1)
+        self.pool_pass = self.verify(constants.SCAN_MAX_WORKERS)
+
+        self.log_benchmarks()
+        self.temp_directory.cleanup()
+
+    @logger.timeit
+    def verify(self, max_workers: int) -> 'frame_check.VerifyReport':
+        """
+        Verifies the sequence.
+        """
+        return self.sequence.verify(max_workers=max_workers)
+
+    def log_benchmarks(self):
+        """
+        Logs the results of the benchmarks
+        """
+        for name, verify_pass in (('Single thread', self.single_thread_pass), ('Thread pool', self.pool_pass)):
+            log.info(f"------ BENCHMARKS: {name:<13} ---------- {verify_pass[1] * 1000:8.2f} ms, "
+                     f"{verify_pass[0].frame_count} frames")
+        for problem in self.pool_pass[0].problems:
+            log.info(f"------ BENCHMARKS: Frame {problem.frame} ------------- {problem.issue.value}: {problem.message}")
+
+
+if __name__ == '__main__':
+    ScanMemoryBenchmark()
+    WalkBenchmark()
+    ScanCacheBenchmark()
+    SequenceGroupingBenchmark()
+    FrameSetBenchmark()
+    VerifyBenchmark()